@@ -0,0 +1,216 @@
+import asyncio, time, contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from selenium.common.exceptions import WebDriverException
+
+from capture import HEADERS, MIN_JPEG_BYTES, DELAY_BETWEEN_ROUNDS, FetchError, store_snapshot
+from driver_pool import DriverPool
+from url_cache import ImageUrlCache
+from mjpeg import MJPEGParser
+from http_pool import stats as http_stats
+from metrics import metrics, failure_reason
+
+FETCH_TIMEOUT = 10
+
+class SeleniumResolver:
+    """快取沒有網址或網址失效時才開網頁解析 img.video_obj，由 DriverPool 的 Chrome 在執行緒中處理"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="selenium")
+
+    async def resolve(self, cam_url):
+        # run_in_executor 不會帶上 contextvars，手動帶過去，頁面載入的秒數才算在這次擷取上
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, ctx.run, self.pool.resolve, cam_url)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+async def fetch_jpeg(session, url, timeout=FETCH_TIMEOUT):
+    async with session.get(url, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status != 200:
+            raise FetchError(f"http_{response.status}")
+        content_type = response.headers.get('content-type', '').lower()
+        if 'multipart' not in content_type and 'video' not in content_type:
+            data = await response.read()
+            return data if len(data) > MIN_JPEG_BYTES else None
+        # MJPEG：讀到第一張夠大的 JPEG 就停
+        parser = MJPEGParser.from_content_type(content_type)
+        async for chunk in response.content.iter_any():
+            parser.feed(chunk)
+            for data in parser.frames():
+                if len(data) > MIN_JPEG_BYTES:
+                    return data
+        return None
+
+def _connection_trace():
+    # 與 requests 連線池共用同一份統計：新建連線（含握手時間）與重用次數
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        http_stats.record_request()
+
+    async def on_create_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_create_end(session, ctx, params):
+        http_stats.record_connect(time.perf_counter() - ctx.connect_start)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_start.append(on_create_start)
+    trace.on_connection_create_end.append(on_create_end)
+    return trace
+
+class AsyncCaptureEngine:
+    """以 asyncio 並行抓所有攝影機：影像網址解析一次後快取，之後每輪只做 HTTP 抓圖
+
+    connector 的 limit / limit_per_host 控制總連線數與單一主機連線數，連線在各輪之間保持 keep-alive。
+    """
+
+    def __init__(self, cameras, url_cache=None, concurrency=200, per_host=8, timeout=FETCH_TIMEOUT, selenium_workers=1,
+                 dedup=None, archive=None, detector=None, breakers=None, driver_pool=None, features=None):
+        self.cameras = cameras
+        self.breakers = breakers
+        self.attempted = 0
+        self.dedup = dedup
+        self.archive = archive
+        self.features = features
+        self.detector = detector
+        self.url_cache = url_cache if url_cache is not None else ImageUrlCache()
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.resolver = SeleniumResolver(driver_pool if driver_pool is not None else DriverPool(selenium_workers))
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host,
+                                         keepalive_timeout=DELAY_BETWEEN_ROUNDS + 60, ssl=False)
+        self.session = aiohttp.ClientSession(connector=connector, trace_configs=[_connection_trace()])
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.resolver.close()
+        self.url_cache.save()
+        if self.breakers is not None:
+            self.breakers.save()
+
+    async def _fetch(self, url):
+        # 回傳 (JPEG 內容, None) 或 (None, 失敗原因)
+        start = time.perf_counter()
+        try:
+            data = await fetch_jpeg(self.session, url, self.timeout)
+        except FetchError as e:
+            return None, e.reason
+        except asyncio.TimeoutError:
+            return None, "timeout"
+        except aiohttp.ClientError:
+            return None, "connection"
+        finally:
+            metrics.observe("download", time.perf_counter() - start)
+        return (data, None) if data is not None else (None, "no_frame")
+
+    async def _resolve(self, cam):
+        # 回傳 (影像網址, None) 或 (None, 失敗原因)
+        try:
+            image_url = await self.resolver.resolve(cam['url'])
+        except WebDriverException as e:
+            return None, failure_reason(e)
+        if not image_url:
+            return None, "no_image_url"
+        self.url_cache.set(cam['camera_id'], image_url)
+        return image_url, None
+
+    async def capture(self, cam):
+        # 一台攝影機出錯（例如 webdriver_manager 離線時丟 ValueError）只算這台失敗，
+        # 不能讓 gather 把整輪連同斷路器紀錄一起帶走；跟執行緒版 capture_with_cache 一樣接住
+        try:
+            return await self._capture(cam)
+        except Exception as e:
+            metrics.failure(cam['camera_id'], failure_reason(e), e)
+            return False
+
+    async def _capture(self, cam):
+        start, captured_at = time.monotonic(), time.time()
+        metrics.begin()
+        camera_id = cam['camera_id']
+        image_url = self.url_cache.get(camera_id)
+        cached = image_url is not None
+        if not cached:
+            image_url, reason = await self._resolve(cam)
+            if not image_url:
+                metrics.failure(camera_id, reason)
+                return False
+        data, reason = await self._fetch(image_url)
+        if data is None and cached:
+            # 快取的網址失效，才退回 Selenium 重新解析
+            self.url_cache.invalidate(camera_id)
+            metrics.event("url_invalidated", camera_id=camera_id, reason=reason)
+            image_url, reason = await self._resolve(cam)
+            if image_url:
+                data, reason = await self._fetch(image_url)
+        if data is None:
+            metrics.failure(camera_id, reason)
+            return False
+        # 去重要解碼縮圖、寫檔也會阻塞，丟到執行緒做
+        try:
+            stored = await asyncio.to_thread(self._store, cam, data, captured_at)
+        except OSError as e:
+            metrics.failure(camera_id, "write_error", e)
+            return False
+        # 跟執行緒版一樣，寫入成功才送淹水偵測
+        if self.detector is not None:
+            self.detector.submit(cam, data, start, captured_at)
+        metrics.success(camera_id, stored)
+        return True
+
+    def _store(self, cam, data, ts):
+        with metrics.timer("write"):
+            return store_snapshot(cam['name'], cam['camera_id'], data, self.dedup, self.archive, self.features, ts)
+
+    async def run_round(self):
+        # 開路中的攝影機不抓，等到探測時間才放行一次；一輪的時間只跟還活著的攝影機數量有關
+        cameras = self.cameras
+        if self.breakers is not None:
+            cameras = [cam for cam in cameras if self.breakers.allow(cam['camera_id'])]
+        self.attempted = len(cameras)
+        results = await asyncio.gather(*(self.capture(cam) for cam in cameras))
+        if self.breakers is not None:
+            for cam, ok in zip(cameras, results):
+                self.breakers.record(cam['camera_id'], ok)
+            self.breakers.save()
+        self.url_cache.save()
+        return sum(results)
+
+async def _capture_forever(cameras, **kwargs):
+    async with AsyncCaptureEngine(cameras, **kwargs) as engine:
+        round_number = 1
+        while True:
+            print(f"-- 第 {round_number} 輪開始 --")
+            start = time.monotonic()
+            success = await engine.run_round()
+            elapsed = time.monotonic() - start
+            print(f"完成第 {round_number} 輪，成功 {success}/{engine.attempted}（共 {len(cameras)} 台），耗時 {elapsed:.1f} 秒")
+            if engine.breakers is not None:
+                print(engine.breakers.summary())
+            if engine.dedup is not None:
+                print(engine.dedup.summary())
+            if engine.detector is not None:
+                print(engine.detector.summary())
+            if engine.features is not None:
+                print(engine.features.summary())
+            print(http_stats.summary())
+            print(engine.resolver.pool.summary())
+            print(metrics.summary())
+            round_number += 1
+            await asyncio.sleep(DELAY_BETWEEN_ROUNDS)
+
+def run_async_capture(cameras, **kwargs):
+    try:
+        asyncio.run(_capture_forever(cameras, **kwargs))
+    except KeyboardInterrupt:
+        print("\n已停止監控")
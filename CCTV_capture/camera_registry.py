@@ -0,0 +1,325 @@
+# 攝影機清單的共用索引：capture.py、capture_service.py（run_all.py）、findCam.py 都從這裡讀 *_cameras.json
+#
+# 第一次讀 JSON 時把整理好的紀錄存成 registry_cache/ 下的 pickle 快照，之後來源檔沒變（路徑、大小、修改時間相同）
+# 就直接載入快照，不再逐筆跑 regex 與排序；快照讀不到或過期時自動退回讀 JSON 並重建。
+#
+# 用法：
+#     python camera_registry.py --json all.json
+#     python camera_registry.py --json all.json --cities tnn khh --ids tnn:1-200 --shard 0/4 --list
+#
+import os, re, glob, json, time, zlib, pickle, bisect, hashlib, argparse
+from collections import defaultdict
+
+from roi import ROIS_PATH, CameraROI, load_rois
+
+REGISTRY_CACHE_DIR = "registry_cache"
+TAGS_PATH = "camera_tags.json"     # 選用：{camera_id: [標籤, ...]}
+SNAPSHOT_VERSION = 2
+
+CITY_CODES = {
+    'tnn': '台南市',
+    'khh': '高雄市',
+    'tpe': '台北市',
+    'nwt': '新北市',
+    'tao': '桃園市',
+    'tcg': '台中市',
+    'chw': '彰化縣',
+    'yll': '雲林縣',
+    'cyi': '嘉義市',
+    'cyq': '嘉義縣',
+    'ptf': '屏東縣',
+    'ttt': '台東縣',
+    'hua': '花蓮縣',
+    'ila': '宜蘭縣',
+    'hsz': '新竹市',
+    'hsc': '新竹縣',
+    'mlc': '苗栗縣',
+    'nan': '南投縣',
+    'pen': '澎湖縣',
+    'kmn': '金門縣',
+    'lnn': '連江縣',
+}
+CITY_BY_NAME = {name: code for code, name in CITY_CODES.items()}
+
+_URL_ID_RE = re.compile(r"/([a-z]{3})-(\d+)")
+_NAME_SUFFIX_RE = re.compile(r"\s*\([^)]*\)$")
+_ID_RANGE_RE = re.compile(r"^(?:([a-z]{3}):)?(\d*)(?:(-)(\d*))?$")
+
+def parse_camera_url(url):
+    """https://.../cam/tnn-00004 → ("tnn", 4)，認不出來回傳 None"""
+    m = _URL_ID_RE.search(url)
+    return (m.group(1), int(m.group(2))) if m else None
+
+def format_camera_id(city_code, number):
+    return f"{city_code}_{number:05d}"
+
+class Camera:
+    """一台攝影機；保留 cam['camera_id'] 這種 dict 寫法，舊的擷取程式不用改"""
+    __slots__ = ("camera_id", "city_code", "number", "city", "name", "title", "url", "tags", "roi")
+
+    def __init__(self, camera_id, city_code, number, city, name, title, url, tags=(), roi=None):
+        self.camera_id = camera_id
+        self.city_code = city_code
+        self.number = number
+        self.city = city
+        self.name = name        # 去掉結尾「(tnn-00004)」的名稱
+        self.title = title      # JSON 裡原本的鍵
+        self.url = url
+        self.tags = tags
+        self.roi = CameraROI.from_dict(roi) if roi is not None and not isinstance(roi, CameraROI) else roi
+
+    @property
+    def unique_name(self):
+        return f"{self.name} ({self.camera_id})"
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def astuple(self):
+        return (self.camera_id, self.city_code, self.number, self.city, self.name, self.title, self.url, self.tags,
+                self.roi.as_dict() if self.roi is not None else None)
+
+    def __repr__(self):
+        return f"Camera({self.camera_id!r}, {self.name!r})"
+
+def _read_city_lists(path):
+    # repo 裡的檔案是 {縣市: {名稱: 網址}}；findCam 輸出的 cameras_by_city/<縣市>_cameras.json 是 {名稱: 網址}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    if raw and all(isinstance(v, dict) for v in raw.values()):
+        return raw
+    return {os.path.basename(path).replace("_cameras.json", ""): raw}
+
+def _read_tags(tags_path):
+    if not tags_path or not os.path.exists(tags_path):
+        return {}
+    try:
+        with open(tags_path, encoding="utf-8") as f:
+            return {cid: tuple(tags) for cid, tags in json.load(f).items()}
+    except (OSError, ValueError) as e:
+        print(f"讀取 {tags_path} 失敗: {e}")
+        return {}
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+class CameraRegistry:
+    """依 camera_id、(縣市代碼, 編號)、名稱建好索引的攝影機清單，可依縣市、編號範圍、標籤挑選並分片"""
+
+    def __init__(self, cameras, source="json"):
+        self.cameras = cameras      # 依編號排序
+        self.source = source
+        self.by_id = {}
+        self.by_name = defaultdict(list)
+        self.by_city = defaultdict(list)
+        for cam in cameras:
+            self.by_id[cam.camera_id] = cam
+            self.by_name[cam.name].append(cam)
+            self.by_city[cam.city_code].append(cam)
+        for cams in self.by_city.values():
+            cams.sort(key=lambda c: c.number)
+        self._numbers = {code: [c.number for c in cams] for code, cams in self.by_city.items()}
+
+    @classmethod
+    def from_city_lists(cls, city_lists, tags=None, rois=None):
+        """{縣市: {名稱: 網址}} → CameraRegistry；同一個 camera_id 以先出現的為準"""
+        tags = tags or {}
+        rois = rois or {}
+        cameras = {}
+        skipped = 0
+        for city, cams in city_lists.items():
+            if not isinstance(cams, dict):
+                continue
+            for title, url in cams.items():
+                parsed = parse_camera_url(url) if isinstance(url, str) else None
+                if parsed is None:
+                    skipped += 1
+                    continue
+                code, number = parsed
+                cid = format_camera_id(code, number)
+                if cid not in cameras:
+                    cameras[cid] = Camera(cid, code, number, city, _NAME_SUFFIX_RE.sub("", title), title, url,
+                                          tags.get(cid, ()), rois.get(cid))
+        if skipped:
+            print(f"略過 {skipped} 筆認不出攝影機編號的網址")
+        return cls(sorted(cameras.values(), key=lambda c: c.number))
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def __iter__(self):
+        return iter(self.cameras)
+
+    def get(self, camera_id):
+        return self.by_id.get(camera_id)
+
+    def find(self, city_code, number):
+        numbers = self._numbers.get(city_code, [])
+        i = bisect.bisect_left(numbers, number)
+        return self.by_city[city_code][i] if i < len(numbers) and numbers[i] == number else None
+
+    def find_name(self, name):
+        return list(self.by_name.get(_NAME_SUFFIX_RE.sub("", name), ()))
+
+    def city_lists(self):
+        """還原成 {縣市: {名稱: 網址}}"""
+        result = {}
+        for cam in self.cameras:
+            result.setdefault(cam.city, {})[cam.title] = cam.url
+        return result
+
+    def _city_range(self, code, lo, hi):
+        numbers = self._numbers.get(code, [])
+        start = bisect.bisect_left(numbers, lo) if lo is not None else 0
+        end = bisect.bisect_right(numbers, hi) if hi is not None else len(numbers)
+        return self.by_city[code][start:end] if code in self.by_city else []
+
+    def select(self, cities=None, ids=None, tags=None, shard=None):
+        """挑出符合條件的攝影機（維持原本的編號順序）
+
+        cities: 縣市代碼或中文名稱；ids: [(代碼或 None, 起, 迄), ...]，端點含在內、None 為不限；
+        tags: 有其中任一個標籤即可；shard: (第幾片, 共幾片)，依 camera_id 的 CRC32 分配，
+        同一台攝影機不論其他條件怎麼選都落在同一片。
+        """
+        if cities:
+            codes = {CITY_BY_NAME.get(c, c) for c in cities}
+            chosen = {cam.camera_id for code in codes for cam in self.by_city.get(code, ())}
+        else:
+            chosen = None
+        if ids:
+            in_range = set()
+            for code, lo, hi in ids:
+                for c in ([code] if code else self.by_city):
+                    in_range.update(cam.camera_id for cam in self._city_range(c, lo, hi))
+            chosen = in_range if chosen is None else chosen & in_range
+        result = self.cameras if chosen is None else [cam for cam in self.cameras if cam.camera_id in chosen]
+        if tags:
+            wanted = set(tags)
+            result = [cam for cam in result if wanted.intersection(cam.tags)]
+        if shard is not None:
+            index, count = shard
+            result = [cam for cam in result if shard_of(cam.camera_id, count) == index]
+        return list(result)
+
+    def summary(self):
+        parts = [f"{CITY_CODES.get(code, code)} {len(cams)}" for code, cams in sorted(self.by_city.items())]
+        with_roi = sum(cam.roi is not None for cam in self.cameras)
+        return f"{len(self)} 台攝影機（{'、'.join(parts)}）" + (f"，{with_roi} 台有 ROI" if with_roi else "")
+
+def shard_of(camera_id, count):
+    return zlib.crc32(camera_id.encode()) % count
+
+def _snapshot_path(cache_dir, json_paths):
+    key = "\n".join(os.path.abspath(p) for p in json_paths)
+    return os.path.join(cache_dir, f"cameras_{hashlib.sha1(key.encode()).hexdigest()[:12]}.pkl")
+
+def _load_snapshot(path, signature):
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("signature") != signature:
+        return None
+    return CameraRegistry([Camera(*rec) for rec in snapshot["records"]], source="snapshot")
+
+def _save_snapshot(path, signature, registry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": SNAPSHOT_VERSION, "signature": signature,
+                     "records": [cam.astuple() for cam in registry.cameras]}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def load_registry(json_paths, tags_path=TAGS_PATH, cache_dir=REGISTRY_CACHE_DIR, rois_path=ROIS_PATH):
+    """讀入多個攝影機 JSON（連同標籤與 ROI）；cache_dir 為 None 時不使用快照"""
+    paths = []
+    for path in json_paths:
+        if os.path.exists(path):
+            paths.append(path)
+        else:
+            print(f"找不到指定的 JSON 檔案：{path}")
+    sources = paths + [p for p in (tags_path, rois_path) if p and os.path.exists(p)]
+    signature = (tuple(_file_signature(p) for p in sources), bool(tags_path), bool(rois_path))
+    snapshot = _snapshot_path(cache_dir, paths) if cache_dir and paths else None
+    if snapshot:
+        registry = _load_snapshot(snapshot, signature)
+        if registry is not None:
+            return registry
+
+    city_lists = {}
+    for path in paths:
+        try:
+            for city, cams in _read_city_lists(path).items():
+                if isinstance(cams, dict):
+                    for title, url in cams.items():
+                        city_lists.setdefault(city, {}).setdefault(title, url)
+        except (OSError, ValueError) as e:
+            print(f"讀取 {path} 發生錯誤: {e}")
+    registry = CameraRegistry.from_city_lists(city_lists, _read_tags(tags_path), load_rois(rois_path))
+    if snapshot:
+        try:
+            _save_snapshot(snapshot, signature, registry)
+        except OSError as e:
+            print(f"寫入攝影機快照失敗: {e}")
+    return registry
+
+def parse_id_range(text):
+    """"tnn:1-200" → ("tnn", 1, 200)；"khh:50-" → ("khh", 50, None)；"30" → (None, 30, 30)"""
+    m = _ID_RANGE_RE.match(text.strip())
+    if not m or not (m.group(2) or m.group(4)):
+        raise argparse.ArgumentTypeError(f"無法解析編號範圍：{text}")
+    code, lo, dash, hi = m.groups()
+    lo = int(lo) if lo else None
+    hi = int(hi) if hi else (None if dash else lo)
+    return code, lo, hi
+
+def parse_shard(text):
+    """"0/4" → (0, 4)"""
+    try:
+        index, count = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式為 第幾片/共幾片，例如 0/4：{text}") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片超出範圍：{text}")
+    return index, count
+
+def add_selection_args(parser):
+    parser.add_argument("--cities", nargs="+", help="只擷取這些縣市（代碼或中文名稱）")
+    parser.add_argument("--ids", nargs="+", type=parse_id_range, help="編號範圍，例如 tnn:1-200 khh:50- 30")
+    parser.add_argument("--tags", nargs="+", help=f"只擷取有這些標籤的攝影機（{TAGS_PATH}）")
+    parser.add_argument("--shard", type=parse_shard, help="只擷取第 i 片（共 n 片），格式 i/n")
+    parser.add_argument("--no-snapshot", action="store_true", help="不使用攝影機清單快照，直接讀 JSON")
+
+def select_from_args(json_paths, args):
+    """依 add_selection_args() 的參數載入並挑選攝影機，回傳 (registry, 選到的攝影機)"""
+    start = time.perf_counter()
+    registry = load_registry(json_paths, cache_dir=None if args.no_snapshot else REGISTRY_CACHE_DIR)
+    cameras = registry.select(args.cities, args.ids, args.tags, args.shard)
+    print(f"攝影機清單（{'快照' if registry.source == 'snapshot' else 'JSON'}，{(time.perf_counter() - start) * 1000:.1f} ms）："
+          f"{registry.summary()}，選取 {len(cameras)} 台")
+    return registry, cameras
+
+def main():
+    parser = argparse.ArgumentParser(description="攝影機清單索引與挑選")
+    parser.add_argument("--json", nargs="+", help="攝影機 JSON 檔案（預設為目前目錄所有 *_cameras.json）")
+    parser.add_argument("--list", action="store_true", help="列出選到的攝影機")
+    add_selection_args(parser)
+    args = parser.parse_args()
+
+    _, cameras = select_from_args(args.json or sorted(glob.glob("*_cameras.json")), args)
+    if args.list:
+        for cam in cameras:
+            tags = f" [{', '.join(cam.tags)}]" if cam.tags else ""
+            roi = "  (ROI)" if cam.roi is not None else ""
+            print(f"{cam.camera_id}  {cam.city}  {cam.name}{tags}{roi}")
+
+if __name__ == "__main__":
+    main()
@@ -1,158 +1,303 @@
-import os, time, json, re, requests, urllib3, argparse
+import os, time, re, glob, requests, urllib3, argparse
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from mjpeg import MJPEGParser, iter_frames
+from http_pool import get_session, close_sessions, stats as http_stats
+from scheduler import DeadlineScheduler
+from dedup import NEW, add_dedup_args, dedup_from_args
+from frame_archive import FrameArchive, latest_frame
+from camera_registry import (parse_camera_url, format_camera_id, load_registry, add_selection_args,
+                             select_from_args)
+from flood_detect import add_flood_args, detector_from_args
+from metrics import metrics, failure_reason, add_metrics_args, metrics_from_args
+from circuit_breaker import add_breaker_args, breakers_from_args
+from driver_pool import add_driver_args, pool_from_args
+from feature_store import add_feature_args, features_from_args
 
 IMAGE_DIR = "D:\Taiwan_CCTV\downloaded_images"
 DELAY_BETWEEN_CAMERAS = 0.1
-DELAY_BETWEEN_ROUNDS = 300
+DELAY_BETWEEN_ROUNDS = 300     # 每台攝影機的基準擷取間隔（秒）
+MIN_INTERVAL = 60              # 畫面劇烈變化時最短縮到多少
+MAX_INTERVAL = 1800            # 離線或靜止時最長拉到多少
+REPORT_INTERVAL = 300          # 多久印一次排程落後報告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 def extract_camera_id(url):
-    m = re.search(r"(tnn|khh|tpe|ttt|nwt|tao)-(\d+)", url)
-    return f"{m.group(1)}_{m.group(2)}" if m else "unknown"
+    parsed = parse_camera_url(url)
+    return format_camera_id(*parsed) if parsed else "unknown"
 
 def load_cameras_from_json(json_path):
-    if not os.path.exists(json_path):
-        print(f"找不到指定的 JSON 檔案：{json_path}")
-        return []
-    try:
-        with open(json_path, encoding="utf-8") as f:
-            raw = json.load(f)
-    except Exception as e:
-        print(f"讀取 JSON 發生錯誤: {e}")
-        return []
-    flat = {}
-    for city, cams in raw.items():
-        if isinstance(cams, dict):
-            flat.update(cams)
-    processed = []
-    for name, url in flat.items():
-        if not isinstance(url, str): continue
-        cid = extract_camera_id(url)
-        cname = re.sub(r"\s*\([^)]*\)$", "", name)
-        processed.append({"name": cname, "url": url, "camera_id": cid, "unique_name": f"{cname} ({cid})"})
-    def _key(cam):
-        m = re.search(r"(\d+)", cam["camera_id"])
-        return int(m.group(1)) if m else 10**9
-    processed.sort(key=_key)
-    return processed
+    return list(load_registry([json_path]))
 
-def download_first_jpeg_from_mjpeg(url, filename):
-    headers = {
-        'User-Agent': 'Mozilla/5.0',
-        'Referer': 'https://www.1968services.tw/cam/',
-    }
-    try:
-        session = requests.Session()
-        session.verify = False
-        response = session.get(url, headers=headers, stream=True, timeout=10)
-        if response.status_code == 200:
-            content_type = response.headers.get('content-type', '').lower()
-            if 'image/jpeg' in content_type:
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk: f.write(chunk)
-                return True
-            elif 'multipart' in content_type or 'video' in content_type:
-                bytes_data = b""
-                for chunk in response.iter_content(chunk_size=1024):
-                    if not chunk: continue
-                    bytes_data += chunk
-                    if len(bytes_data) > 2 * 1024 * 1024:
-                        bytes_data = bytes_data[-1024*1024:]
-                    start = bytes_data.find(b'\xff\xd8')
-                    end = bytes_data.find(b'\xff\xd9')
-                    if start != -1 and end != -1 and end > start:
-                        jpg_data = bytes_data[start:end+2]
-                        if len(jpg_data) > 1000:
-                            with open(filename, 'wb') as f:
-                                f.write(jpg_data)
-                            return True
-            else:
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk: f.write(chunk)
-                return True
-    except:
-        return False
-    return False
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Referer': 'https://www.1968services.tw/cam/',
+}
+MIN_JPEG_BYTES = 1000
 
-def capture_single_camera(driver, cam_url, cam_name, camera_id):
+class FetchError(Exception):
+    """抓圖失敗，reason 為失敗原因（例如 http_404），記在擷取指標的計數器上"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def camera_dir(cam_name):
     safe_cam_name = re.sub(r'[<>:"/\\|?*]', '_', cam_name)
     cam_dir = os.path.join(IMAGE_DIR, safe_cam_name)
     os.makedirs(cam_dir, exist_ok=True)
+    return cam_dir
+
+def snapshot_filename(cam_dir, camera_id, ts=None):
+    timestamp = (datetime.now() if ts is None else datetime.fromtimestamp(ts)).strftime("%Y%m%d_%H%M%S")
+    return os.path.join(cam_dir, f"{camera_id}_{timestamp}.jpg")
+
+def latest_snapshot(cam_dir, camera_id):
+    # 資料夾中最新的一張，回傳 (檔名, bytes) 或 None
+    files = glob.glob(os.path.join(cam_dir, f"{camera_id}_*.jpg"))
+    if not files:
+        return None
+    filename = max(files)
+    with open(filename, 'rb') as f:
+        return filename, f.read()
+
+def _record_features(features, camera_id, jpg_data, ts):
+    # 特徵庫只是附帶的紀錄，寫不進去（磁碟滿、檔案損毀）不影響這次擷取
     try:
-        driver.get(cam_url)
-        time.sleep(2)
-        image_url = get_latest_image_url(driver)
-        if image_url:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(cam_dir, f"{camera_id}_{timestamp}.jpg")
-            if download_first_jpeg_from_mjpeg(image_url, filename):
-                if os.path.exists(filename) and os.path.getsize(filename) > 1000:
-                    return True
-                else:
-                    os.remove(filename)
+        features.record(camera_id, jpg_data, ts)
+    except (OSError, ValueError) as e:
+        print(f"{camera_id} 特徵寫入特徵庫失敗: {e}")
+
+def store_snapshot(cam_name, camera_id, jpg_data, dedup=None, archive=None, features=None, ts=None):
+    # 有 dedup 時先與該攝影機上一張存下的影像比對，重複或佔位圖不寫檔（只記參照），回傳是否寫入
+    # 有 archive（FrameArchive）時寫進當天的封存檔，否則一張一個檔案
+    # 有 features（FeatureStore）時每張（包括重複影像）在記下參照或寫檔成功後才記縮圖與亮度，寫檔失敗的不記
+    # ts 為擷取時間（time.time()），檔名 / 封存檔與特徵庫用同一個時間；None 為現在
+    cam_dir = camera_dir(cam_name)
+    ts = time.time() if ts is None else ts
+    if dedup is not None:
+        latest = latest_frame if archive is not None else latest_snapshot
+        kind, ref = dedup.check(camera_id, jpg_data, lambda: latest(cam_dir, camera_id))
+        if kind != NEW:
+            dedup.record_ref(cam_dir, camera_id, kind, ref)
+            if features is not None:
+                _record_features(features, camera_id, jpg_data, ts)
+            return False
+    if archive is not None:
+        ref = archive.append(cam_dir, camera_id, jpg_data, ts)
+    else:
+        ref = snapshot_filename(cam_dir, camera_id, ts)
+        with open(ref, 'wb') as f:
+            f.write(jpg_data)
+    if dedup is not None:
+        dedup.stored(camera_id, ref)
+    if features is not None:
+        _record_features(features, camera_id, jpg_data, ts)
+    return True
+
+def iter_jpeg_frames(url, max_frames=1, timeout=10):
+    # 同一條連線連續讀出最多 max_frames 張 JPEG；單張 JPEG 的網址直接回傳整個內容
+    # 連線來自執行緒共用的連線池，同一主機的請求會重用 keep-alive 連線
+    session = get_session()
+    with session.get(url, headers=HEADERS, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise FetchError(f"http_{response.status_code}")
+        content_type = response.headers.get('content-type', '').lower()
+        if 'multipart' in content_type or 'video' in content_type:
+            parser = MJPEGParser.from_content_type(content_type)
+            count = 0
+            for jpg_data in iter_frames(response.raw, parser):
+                if len(jpg_data) > MIN_JPEG_BYTES:
+                    yield jpg_data
+                    count += 1
+                    if count >= max_frames:
+                        return
+        else:
+            yield response.content
+
+def fetch_first_jpeg(url, timeout=10):
+    frames = iter_jpeg_frames(url, 1, timeout)
+    try:
+        return next(frames, None)
+    finally:
+        frames.close()
+
+def download_first_jpeg_from_mjpeg(url, filename):
+    try:
+        jpg_data = fetch_first_jpeg(url)
+    except Exception:
         return False
-    except:
+    if not jpg_data:
         return False
+    with open(filename, 'wb') as f:
+        f.write(jpg_data)
+    return True
 
-def get_latest_image_url(driver):
+def capture_single_camera(resolve, cam_url, cam_name, camera_id, dedup=None, archive=None, features=None, ts=None):
+    # resolve(cam_url) 開網頁取得影像網址（DriverPool.resolve）；ts 為擷取時間（見 store_snapshot）
+    # 成功時回傳抓到的 JPEG 內容（排程器用來比對畫面變化，重複影像也算成功），失敗回傳 None
+    metrics.begin()
     try:
-        img_elem = WebDriverWait(driver, 8).until(EC.presence_of_element_located((By.CSS_SELECTOR, "img.video_obj")))
-        for _ in range(5):
-            img_url = img_elem.get_attribute("src")
-            if img_url and "t=" in img_url:
-                return img_url
-            time.sleep(0.3)
-        return img_elem.get_attribute("src")
-    except:
+        image_url = resolve(cam_url)
+    except Exception as e:
+        metrics.failure(camera_id, failure_reason(e), e)
+        return None
+    if not image_url:
+        metrics.failure(camera_id, "no_image_url")
         return None
+    jpg_data, reason = _try_fetch(image_url)
+    if not jpg_data:
+        metrics.failure(camera_id, reason)
+        return None
+    return _store_checked(cam_name, camera_id, jpg_data, dedup, archive, features, ts)
+
+def _try_fetch(image_url):
+    # 回傳 (JPEG 內容, None) 或 (None, 失敗原因)
+    try:
+        with metrics.timer("download"):
+            jpg_data = fetch_first_jpeg(image_url)
+    except Exception as e:
+        return None, failure_reason(e)
+    return (jpg_data, None) if jpg_data else (None, "no_frame")
+
+def _store_checked(cam_name, camera_id, jpg_data, dedup, archive, features, ts):
+    # 太小的內容（錯誤頁、空白圖）算失敗；寫檔失敗（磁碟滿、權限）也只算這台這次失敗
+    if len(jpg_data) <= MIN_JPEG_BYTES:
+        metrics.failure(camera_id, "too_small")
+        return None
+    try:
+        with metrics.timer("write"):
+            stored = store_snapshot(cam_name, camera_id, jpg_data, dedup, archive, features, ts)
+    except OSError as e:
+        metrics.failure(camera_id, "write_error", e)
+        return None
+    metrics.success(camera_id, stored)
+    return jpg_data
+
+def capture_with_cache(cam, url_cache, resolve, dedup=None, archive=None, features=None, ts=None):
+    # 有快取的影像網址就直接抓圖；沒有或失效時才用 resolve(cam_url)（DriverPool.resolve）開網頁解析
+    # ts 為擷取時間（見 store_snapshot），送去淹水偵測時用同一個時間
+    # 成功回傳 JPEG 內容，失敗回傳 None
+    metrics.begin()
+    camera_id = cam['camera_id']
+    image_url = url_cache.get(camera_id)
+    jpg_data, reason = _try_fetch(image_url) if image_url else (None, None)
+    if not jpg_data:
+        if image_url:
+            url_cache.invalidate(camera_id)
+            metrics.event("url_invalidated", camera_id=camera_id, reason=reason)
+        try:
+            image_url = resolve(cam['url'])
+        except Exception as e:
+            metrics.failure(camera_id, failure_reason(e), e)
+            return None
+        if not image_url:
+            metrics.failure(camera_id, "no_image_url")
+            return None
+        url_cache.set(camera_id, image_url)
+        jpg_data, reason = _try_fetch(image_url)
+        if not jpg_data:
+            metrics.failure(camera_id, reason)
+            return None
+    return _store_checked(cam['name'], camera_id, jpg_data, dedup, archive, features, ts)
 
 def main():
     parser = argparse.ArgumentParser(description="循環抓取攝影機圖片")
     parser.add_argument("--json", default="all_cameras.json", help="攝影機 JSON 檔案路徑")
+    parser.add_argument("--mode", choices=["selenium", "async"], default="selenium",
+                        help="selenium: 每台每輪都開網頁；async: 快取影像網址後以 asyncio 並行抓圖")
+    parser.add_argument("--concurrency", type=int, default=200, help="async 模式同時進行的連線數")
+    parser.add_argument("--per-host", type=int, default=8, help="async 模式對同一主機的連線上限")
+    parser.add_argument("--storage", choices=["files", "archive"], default="files",
+                        help="files: 一張一個 JPEG；archive: 每台每天一個封存檔（frame_archive.py）")
+    parser.add_argument("--interval", type=float, default=DELAY_BETWEEN_ROUNDS, help="每台攝影機的基準擷取間隔（秒）")
+    parser.add_argument("--min-interval", type=float, default=MIN_INTERVAL, help="畫面變化大時的最短間隔")
+    parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL, help="離線或靜止時的最長間隔")
+    add_dedup_args(parser)
+    add_selection_args(parser)
+    add_flood_args(parser)
+    add_metrics_args(parser)
+    add_breaker_args(parser)
+    add_driver_args(parser, default_size=1)
+    add_feature_args(parser)
     args = parser.parse_args()
 
     os.makedirs(IMAGE_DIR, exist_ok=True)
-    camera_list = load_cameras_from_json(args.json)
-    if not camera_list:
+    _, selected_cameras = select_from_args([args.json], args)
+    if not selected_cameras:
         print("沒有找到任何攝影機")
         return
 
-    selected_cameras = camera_list
     print(f"\n開始監控 {len(selected_cameras)} 個攝影機")
 
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    driver = None
+    dedup = dedup_from_args(args)
+    archive = FrameArchive() if args.storage == "archive" else None
+    features = features_from_args(args)
+    detector = detector_from_args(args, features)
+    breakers = breakers_from_args(args)
+    metrics_from_args(args)
+    driver_pool = pool_from_args(args)
+    if args.mode == "async":
+        from async_capture import run_async_capture
+        try:
+            run_async_capture(selected_cameras, concurrency=args.concurrency, per_host=args.per_host,
+                              dedup=dedup, archive=archive, detector=detector, breakers=breakers,
+                              driver_pool=driver_pool, features=features)
+        finally:
+            if archive is not None:
+                archive.close()
+            if detector is not None:
+                detector.stop()
+            metrics.close()
+        return
+
+    # 依每台的下次期限擷取，不再整輪跑完後固定睡 DELAY_BETWEEN_ROUNDS
+    scheduler = DeadlineScheduler(selected_cameras, args.interval, args.min_interval, args.max_interval,
+                                  breakers=breakers)
     try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-        round_number = 1
+        success = attempted = 0
+        last_report = time.monotonic()
         while True:
-            print(f"-- 第 {round_number} 輪開始 --")
-            success = 0
-            for i, cam in enumerate(selected_cameras, 1):
-                print(f"[{i}/{len(selected_cameras)}] {cam['camera_id']} - {cam['name']}")
-                if capture_single_camera(driver, cam['url'], cam['name'], cam['camera_id']):
-                    success += 1
+            cam = scheduler.next_due(timeout=REPORT_INTERVAL)
+            if cam is not None:
+                start, captured_at = time.monotonic(), time.time()
+                jpg_data = capture_single_camera(driver_pool.resolve, cam['url'], cam['name'], cam['camera_id'],
+                                                 dedup, archive, features, captured_at)
+                scheduler.complete(cam, jpg_data)
+                if jpg_data is not None and detector is not None:
+                    detector.submit(cam, jpg_data, start, captured_at)
+                attempted += 1
+                success += jpg_data is not None
+                print(f"{cam['camera_id']} - {cam['name']}：{'成功' if jpg_data else '失敗'}")
                 time.sleep(DELAY_BETWEEN_CAMERAS)
-            print(f"完成第 {round_number} 輪，成功 {success}/{len(selected_cameras)}")
-            round_number += 1
-            time.sleep(DELAY_BETWEEN_ROUNDS)
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                print(f"近 {REPORT_INTERVAL} 秒成功 {success}/{attempted}")
+                print(scheduler.lag_report())
+                if breakers is not None:
+                    print(breakers.summary())
+                    breakers.save()
+                if dedup is not None:
+                    print(dedup.summary())
+                if detector is not None:
+                    print(detector.summary())
+                if features is not None:
+                    print(features.summary())
+                print(http_stats.summary())
+                print(driver_pool.summary())
+                print(metrics.summary())
+                success = attempted = 0
+                last_report = time.monotonic()
     except KeyboardInterrupt:
         print("\n已停止監控")
     finally:
-        if driver:
-            driver.quit()
+        driver_pool.close()
+        if archive is not None:
+            archive.close()
+        if detector is not None:
+            detector.stop()
+        if breakers is not None:
+            breakers.save()
+        metrics.close()
+        close_sessions()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,212 @@
+import os, time, glob, queue, signal, argparse, threading
+from collections import deque, defaultdict
+
+from capture import (IMAGE_DIR, DELAY_BETWEEN_ROUNDS, MIN_INTERVAL, MAX_INTERVAL, REPORT_INTERVAL,
+                     capture_with_cache)
+from scheduler import DeadlineScheduler
+from dedup import add_dedup_args, dedup_from_args
+from frame_archive import FrameArchive
+from url_cache import ImageUrlCache
+from http_pool import close_sessions, stats as http_stats
+from camera_registry import add_selection_args, select_from_args
+from flood_detect import add_flood_args, detector_from_args
+from metrics import metrics, failure_reason, add_metrics_args, metrics_from_args
+from circuit_breaker import add_breaker_args, breakers_from_args
+from driver_pool import DriverPool, add_driver_args, pool_from_args
+from feature_store import add_feature_args, features_from_args
+
+def interleave_by_city(cameras):
+    # 各縣市輪流排，分到每個 worker 的工作不會集中在同一個縣市
+    by_city = defaultdict(deque)
+    for cam in cameras:
+        by_city[cam.get('city', '')].append(cam)
+    queues = list(by_city.values())
+    result = []
+    while queues:
+        for q in queues:
+            result.append(q.popleft())
+        queues = [q for q in queues if q]
+    return result
+
+class CityStats:
+    __slots__ = ("attempted", "success", "seconds")
+
+    def __init__(self):
+        self.attempted = 0
+        self.success = 0
+        self.seconds = 0.0
+
+class CaptureService:
+    """單一程序擷取所有縣市：DeadlineScheduler 決定誰到期，共用的佇列 + 多個 worker 執行緒
+
+    擷取以網路 I/O 與 Chrome 等待為主，執行緒等待時不佔 GIL，一個程序就能吃滿多核心；
+    每個 worker 各有自己的 HTTP 連線池；需要解析網址時向共用的 DriverPool 借 Chrome，Chrome 數量不隨 worker 增加。
+    """
+
+    def __init__(self, cameras, workers=8, url_cache=None, interval=DELAY_BETWEEN_ROUNDS,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, report_interval=REPORT_INTERVAL, dedup=None,
+                 archive=None, detector=None, breakers=None, driver_pool=None, features=None):
+        self.cameras = cameras
+        self.driver_pool = driver_pool if driver_pool is not None else DriverPool()
+        self.breakers = breakers
+        self.dedup = dedup
+        self.archive = archive
+        self.features = features
+        self.detector = detector
+        self.workers = workers
+        self.url_cache = url_cache if url_cache is not None else ImageUrlCache()
+        self.report_interval = report_interval
+        # 各縣市交錯排入，同時到期時不會集中打同一個縣市
+        # 開路中的攝影機由排程器排到下次探測的時間
+        self.scheduler = DeadlineScheduler(interleave_by_city(cameras), interval, min_interval, max_interval,
+                                           breakers=breakers)
+        self.queue = queue.Queue()
+        # 閒置的 worker 數：有 worker 閒下來才向排程器取出到期的攝影機
+        self.idle = threading.Semaphore(workers)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.city_stats = defaultdict(CityStats)
+        self.threads = []
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                cam = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            start, captured_at = time.monotonic(), time.time()
+            jpg_data = None
+            try:
+                jpg_data = capture_with_cache(cam, self.url_cache, self.driver_pool.resolve, self.dedup, self.archive,
+                                              self.features, captured_at)
+            except Exception as e:
+                # 沒預料到的錯誤只算這台這次失敗，worker 繼續跑
+                metrics.failure(cam['camera_id'], failure_reason(e), e)
+            finally:
+                # 取出的攝影機一定要回報，否則排程器不會再排它
+                self.scheduler.complete(cam, jpg_data)
+            if jpg_data is not None and self.detector is not None:
+                self.detector.submit(cam, jpg_data, start, captured_at)
+            with self.lock:
+                st = self.city_stats[cam.get('city', '')]
+                st.attempted += 1
+                st.success += jpg_data is not None
+                st.seconds += time.monotonic() - start
+            self.idle.release()
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            print("\n收到停止訊號，等待進行中的攝影機完成...")
+        self.stop_event.set()
+        self.scheduler.stop()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def report(self, elapsed):
+        print(f"近 {elapsed:.0f} 秒")
+        with self.lock:
+            for city, st in sorted(self.city_stats.items()):
+                rate = st.success / elapsed * 60 if elapsed > 0 else 0.0
+                avg = st.seconds / st.attempted if st.attempted else 0.0
+                print(f"  {city}: 成功 {st.success}/{st.attempted}，每分鐘 {rate:.1f} 台，平均每台 {avg:.1f} 秒")
+            self.city_stats.clear()
+        print(self.scheduler.lag_report())
+        if self.breakers is not None:
+            print("  " + self.breakers.summary())
+        if self.dedup is not None:
+            print("  " + self.dedup.summary())
+        if self.detector is not None:
+            print("  " + self.detector.summary())
+        if self.features is not None:
+            print("  " + self.features.summary())
+        print("  " + http_stats.summary())
+        print("  " + self.driver_pool.summary())
+        print("  " + metrics.summary())
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.threads = [threading.Thread(target=self._worker, name=f"capture-{i}", daemon=True)
+                        for i in range(self.workers)]
+        for t in self.threads:
+            t.start()
+        print(f"-- 開始擷取（{len(self.cameras)} 台，{self.workers} 個 worker）--")
+        last_report = time.monotonic()
+        try:
+            # 有 worker 閒下來才取出到期的攝影機，積壓的留在排程器依期限排序，落後時間才量得準
+            # 做完由 worker 回報排程器重新排入
+            while not self.stop_event.is_set():
+                wait = max(last_report + self.report_interval - time.monotonic(), 0)
+                if self.idle.acquire(timeout=wait):
+                    wait = max(last_report + self.report_interval - time.monotonic(), 0)
+                    cam = self.scheduler.next_due(timeout=wait)
+                    if cam is not None:
+                        self.queue.put(cam)
+                    else:
+                        self.idle.release()
+                now = time.monotonic()
+                if now - last_report >= self.report_interval and not self.stop_event.is_set():
+                    self.report(now - last_report)
+                    self.url_cache.save()
+                    if self.breakers is not None:
+                        self.breakers.save()
+                    last_report = now
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join()
+        self.driver_pool.close()
+        self.url_cache.save()
+        if self.breakers is not None:
+            self.breakers.save()
+        if self.archive is not None:
+            self.archive.close()
+        if self.detector is not None:
+            self.detector.stop()
+        metrics.close()
+        close_sessions()
+        print("已停止監控")
+
+def main():
+    parser = argparse.ArgumentParser(description="單一程序擷取多個縣市的攝影機")
+    parser.add_argument("--json", nargs="+", help="攝影機 JSON 檔案（預設為目前目錄所有 *_cameras.json）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="worker 執行緒數")
+    parser.add_argument("--storage", choices=["files", "archive"], default="files",
+                        help="files: 一張一個 JPEG；archive: 每台每天一個封存檔（frame_archive.py）")
+    parser.add_argument("--interval", type=float, default=DELAY_BETWEEN_ROUNDS, help="每台攝影機的基準擷取間隔（秒）")
+    parser.add_argument("--min-interval", type=float, default=MIN_INTERVAL, help="畫面變化大時的最短間隔")
+    parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL, help="離線或靜止時的最長間隔")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL, help="多久印一次統計（秒）")
+    add_dedup_args(parser)
+    add_selection_args(parser)
+    add_flood_args(parser)
+    add_metrics_args(parser)
+    add_breaker_args(parser)
+    add_driver_args(parser)
+    add_feature_args(parser)
+    args = parser.parse_args()
+
+    # 同一台攝影機出現在多個檔案時以先讀到的為準；多台機器分工時各自以 --shard i/n 只載入自己那一片
+    json_files = args.json or sorted(glob.glob("*_cameras.json"))
+    _, cameras = select_from_args(json_files, args)
+    if not cameras:
+        print("沒有找到任何攝影機")
+        return
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    metrics_from_args(args)
+    features = features_from_args(args)
+    CaptureService(cameras, workers=args.workers, interval=args.interval, min_interval=args.min_interval,
+                   max_interval=args.max_interval, report_interval=args.report_interval,
+                   dedup=dedup_from_args(args),
+                   archive=FrameArchive() if args.storage == "archive" else None,
+                   detector=detector_from_args(args, features), breakers=breakers_from_args(args),
+                   driver_pool=pool_from_args(args), features=features).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# 持續失敗的攝影機用斷路器（circuit breaker）暫停擷取，狀態存檔，重新啟動後不會再從頭探測一輪
+#
+#     closed     正常擷取；連續失敗 threshold 次 → open
+#     open       不擷取，等 retry_at 到了才放行一次探測 → half-open
+#     half-open  探測成功 → closed；失敗 → 再 open，等待時間加倍（base_backoff、2 倍、4 倍…，最多 max_backoff）
+#
+# 一台離線的攝影機每次要花 2 秒 sleep + 8 秒 WebDriverWait + 10 秒 HTTP timeout，開路後只會偶爾探測一次，
+# 每輪的時間取決於還活著的攝影機數量。
+#
+# 用法：
+#     python circuit_breaker.py                  列出開路中的攝影機
+#     python circuit_breaker.py --reset tnn_00001 khh_00012
+#     python circuit_breaker.py --reset-all
+#
+import os, json, time, random, argparse, threading
+from datetime import datetime
+
+from metrics import metrics
+
+BREAKER_STATE_PATH = "circuit_state.json"
+FAILURE_THRESHOLD = 3       # 連續失敗幾次開路
+BASE_BACKOFF = 900          # 第一次開路等多久再探測（秒）
+MAX_BACKOFF = 6 * 3600
+JITTER = 0.1                # 等待時間加減 10%，同時開路的攝影機不會同時探測
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class Breaker:
+    __slots__ = ("state", "failures", "opens", "retry_at", "opened_at")
+
+    def __init__(self, state=CLOSED, failures=0, opens=0, retry_at=0.0, opened_at=None):
+        self.state = state
+        self.failures = failures        # 連續失敗次數
+        self.opens = opens              # 連續開路次數，決定下次等多久
+        self.retry_at = retry_at        # time.time()，存檔後重新啟動仍然有效
+        self.opened_at = opened_at
+
+    def as_dict(self):
+        return {"state": self.state, "failures": self.failures, "opens": self.opens,
+                "retry_at": self.retry_at, "opened_at": self.opened_at}
+
+class CircuitBreakers:
+    """每台攝影機一個斷路器，多執行緒共用；只有失敗中的攝影機會記在檔案裡"""
+
+    def __init__(self, path=BREAKER_STATE_PATH, threshold=FAILURE_THRESHOLD, base_backoff=BASE_BACKOFF,
+                 max_backoff=MAX_BACKOFF, jitter=JITTER, clock=time.time):
+        self.path = path
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.breakers = {}
+        self.dirty = False
+        self.skipped = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for camera_id, entry in json.load(f).items():
+                        breaker = Breaker(**entry)
+                        if breaker.state == HALF_OPEN:      # 探測到一半就結束，重新啟動後再探測一次
+                            breaker.state = OPEN
+                        self.breakers[camera_id] = breaker
+            except (OSError, ValueError, TypeError) as e:
+                print(f"讀取斷路器狀態失敗，重新建立: {e}")
+
+    def _backoff(self, opens):
+        delay = min(self.base_backoff * 2 ** (opens - 1), self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def allow(self, camera_id):
+        """這台現在可以擷取嗎；open 且等待時間已到時轉成 half-open 放行一次探測"""
+        with self.lock:
+            breaker = self.breakers.get(camera_id)
+            if breaker is None or breaker.state == CLOSED:
+                return True
+            if breaker.state == OPEN and self.clock() >= breaker.retry_at:
+                breaker.state = HALF_OPEN
+                self.dirty = True
+                return True
+            self.skipped += 1
+            return False
+
+    def retry_after(self, camera_id):
+        """還要等幾秒才會放行（closed 與 half-open 為 0）"""
+        with self.lock:
+            breaker = self.breakers.get(camera_id)
+            if breaker is None or breaker.state != OPEN:
+                return 0.0
+            return max(breaker.retry_at - self.clock(), 0.0)
+
+    def record(self, camera_id, ok):
+        """回報擷取結果，回傳之後的狀態"""
+        with self.lock:
+            breaker = self.breakers.get(camera_id)
+            if ok:
+                if breaker is None:
+                    return CLOSED
+                del self.breakers[camera_id]
+                self.dirty = True
+                recovered = breaker.state != CLOSED
+            else:
+                if breaker is None:
+                    breaker = self.breakers[camera_id] = Breaker()
+                breaker.failures += 1
+                self.dirty = True
+                if breaker.state == CLOSED and breaker.failures < self.threshold:
+                    return CLOSED
+                # 達到門檻，或 half-open 的探測失敗：開路，等待時間隨連續開路次數加倍
+                breaker.state = OPEN
+                breaker.opens += 1
+                delay = self._backoff(breaker.opens)
+                breaker.retry_at = self.clock() + delay
+                breaker.opened_at = breaker.opened_at or datetime.now().isoformat(timespec="seconds")
+                opens = breaker.opens
+        if ok:
+            if recovered:
+                metrics.event("breaker_closed", camera_id=camera_id)
+            return CLOSED
+        metrics.event("breaker_open", camera_id=camera_id, opens=opens, retry_in=round(delay))
+        return OPEN
+
+    def reset(self, camera_ids=None):
+        with self.lock:
+            for camera_id in (list(self.breakers) if camera_ids is None else camera_ids):
+                if self.breakers.pop(camera_id, None) is not None:
+                    self.dirty = True
+
+    def open_cameras(self):
+        """[(camera_id, Breaker)]，依下次探測時間排序"""
+        with self.lock:
+            items = [(cid, b) for cid, b in self.breakers.items() if b.state != CLOSED]
+        return sorted(items, key=lambda x: x[1].retry_at)
+
+    def summary(self):
+        with self.lock:
+            states = [b.state for b in self.breakers.values()]
+            skipped, self.skipped = self.skipped, 0
+        return (f"斷路器：開路 {states.count(OPEN)} 台、探測中 {states.count(HALF_OPEN)} 台、"
+                f"失敗未達門檻 {states.count(CLOSED)} 台，略過 {skipped} 次")
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            data = {cid: b.as_dict() for cid, b in self.breakers.items()}
+            self.dirty = False
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+def add_breaker_args(parser):
+    parser.add_argument("--breaker-state", default=BREAKER_STATE_PATH, help="斷路器狀態檔")
+    parser.add_argument("--breaker-threshold", type=int, default=FAILURE_THRESHOLD, help="連續失敗幾次暫停擷取")
+    parser.add_argument("--breaker-backoff", type=float, default=BASE_BACKOFF, help="第一次暫停多久再探測（秒）")
+    parser.add_argument("--breaker-max-backoff", type=float, default=MAX_BACKOFF, help="暫停時間上限（秒）")
+    parser.add_argument("--no-breaker", action="store_true", help="不使用斷路器，失敗的攝影機照常擷取")
+
+def breakers_from_args(args):
+    """依 add_breaker_args() 的參數建立 CircuitBreakers，--no-breaker 時回傳 None"""
+    if args.no_breaker:
+        return None
+    return CircuitBreakers(args.breaker_state, threshold=args.breaker_threshold, base_backoff=args.breaker_backoff,
+                           max_backoff=args.breaker_max_backoff)
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或重設攝影機的斷路器狀態")
+    parser.add_argument("--state", default=BREAKER_STATE_PATH, help="斷路器狀態檔")
+    parser.add_argument("--reset", nargs="+", metavar="CAMERA_ID", help="重設這些攝影機（下次照常擷取）")
+    parser.add_argument("--reset-all", action="store_true", help="重設所有攝影機")
+    args = parser.parse_args()
+
+    breakers = CircuitBreakers(args.state)
+    if args.reset or args.reset_all:
+        breakers.reset(None if args.reset_all else args.reset)
+        breakers.save()
+    now = time.time()
+    opened = breakers.open_cameras()
+    print(f"開路中 {len(opened)} 台")
+    for camera_id, b in opened:
+        wait = max(b.retry_at - now, 0)
+        print(f"  {camera_id}：連續失敗 {b.failures} 次，第 {b.opens} 次開路（自 {b.opened_at}），{wait / 60:.0f} 分鐘後探測")
+
+if __name__ == "__main__":
+    main()
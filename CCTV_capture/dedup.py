@@ -0,0 +1,169 @@
+import os, glob, json, hashlib, threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+import numpy as np
+try:
+    import cv2
+except ImportError:     # 沒有 OpenCV 時只比對內容 hash
+    cv2 = None
+
+PLACEHOLDER_DIR = "placeholders"    # 已知的「無訊號」等佔位圖，放幾張 JPEG 進去即可
+DHASH_THRESHOLD = 4     # 64 bit dHash 相差幾個 bit 以內視為同一張（佔位圖；similar=True 時也用於前後兩張）
+LEARN_PLACEHOLDER = 3   # 同一張圖（內容 hash 相同）出現在幾台不同攝影機就視為佔位圖
+SEEN_LIMIT = 20000      # 自動學習時最多記住幾個 hash
+REFS_FILE = "refs.jsonl"
+
+NEW, DUPLICATE, PLACEHOLDER = "new", "duplicate", "placeholder"
+
+def content_hash(jpg_data):
+    return hashlib.sha1(jpg_data).hexdigest()
+
+def dhash(jpg_data):
+    """difference hash：縮成 9x8 灰階，比較左右相鄰像素，得到 64 bit 整數；解不開回傳 None"""
+    if cv2 is None:
+        return None
+    img = cv2.imdecode(np.frombuffer(jpg_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class _LastFrame:
+    __slots__ = ("sha1", "dhash", "filename")
+
+    def __init__(self, sha1, dhash, filename):
+        self.sha1 = sha1
+        self.dhash = dhash
+        self.filename = filename
+
+class FrameDeduplicator:
+    """寫檔前與該攝影機上一張存下的影像比對，重複或佔位圖就不再寫一份
+
+    預設只有內容 hash 完全相同才算重複：固定的路口攝影機在 9x8 的 dHash 上幾乎看不出車流、下雨或水位慢慢上升，
+    用 dHash 判斷重複會把大部分真正的新畫面只記成參照。similar=True 時才另外比縮圖的 dHash
+    （重新壓縮、時間浮水印造成的小差異也算重複）。佔位圖一律用內容 hash 與 dHash 比對。
+    mode="ref" 時重複影像只在攝影機資料夾的 refs.jsonl 記一筆指向上一張的參照；mode="drop" 直接丟棄。
+    """
+
+    def __init__(self, mode="ref", placeholder_dir=PLACEHOLDER_DIR, threshold=DHASH_THRESHOLD,
+                 learn_placeholder=LEARN_PLACEHOLDER, similar=False):
+        self.mode = mode
+        self.similar = similar
+        self.threshold = threshold
+        self.learn_placeholder = learn_placeholder
+        self.lock = threading.Lock()
+        self.last = {}
+        self.placeholder_sha1 = set()
+        self.placeholder_dhash = []
+        self.seen_by = OrderedDict()    # sha1 → 出現過的攝影機（自動學習佔位圖用，只留最近 SEEN_LIMIT 個）
+        self.counts = Counter()
+        self.bytes_saved = 0
+        if placeholder_dir and os.path.isdir(placeholder_dir):
+            for path in sorted(glob.glob(os.path.join(placeholder_dir, "*.jpg"))):
+                with open(path, "rb") as f:
+                    self.add_placeholder(f.read())
+
+    def add_placeholder(self, jpg_data):
+        h = dhash(jpg_data)
+        with self.lock:
+            self.placeholder_sha1.add(content_hash(jpg_data))
+            if h is not None:
+                self.placeholder_dhash.append(h)
+
+    def _is_placeholder(self, sha1, h):
+        if sha1 in self.placeholder_sha1:
+            return True
+        return h is not None and any(hamming(h, p) <= self.threshold for p in self.placeholder_dhash)
+
+    def _learn(self, camera_id, sha1):
+        cams = self.seen_by.get(sha1)
+        if cams is None:
+            cams = self.seen_by[sha1] = set()
+            if len(self.seen_by) > SEEN_LIMIT:
+                self.seen_by.popitem(last=False)
+        cams.add(camera_id)
+        if len(cams) >= self.learn_placeholder:
+            self.placeholder_sha1.add(sha1)
+            del self.seen_by[sha1]
+            return True
+        return False
+
+    def _seed(self, latest):
+        # 重新啟動時拿儲存區中最新的一張當作上一張；latest() 回傳 (參照, bytes) 或 None
+        try:
+            found = latest()
+        except OSError:
+            return None
+        if found is None:
+            return None
+        ref, data = found
+        return _LastFrame(content_hash(data), dhash(data) if self.similar else None, ref)
+
+    def check(self, camera_id, jpg_data, latest=None):
+        """回傳 (NEW | DUPLICATE | PLACEHOLDER, 參照的檔名或 None)"""
+        sha1 = content_hash(jpg_data)
+        with self.lock:
+            last = self.last.get(camera_id)
+            if last is None and latest is not None:
+                last = self.last[camera_id] = self._seed(latest)
+            if last is not None and last.sha1 == sha1:
+                return self._skip(DUPLICATE, jpg_data, last.filename)
+            if sha1 in self.placeholder_sha1:
+                return self._skip(PLACEHOLDER, jpg_data, None)
+        # 解碼不必持有鎖；不比相似、也沒有佔位圖的 dHash 時不必解碼
+        h = dhash(jpg_data) if self.similar or self.placeholder_dhash else None
+        with self.lock:
+            if self._is_placeholder(sha1, h) or self._learn(camera_id, sha1):
+                return self._skip(PLACEHOLDER, jpg_data, None)
+            last = self.last.get(camera_id)
+            if (self.similar and last is not None and h is not None and last.dhash is not None
+                    and hamming(h, last.dhash) <= self.threshold):
+                return self._skip(DUPLICATE, jpg_data, last.filename)
+            self.counts[NEW] += 1
+            self.last[camera_id] = _LastFrame(sha1, h, None)
+            return NEW, None
+
+    def _skip(self, kind, jpg_data, ref):
+        self.counts[kind] += 1
+        self.bytes_saved += len(jpg_data)
+        return kind, ref
+
+    def stored(self, camera_id, ref):
+        """NEW 的影像寫入後回報檔名（或封存檔參照），之後的重複影像指向它"""
+        with self.lock:
+            last = self.last.get(camera_id)
+            if last is not None:
+                last.filename = ref
+
+    def record_ref(self, cam_dir, camera_id, kind, ref):
+        if self.mode != "ref":
+            return
+        line = json.dumps({"time": datetime.now().strftime("%Y%m%d_%H%M%S"), "camera_id": camera_id,
+                           "kind": kind, "ref": os.path.basename(ref) if ref else None}, ensure_ascii=False)
+        with open(os.path.join(cam_dir, REFS_FILE), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def summary(self):
+        with self.lock:
+            new, dup, ph = self.counts[NEW], self.counts[DUPLICATE], self.counts[PLACEHOLDER]
+            total = new + dup + ph
+            saved = dup + ph
+            return (f"去重：{total} 張中寫入 {new}，重複 {dup}，佔位圖 {ph}，"
+                    f"省下 {saved} 張（{100 * saved / total if total else 0:.0f}%）、{self.bytes_saved / 1e6:.1f} MB")
+
+def add_dedup_args(parser):
+    parser.add_argument("--dedup", choices=["ref", "drop", "off"], default="ref",
+                        help="重複（內容完全相同）或佔位影像：ref 不寫檔只記參照、drop 直接丟棄、off 全部寫檔")
+    parser.add_argument("--dedup-similar", action="store_true",
+                        help=f"與上一張的 dHash 相差 {DHASH_THRESHOLD} bit 以內也算重複（會漏掉緩慢的畫面變化，例如水位上升）")
+
+def dedup_from_args(args):
+    """依 add_dedup_args() 的參數建立 FrameDeduplicator，--dedup off 時回傳 None"""
+    if args.dedup == "off":
+        return None
+    return FrameDeduplicator(args.dedup, similar=args.dedup_similar)
@@ -0,0 +1,249 @@
+# 需要開網頁解析影像網址時共用的 Chrome 池
+#
+#   - N 個 headless Chrome 由所有擷取 worker 共用，同一個分頁（視窗）重複載入不同攝影機頁面，用完切到 about:blank
+#     讓頁面上的串流與計時器停下來
+#   - pageLoadStrategy=eager，DOM 建好就開始找元素
+#   - 不再固定 sleep 2 秒：每 0.1 秒檢查 src，帶 t= 就回傳；等不到 t= 改用原本的 src 時印出警告
+#   - block_resources=True（--block-resources）時不載入讀取 src 用不到的資源：圖片（包括頁面上的 MJPEG 串流本身）、
+#     CSS、字型、追蹤碼。src 的 t= 可能由頁面上的腳本在圖片載入後才補上，封鎖後拿到的網址是否一樣
+#     要先對真實網站確認，所以預設不封鎖
+#   - 每個 Chrome 載入 K 頁後關掉重開，限制長時間執行的記憶體成長
+#
+import time, threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import WebDriverException, TimeoutException, StaleElementReferenceException
+from webdriver_manager.chrome import ChromeDriverManager
+
+from metrics import metrics
+
+DRIVER_POOL_SIZE = 2
+MAX_PAGES = 100             # 每個 Chrome 載入幾頁後重開
+PAGE_LOAD_TIMEOUT = 15
+IMAGE_WAIT = 8              # 等 img.video_obj 的 src 最多幾秒
+SRC_SETTLE = 1.5            # src 一直沒有 t= 時，等這麼久就接受原本的 src
+POLL = 0.1
+BLOCKED_URLS = ["*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.png", "*.jpg", "*.jpeg", "*.gif",
+                "*.svg", "*.ico", "*.webp", "*.mp4", "*google-analytics.com*", "*googletagmanager.com*",
+                "*doubleclick.net*", "*facebook.net*"]
+
+def make_chrome_driver(block_resources=False):
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.page_load_strategy = "eager"
+    if block_resources:
+        # 圖片不載入也不影響 img 元素的 src 屬性
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return driver
+
+class _ImageUrlReady:
+    """WebDriverWait 的條件：img.video_obj 的 src 帶 t= 就回傳；有 src 但一直沒有 t= 時，等 settle 秒後回傳原本的 src
+
+    走到後者時 settled 為 True。
+    """
+
+    def __init__(self, settle=SRC_SETTLE):
+        self.settle = settle
+        self.first_seen = None
+        self.settled = False
+
+    def __call__(self, driver):
+        elems = driver.find_elements(By.CSS_SELECTOR, "img.video_obj")
+        if not elems:
+            return False
+        src = elems[0].get_attribute("src")
+        if not src:
+            return False
+        if "t=" in src:
+            return src
+        now = time.monotonic()
+        if self.first_seen is None:
+            self.first_seen = now
+        if now - self.first_seen < self.settle:
+            return False
+        self.settled = True
+        return src
+
+def get_latest_image_url(driver, timeout=IMAGE_WAIT):
+    ready = _ImageUrlReady()
+    try:
+        src = WebDriverWait(driver, timeout, poll_frequency=POLL,
+                            ignored_exceptions=(StaleElementReferenceException,)).until(ready)
+    except TimeoutException:
+        return None
+    if ready.settled:
+        # 網站改版或封鎖資源後 src 不再帶 t=，拿到的可能是舊的或不會更新的網址
+        print(f"⚠️ img.video_obj 的 src 等了 {ready.settle} 秒仍沒有 t=，改用原本的 src：{src}")
+        metrics.event("src_settle_fallback", page=driver.current_url, src=src)
+    return src
+
+def resolve_image_url(driver, cam_url):
+    with metrics.timer("page_load"):
+        driver.get(cam_url)
+    with metrics.timer("url_resolve"):
+        return get_latest_image_url(driver)
+
+class PooledDriver:
+    __slots__ = ("driver", "number", "pages", "busy", "created")
+
+    def __init__(self, driver, number):
+        self.driver = driver
+        self.number = number
+        self.pages = 0
+        self.busy = 0.0         # 載入頁面花的總秒數
+        self.created = time.monotonic()
+
+    @property
+    def pages_per_second(self):
+        return self.pages / self.busy if self.busy else 0.0
+
+class DriverPool:
+    """最多 size 個 Chrome，多執行緒共用；需要時才開，載入 max_pages 頁或出錯後關掉，下次需要再開新的
+
+    with pool.driver() as driver: ... 借用一個 Chrome，resolve(cam_url) 直接解析一台攝影機的影像網址。
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=MAX_PAGES, block_resources=False, factory=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.factory = factory or (lambda: make_chrome_driver(block_resources))
+        self.cond = threading.Condition()
+        self.idle = []
+        self.live = {}          # number → PooledDriver（閒置與借出中）
+        self.numbered = 0
+        self.recycled = 0
+        self.broken = 0
+        self.retired_pages = 0
+        self.retired_busy = 0.0
+        self.closed = False
+        self.started = time.monotonic()
+
+    def _acquire(self):
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise RuntimeError("DriverPool 已關閉")
+                if self.idle:
+                    return self.idle.pop()
+                if len(self.live) < self.size:
+                    self.numbered += 1
+                    number = self.numbered
+                    self.live[number] = None    # 先佔位，開 Chrome 不在鎖內
+                    break
+                self.cond.wait()
+        try:
+            pooled = PooledDriver(self.factory(), number)
+        except BaseException:
+            with self.cond:
+                del self.live[number]
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.live[number] = pooled
+        return pooled
+
+    def _release(self, pooled, broken):
+        retire = broken or self.closed or pooled.pages >= self.max_pages
+        if not retire:
+            try:
+                pooled.driver.get("about:blank")
+            except WebDriverException:
+                retire = broken = True
+        if not retire:
+            with self.cond:
+                if not self.closed:
+                    self.idle.append(pooled)
+                    self.cond.notify()
+                    return
+        self._quit(pooled)
+        with self.cond:
+            self.live.pop(pooled.number, None)
+            self.retired_pages += pooled.pages
+            self.retired_busy += pooled.busy
+            if broken:
+                self.broken += 1
+            elif not self.closed:
+                self.recycled += 1
+            self.cond.notify()
+
+    def _quit(self, pooled):
+        try:
+            pooled.driver.quit()
+        except WebDriverException:
+            pass
+
+    @contextmanager
+    def driver(self):
+        pooled = self._acquire()
+        broken = False
+        start = time.perf_counter()
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            pooled.busy += time.perf_counter() - start
+            pooled.pages += 1
+            self._release(pooled, broken)
+
+    def resolve(self, cam_url):
+        """開攝影機頁面取得影像網址（找不到時回傳 None）"""
+        with self.driver() as driver:
+            return resolve_image_url(driver, cam_url)
+
+    def stats(self):
+        with self.cond:
+            drivers = [p for p in self.live.values() if p is not None]
+            pages = self.retired_pages + sum(p.pages for p in drivers)
+            busy = self.retired_busy + sum(p.busy for p in drivers)
+            return {
+                "drivers": [{"number": p.number, "pages": p.pages, "pages_per_second": p.pages_per_second,
+                             "age": time.monotonic() - p.created} for p in sorted(drivers, key=lambda p: p.number)],
+                "idle": len(self.idle),
+                "pages": pages,
+                "pages_per_second": pages / busy if busy else 0.0,
+                "recycled": self.recycled,
+                "broken": self.broken,
+            }
+
+    def summary(self):
+        s = self.stats()
+        if not s["pages"]:
+            return f"Chrome 池：{len(s['drivers'])}/{self.size} 個，尚未載入頁面"
+        each = "、".join(f"#{d['number']} {d['pages']} 頁 {d['pages_per_second']:.2f} 頁/秒" for d in s["drivers"])
+        return (f"Chrome 池：{len(s['drivers'])}/{self.size} 個（閒置 {s['idle']}），共 {s['pages']} 頁，"
+                f"每個 Chrome 每秒 {s['pages_per_second']:.2f} 頁，重開 {self.recycled} 次、出錯 {self.broken} 次"
+                + (f"；{each}" if each else ""))
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            for pooled in idle:
+                self.live.pop(pooled.number, None)
+            self.cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+
+def add_driver_args(parser, default_size=DRIVER_POOL_SIZE):
+    parser.add_argument("--drivers", type=int, default=default_size, help="共用的 Chrome 數量（解析影像網址用）")
+    parser.add_argument("--driver-max-pages", type=int, default=MAX_PAGES, help="每個 Chrome 載入幾頁後重開")
+    parser.add_argument("--block-resources", action="store_true",
+                        help="不載入頁面上的圖片、CSS、字型與追蹤碼（較快，先確認拿到的網址與不封鎖時相同）")
+
+def pool_from_args(args):
+    return DriverPool(args.drivers, max_pages=args.driver_max_pages, block_resources=args.block_resources)
@@ -0,0 +1,421 @@
+# 每張擷取影像的精簡特徵，依攝影機與日期存成欄式檔案，查歷史畫面不必再 glob 幾千張 JPEG 逐張解碼
+#
+#     <root>/<camera_id>/<YYYYMMDD>.ts           float64  擷取時間（與檔名 {camera_id}_{timestamp}.jpg 的時間相同）
+#     <root>/<camera_id>/<YYYYMMDD>.brightness   float32  平均亮度（0~1）
+#     <root>/<camera_id>/<YYYYMMDD>.change       float32  與上一張的畫面變化（與 scheduler 相同，第一張為 NaN）
+#     <root>/<camera_id>/<YYYYMMDD>.thumb        uint8    32x32 灰階縮圖
+#     <root>/<camera_id>/<YYYYMMDD>.flood_ts     float64  淹水分數的時間
+#     <root>/<camera_id>/<YYYYMMDD>.flood        float32  淹水分數（FloodDetector 寫入，查詢時對到時間最接近的那一張）
+#
+# 每個欄位都是沒有檔頭的固定長度紀錄，追加寫入，最後才寫 ts / flood_ts；列數取各欄位的最小值，
+# 當機時寫一半的紀錄在下次寫入時截掉。讀取以 np.memmap 開啟，依時間二分搜尋後只複製需要的列。
+#
+# 用法：
+#     python feature_store.py list
+#     python feature_store.py query tnn_00004 "khh_*" --start 20250701_000000 --end 20250708_000000 --sheet typhoon.jpg
+#     python feature_store.py backfill D:\Taiwan_CCTV\downloaded_images [--flood-model dummy]
+#
+import os, re, glob, time, fnmatch, argparse, threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+try:
+    import cv2
+except ImportError:     # 沒有 OpenCV 時無法從 JPEG 算特徵，只能查詢
+    cv2 = None
+
+from scheduler import THUMB_SIZE, frame_thumbnail, frame_change
+from frame_archive import ARCHIVE_EXT, ArchiveReader, iter_archives, parse_time, format_time
+
+FEATURE_DIR = "features"
+DAY_FORMAT = "%Y%m%d"
+FLOOD_WINDOW = 30           # 淹水分數與影像的時間相差幾秒內才算同一張
+BACKFILL_CHUNK = 256
+
+# 欄位名稱 → (dtype, 每列的形狀)；最後一個欄位最後寫，代表整列已寫完
+FRAME_COLUMNS = {"brightness": ("<f4", ()), "change": ("<f4", ()), "thumb": ("u1", (THUMB_SIZE, THUMB_SIZE)),
+                 "ts": ("<f8", ())}
+FLOOD_COLUMNS = {"flood": ("<f4", ()), "flood_ts": ("<f8", ())}
+QUERY_COLUMNS = ("ts", "brightness", "change", "thumb", "flood")
+
+_FRAME_RE = re.compile(r"^([a-z]{3}_\d+)_(\d{8}_\d{6})(?:_\d+)?\.jpg$")   # 與 frame_archive 的單張檔名相同
+
+def day_of(ts):
+    return time.strftime(DAY_FORMAT, time.localtime(ts))
+
+def _day_range(day):
+    start = datetime.strptime(day, DAY_FORMAT)
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+def _column_path(cam_root, day, column):
+    return os.path.join(cam_root, f"{day}.{column}")
+
+def _row_bytes(dtype, shape):
+    return np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+
+def _rows(cam_root, day, columns):
+    """這一天已經完整寫入的列數"""
+    count = None
+    for column, (dtype, shape) in columns.items():
+        path = _column_path(cam_root, day, column)
+        n = os.path.getsize(path) // _row_bytes(dtype, shape) if os.path.exists(path) else 0
+        count = n if count is None else min(count, n)
+    return count or 0
+
+def _memmap(cam_root, day, column, columns, count):
+    dtype, shape = columns[column]
+    return np.memmap(_column_path(cam_root, day, column), dtype=dtype, mode="r", shape=(count,) + shape)
+
+def _empty(columns, column):
+    dtype, shape = columns[column]
+    return np.empty((0,) + shape, dtype)
+
+class FeatureStore:
+    """擷取端寫入（record / record_flood，可多執行緒共用）與查詢（query / query_many）"""
+
+    def __init__(self, root=FEATURE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.rows = {}          # (camera_id, 欄位組) → (日期, 已寫入列數)
+        self.last = {}          # camera_id → 上一張縮圖（float32 0~1），算畫面變化用
+        self.frames = 0
+        self.floods = 0
+        self.failed = 0
+
+    # ---------------- 寫入 ----------------
+
+    def _append(self, camera_id, columns, values):
+        """values 為 {欄位: 陣列}，各欄位列數相同；依日期分別追加到對應的檔案"""
+        cam_root = os.path.join(self.root, camera_id)
+        commit = list(columns)[-1]
+        days = [day_of(t) for t in values[commit]]
+        key = (camera_id, commit)
+        with self.lock:
+            start = 0
+            while start < len(days):
+                day = days[start]
+                end = start + 1
+                while end < len(days) and days[end] == day:
+                    end += 1
+                cached = self.rows.get(key)
+                count = cached[1] if cached is not None and cached[0] == day else self._recover(cam_root, day, columns)
+                for column, (dtype, shape) in columns.items():
+                    data = np.ascontiguousarray(values[column][start:end], dtype=dtype)
+                    with open(_column_path(cam_root, day, column), "ab") as f:
+                        f.write(data.tobytes())
+                self.rows[key] = (day, count + end - start)
+                start = end
+
+    def _recover(self, cam_root, day, columns):
+        # 對齊各欄位：截掉當機時寫一半的列
+        os.makedirs(cam_root, exist_ok=True)
+        count = _rows(cam_root, day, columns)
+        for column, (dtype, shape) in columns.items():
+            path = _column_path(cam_root, day, column)
+            size = count * _row_bytes(dtype, shape)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        return count
+
+    def append_frames(self, camera_id, ts, brightness, change, thumb):
+        """直接寫入多列特徵（backfill 用）；thumb 為 (N, 32, 32) uint8"""
+        self._append(camera_id, FRAME_COLUMNS, {"ts": np.asarray(ts, np.float64), "brightness": brightness,
+                                                "change": change, "thumb": thumb})
+        with self.lock:
+            self.frames += len(ts)
+
+    def record(self, camera_id, jpg_data, ts=None):
+        """擷取到一張影像時呼叫（重複影像也記，畫面變化為 0），回傳是否寫入"""
+        ts = time.time() if ts is None else ts
+        prev = self.last.get(camera_id)
+        if prev is None and camera_id not in self.last:
+            prev = self.last_thumb(camera_id)     # 重新啟動後接續上次最後一張
+        result = frame_features(jpg_data, prev)
+        if result is None:
+            with self.lock:
+                self.failed += 1
+            return False
+        thumb, brightness, change = result
+        self.last[camera_id] = thumb
+        self.append_frames(camera_id, [ts], [brightness], [change], _to_uint8(thumb)[None])
+        return True
+
+    def record_flood(self, camera_id, score, ts=None):
+        ts = time.time() if ts is None else ts
+        self._append(camera_id, FLOOD_COLUMNS, {"flood_ts": np.array([ts]), "flood": np.array([score])})
+        with self.lock:
+            self.floods += 1
+
+    def last_thumb(self, camera_id):
+        """最後寫入的縮圖（float32 0~1），沒有時回傳 None"""
+        cam_root = os.path.join(self.root, camera_id)
+        for day in reversed(self.days(camera_id)):
+            count = _rows(cam_root, day, FRAME_COLUMNS)
+            if count:
+                row = _memmap(cam_root, day, "thumb", FRAME_COLUMNS, count)[count - 1]
+                return row.astype(np.float32) / 255.0
+        return None
+
+    # ---------------- 查詢 ----------------
+
+    def cameras(self, patterns=None):
+        """有特徵的攝影機；patterns 可用萬用字元（例如 tnn_*）"""
+        if not os.path.isdir(self.root):
+            return []
+        names = sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+        if not patterns:
+            return names
+        return [name for name in names if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+    def days(self, camera_id):
+        paths = glob.glob(os.path.join(self.root, camera_id, "*.ts"))
+        return sorted(os.path.basename(p)[:-3] for p in paths)
+
+    def _days_in(self, camera_id, start, end, commit):
+        for day in sorted(os.path.basename(p).rsplit(".", 1)[0]
+                          for p in glob.glob(os.path.join(self.root, camera_id, f"*.{commit}"))):
+            day_start, day_end = _day_range(day)
+            if (start is None or day_end > start) and (end is None or day_start < end):
+                yield day
+
+    def _read(self, camera_id, columns, wanted, start, end):
+        # 各天的 memmap 只取 [start, end) 的列，複製出來後合併，依時間排序
+        cam_root = os.path.join(self.root, camera_id)
+        commit = list(columns)[-1]
+        lo = -np.inf if start is None else start
+        hi = np.inf if end is None else end
+        parts = []
+        for day in self._days_in(camera_id, start, end, commit):
+            count = _rows(cam_root, day, columns)
+            if not count:
+                continue
+            ts = _memmap(cam_root, day, commit, columns, count)
+            if np.all(ts[1:] >= ts[:-1]):
+                sel = slice(int(np.searchsorted(ts, lo, side="left")), int(np.searchsorted(ts, hi, side="left")))
+            else:   # backfill 補了比現有資料早的影像
+                sel = np.flatnonzero((ts >= lo) & (ts < hi))
+            parts.append({c: np.array(_memmap(cam_root, day, c, columns, count)[sel]) for c in wanted})
+            del ts
+        if not parts:
+            return {c: _empty(columns, c) for c in wanted}
+        data = {c: np.concatenate([p[c] for p in parts]) for c in wanted}
+        order = data[commit]
+        if np.any(order[1:] < order[:-1]):
+            order = np.argsort(order, kind="stable")
+            data = {c: v[order] for c, v in data.items()}
+        return data
+
+    def _match_flood(self, camera_id, ts, start, end):
+        # 每個淹水分數對到時間最接近（FLOOD_WINDOW 秒內）的影像；同一張有多個分數時取最後一個
+        flood = np.full(len(ts), np.nan, np.float32)
+        if not len(ts):
+            return flood
+        lo = None if start is None else start - FLOOD_WINDOW
+        hi = None if end is None else end + FLOOD_WINDOW
+        scores = self._read(camera_id, FLOOD_COLUMNS, ("flood_ts", "flood"), lo, hi)
+        at, score = scores["flood_ts"], scores["flood"]
+        if not len(at):
+            return flood
+        right = np.clip(np.searchsorted(ts, at), 1, len(ts) - 1) if len(ts) > 1 else np.zeros(len(at), np.intp)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(np.abs(ts[left] - at) <= np.abs(ts[right] - at), left, right)
+        ok = np.abs(ts[nearest] - at) <= FLOOD_WINDOW
+        flood[nearest[ok]] = score[ok]
+        return flood
+
+    def query(self, camera_id, start=None, end=None, columns=QUERY_COLUMNS):
+        """一台攝影機在 [start, end)（time.time() 秒數，None 為不限）的特徵，回傳 {欄位: 陣列}，依時間排序
+
+        columns 可選 ts、brightness、change、thumb、flood；一定包含 ts。
+        """
+        wanted = ["ts"] + [c for c in columns if c in FRAME_COLUMNS and c != "ts"]
+        unknown = set(columns) - set(FRAME_COLUMNS) - {"flood"}
+        if unknown:
+            raise ValueError(f"沒有這些欄位：{sorted(unknown)}")
+        data = self._read(camera_id, FRAME_COLUMNS, wanted, start, end)
+        if "flood" in columns:
+            data["flood"] = self._match_flood(camera_id, data["ts"], start, end)
+        return data
+
+    def query_many(self, patterns=None, start=None, end=None, columns=QUERY_COLUMNS, workers=8):
+        """多台攝影機（patterns 為 ID 或萬用字元，None 為全部）→ {camera_id: query() 的結果}，略過沒有資料的"""
+        cameras = self.cameras(patterns)
+        with ThreadPoolExecutor(max(1, min(workers, len(cameras)))) as pool:
+            results = pool.map(lambda cid: (cid, self.query(cid, start, end, columns)), cameras)
+            return {cid: data for cid, data in results if len(data["ts"])}
+
+    def summary(self):
+        return f"特徵庫：寫入 {self.frames} 張、淹水分數 {self.floods} 筆，無法解碼 {self.failed} 張（{self.root}）"
+
+def frame_features(jpg_data, prev=None):
+    """從 JPEG 算出 (縮圖 float32, 亮度, 與 prev 縮圖的變化)；解不開時回傳 None"""
+    thumb = frame_thumbnail(jpg_data)
+    if thumb is None:
+        return None
+    change = frame_change(prev, thumb)
+    return thumb, float(thumb.mean()), np.nan if change is None else change
+
+def _to_uint8(thumb):
+    return np.round(thumb * 255).astype(np.uint8)
+
+def contact_sheet(thumbs, ts, per_row=12, scale=3):
+    """把縮圖排成一張總覽圖，每格左上角標時間（月/日 時:分）"""
+    n = len(thumbs)
+    size = THUMB_SIZE * scale
+    rows = max(1, -(-n // per_row))
+    sheet = np.zeros((rows * size, min(n, per_row) * size if n else size), np.uint8)
+    for i in range(n):
+        tile = cv2.resize(thumbs[i], (size, size), interpolation=cv2.INTER_NEAREST)
+        cv2.putText(tile, datetime.fromtimestamp(ts[i]).strftime("%m/%d %H:%M"), (2, 10), cv2.FONT_HERSHEY_PLAIN,
+                    0.7, 255, 1)
+        y, x = divmod(i, per_row)
+        sheet[y * size:(y + 1) * size, x * size:(x + 1) * size] = tile
+    return sheet
+
+def add_feature_args(parser):
+    parser.add_argument("--features", nargs="?", const=FEATURE_DIR,
+                        help=f"每張影像的縮圖、亮度、畫面變化與淹水分數另外寫進特徵庫（預設資料夾 {FEATURE_DIR}）")
+
+def features_from_args(args):
+    """依 add_feature_args() 的參數建立 FeatureStore，沒指定 --features 時回傳 None"""
+    return FeatureStore(args.features) if args.features else None
+
+# ---------------- backfill：從既有的單張 JPEG 與封存檔補算特徵 ----------------
+
+def _scan_sources(root):
+    """{camera_id: [(ts, 單張檔案路徑或 (封存檔, 序號)), ...]}"""
+    sources = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            m = _FRAME_RE.match(name)
+            if m:
+                sources.setdefault(m.group(1), []).append((parse_time(m.group(2)), os.path.join(dirpath, name)))
+    for path in iter_archives(root):
+        camera_id = os.path.basename(path)[:-len(ARCHIVE_EXT)].rsplit("_", 1)[0]
+        with ArchiveReader(path) as reader:
+            sources.setdefault(camera_id, []).extend((float(t), (path, i)) for i, t in enumerate(reader.timestamps))
+    return sources
+
+def _read_source(source, readers):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    path, i = source
+    if path not in readers:
+        for reader in readers.values():
+            reader.close()
+        readers.clear()
+        readers[path] = ArchiveReader(path)
+    return bytes(readers[path].frame(i))
+
+def backfill_camera(store, camera_id, entries, detector=None):
+    """補算一台攝影機的特徵，已有的時間（以秒為單位比對）略過；回傳 (寫入張數, 無法解碼張數)"""
+    from flood_detect import _Frame
+    existing = set(np.floor(store.query(camera_id, columns=("ts",))["ts"]).tolist())
+    entries = sorted(e for e in entries if np.floor(e[0]) not in existing)
+    readers = {}
+    written = failed = 0
+    prev = None
+    cam = {"camera_id": camera_id, "name": camera_id}
+    try:
+        for lo in range(0, len(entries), BACKFILL_CHUNK):
+            rows, frames = [], []
+            for ts, source in entries[lo:lo + BACKFILL_CHUNK]:
+                jpg_data = _read_source(source, readers)
+                result = frame_features(jpg_data, prev)
+                if result is None:
+                    failed += 1
+                    continue
+                prev = result[0]
+                rows.append((ts,) + result)
+                if detector is not None:
+                    frames.append(_Frame(cam, jpg_data, time.monotonic(), ts))
+            if rows:
+                ts, thumbs, brightness, change = zip(*rows)
+                store.append_frames(camera_id, ts, brightness, change, _to_uint8(np.stack(thumbs)))
+                written += len(rows)
+            if detector is not None:
+                for i in range(0, len(frames), detector.batch_size):
+                    detector.process(frames[i:i + detector.batch_size])
+    finally:
+        for reader in readers.values():
+            reader.close()
+    return written, failed
+
+def backfill(store, root, patterns=None, workers=4, detector=None):
+    sources = _scan_sources(root)
+    cameras = sorted(cid for cid in sources if not patterns or any(fnmatch.fnmatchcase(cid, p) for p in patterns))
+    print(f"{root}：{len(cameras)} 台攝影機、{sum(len(sources[c]) for c in cameras)} 張影像")
+    start = time.perf_counter()
+    total = 0
+    # 推論只有一份模型與批次緩衝，有 detector 時依序處理
+    with ThreadPoolExecutor(1 if detector is not None else workers) as pool:
+        for camera_id, (written, failed) in zip(cameras, pool.map(
+                lambda cid: backfill_camera(store, cid, sources[cid], detector), cameras)):
+            total += written
+            if written or failed:
+                print(f"  {camera_id}：補 {written} 張" + (f"，無法解碼 {failed} 張" if failed else ""))
+    elapsed = time.perf_counter() - start
+    print(f"共補 {total} 張，耗時 {elapsed:.1f} 秒（{total / elapsed if elapsed else 0:.0f} 張/秒）")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="影像特徵庫：查詢歷史畫面與補算既有影像")
+    parser.add_argument("--features", default=FEATURE_DIR, help="特徵庫資料夾")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出各攝影機的資料範圍")
+    p = sub.add_parser("query", help="查詢一段時間內多台攝影機的特徵")
+    p.add_argument("cameras", nargs="*", help="camera_id 或萬用字元（例如 \"tnn_*\"），不給為全部")
+    p.add_argument("--start", help="起始時間 YYYYMMDD_HHMMSS")
+    p.add_argument("--end", help="結束時間 YYYYMMDD_HHMMSS（不含）")
+    p.add_argument("--sheet", help="把縮圖排成總覽圖存到這個檔案（每台攝影機一張，檔名加上 camera_id）")
+    p = sub.add_parser("backfill", help="從既有的單張 JPEG 與封存檔補算特徵")
+    p.add_argument("root", help="影像資料夾（例如 D:\\Taiwan_CCTV\\downloaded_images）")
+    p.add_argument("--cameras", nargs="+", help="只補這些 camera_id 或萬用字元")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--flood-model", help="同時補算淹水分數：dummy 或 .onnx 模型路徑")
+    p.add_argument("--flood-enhance", help="推論前先做低光增強：LUT .dat 或 LUT family .npy")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.features)
+    if args.command == "list":
+        for camera_id in store.cameras():
+            data = store.query(camera_id, columns=("ts",))
+            days = store.days(camera_id)
+            span = f"{format_time(data['ts'][0])} ~ {format_time(data['ts'][-1])}" if len(data["ts"]) else "-"
+            print(f"{camera_id}：{len(data['ts'])} 張、{len(days)} 天，{span}")
+    elif args.command == "query":
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+        columns = QUERY_COLUMNS if args.sheet else ("ts", "brightness", "change", "flood")
+        t0 = time.perf_counter()
+        results = store.query_many(args.cameras or None, start, end, columns)
+        elapsed = time.perf_counter() - t0
+        print(f"{len(results)} 台攝影機、{sum(len(d['ts']) for d in results.values())} 張，查詢 {elapsed * 1000:.0f} ms")
+        for camera_id, data in results.items():
+            ts, flood = data["ts"], data["flood"]
+            line = (f"  {camera_id}：{len(ts)} 張 {format_time(ts[0])} ~ {format_time(ts[-1])}，"
+                    f"亮度 {np.nanmin(data['brightness']):.2f}~{np.nanmax(data['brightness']):.2f}")
+            if not np.all(np.isnan(data["change"])):
+                line += f"，最大變化 {np.nanmax(data['change']):.3f}"
+            if not np.all(np.isnan(flood)):
+                i = int(np.nanargmax(flood))
+                line += f"，最高淹水分數 {flood[i]:.2f}（{format_time(ts[i])}）"
+            print(line)
+            if args.sheet:
+                base, ext = os.path.splitext(args.sheet)
+                cv2.imwrite(f"{base}_{camera_id}{ext or '.jpg'}", contact_sheet(data["thumb"], ts))
+    elif args.command == "backfill":
+        detector = None
+        if args.flood_model:
+            from flood_detect import FloodDetector, load_model, load_enhancer
+            enhance = load_enhancer(args.flood_enhance) if args.flood_enhance else None
+            detector = FloodDetector(load_model(args.flood_model), enhance=enhance, output=None, features=store)
+        backfill(store, args.root, args.cameras, args.workers, detector)
+        if detector is not None:
+            print(detector.summary())
+
+if __name__ == "__main__":
+    main()
@@ -2,176 +2,417 @@ import requests
 import json
 import time
 import os
-from bs4 import BeautifulSoup
+import html
 import urllib3
 from datetime import datetime
+from urllib.parse import urljoin
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import glob
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import threading
+from http_pool import new_session, RateLimiter
+from url_cache import ImageUrlCache, URL_CACHE_PATH
+from camera_registry import CITY_CODES, load_registry
+from probe_cache import (ProbeCache, PROBE_CACHE_PATH, CAMERA_TTL, MISSING_TTL, CAMERA, MISSING, ERROR,
+                         diff_camera_lists)
 
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+MISS_GAP = 40           # 最後一台之後連續幾個 ID 沒有攝影機就停止探測
+PROBE_WORKERS = 16      # 所有縣市共用的探測執行緒數
+PROBE_RATE = 20.0       # 所有縣市合計每秒最多送出幾個請求
+PROBE_RETRIES = 2       # 429 / 5xx / 連線錯誤的 ID 最多重試幾次
+
+PAGE_CHUNK = 4096               # 串流讀頁面每次讀多少
+PAGE_MAX_BYTES = 256 * 1024     # 讀到這麼多還找不到就放棄
+PAGE_DRAIN_BYTES = 64 * 1024    # 找到後剩下不到這麼多就讀完，連線留在 keep-alive 池裡重用
+_TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title", re.IGNORECASE | re.DOTALL)
+_TITLE_OPEN_RE = re.compile(rb"<title", re.IGNORECASE)
+_VIDEO_OPEN_RE = re.compile(rb"<(?:img|video)\b", re.IGNORECASE)
+_VIDEO_ATTR_RE = re.compile(rb"""(?<=[\s"'/])(?:id|class)\s*=\s*(?:"[^"]*\bvideo_obj\b|'[^']*\bvideo_obj\b|video_obj\b)""",
+                            re.IGNORECASE)
+_SRC_RE = re.compile(rb"""\bsrc\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+_PLACEHOLDER_SRC_RE = re.compile(r"^data:|\.(gif|png|svg)(\?|$)", re.IGNORECASE)
+
+def scan_camera_page(response, max_bytes=PAGE_MAX_BYTES):
+    """串流讀攝影機頁面，找到 <title> 與 video_obj 元素就停止，回傳 (是否有 video_obj, 標題, 影像網址)
+    
+    只用 regex 掃描已讀到的 bytes，不建 DOM；id 或 class 為 video_obj 的 <img> / <video> 標籤的 src
+    即影像串流網址（佔位圖或還沒由 JavaScript 填入時為 None）。CSS 或 script 裡的 video_obj 字樣不算。
+    每收到一段只從上次掃到的位置往後找（往前留標記長度，標記被切在兩段之間也找得到），不會每段都從頭重掃。
+    """
+    buf = bytearray()
+    title = None
+    has_video = False
+    image_url = None
+    title_scan = video_scan = 0     # 下一次找 <title / <img、<video 的起點
+    title_start = None              # 已找到 <title 但還沒讀到 </title 時，從這裡重新比對
+    for chunk in response.iter_content(PAGE_CHUNK):
+        buf += chunk
+        if title is None:
+            if title_start is None:
+                m = _TITLE_OPEN_RE.search(buf, title_scan)
+                if m:
+                    title_start = m.start()
+                else:
+                    title_scan = max(len(buf) - len(b"<title") + 1, 0)
+            if title_start is not None:
+                m = _TITLE_RE.search(buf, title_start)
+                if m:
+                    title = html.unescape(m.group(1).decode("utf-8", "replace")).strip()
+        while not has_video:
+            m = _VIDEO_OPEN_RE.search(buf, video_scan)
+            if not m:
+                video_scan = max(len(buf) - len(b"<video") + 1, 0)
+                break
+            video_scan = m.start()
+            tag_end = buf.find(b">", m.end())
+            if tag_end == -1:
+                break       # 標籤還沒讀完，下一段從標籤開頭重新比對
+            video_scan = tag_end + 1
+            if _VIDEO_ATTR_RE.search(buf, m.end(), tag_end):
+                has_video = True
+                m = _SRC_RE.search(buf, m.end(), tag_end)
+                if m:
+                    src = html.unescape(m.group(1).decode("utf-8", "replace"))
+                    if not _PLACEHOLDER_SRC_RE.search(src):
+                        image_url = urljoin(response.url, src)
+        if (title is not None and has_video) or len(buf) >= max_bytes:
+            break
+    return has_video, title, image_url
+
+def drain_small_remainder(response, limit=PAGE_DRAIN_BYTES):
+    """頁面剩下的部分不到 limit 就讀完，連線放回 keep-alive 池；剩很多（或不知道長度）時寧可關掉重連"""
+    length = response.headers.get("Content-Length")
+    if not (length and length.isdigit()) or int(length) - response.raw.tell() > limit:
+        return
+    try:
+        for _ in response.iter_content(PAGE_CHUNK):
+            pass
+    except requests.RequestException:
+        pass
+
+class CityProbe:
+    """單一縣市的探測進度：從 1 往上探測，命中就把上限往後延伸
+    
+    上限 = max(最大命中編號, floor) + miss_gap，floor 為之前已知的最大編號；
+    編號超過上限（最後一台之後連續 miss_gap 個都沒有）就停。
+    
+    ERROR（429 / 5xx / 連線錯誤）不算「沒有攝影機」：該 ID 重新排入佇列最多重試 PROBE_RETRIES 次，
+    結果仍是 ERROR 的 ID 不計入 miss_gap，上限往後延伸，但最多延伸 miss_gap 個，
+    伺服器整段出錯時不會無止境地探測下去。
+    """
+    
+    def __init__(self, city_code, city_name, miss_gap=MISS_GAP, floor=0):
+        self.city_code = city_code
+        self.city_name = city_name
+        self.miss_gap = miss_gap
+        self.floor = floor
+        self.next_id = 1
+        self.max_hit = 0
+        self.retry = deque()    # 待重試的 ERROR ID
+        self.attempts = {}      # ID -> 已重試次數
+        self.errors = set()     # 最近一次結果為 ERROR 的 ID
+        self.in_flight = 0
+        self.requests = 0
+        self.cameras = {}
+    
+    def limit(self):
+        base = max(self.max_hit, self.floor)
+        skipped = sum(1 for n in self.errors if n > base)
+        return base + self.miss_gap + min(skipped, self.miss_gap)
+    
+    def has_next(self):
+        return bool(self.retry) or self.next_id <= self.limit()
+    
+    def take(self):
+        if self.retry:
+            num = self.retry.popleft()
+        else:
+            num = self.next_id
+            self.next_id += 1
+        self.in_flight += 1
+        return num, f"{self.city_code}-{num:05d}"
+    
+    def record(self, num, entry, requested):
+        self.in_flight -= 1
+        self.requests += requested
+        if entry["status"] == ERROR:
+            self.errors.add(num)
+            if self.attempts.get(num, 0) < PROBE_RETRIES:
+                self.attempts[num] = self.attempts.get(num, 0) + 1
+                self.retry.append(num)
+            return
+        self.errors.discard(num)
+        if entry["status"] == CAMERA:
+            self.max_hit = max(self.max_hit, num)
+            self.cameras[f"{entry['title']} ({entry['cam_id']})"] = entry["url"]
+    
+    def done(self):
+        return self.in_flight == 0 and not self.has_next()
+    
+    def complete(self):
+        # 最後一台之後還有 ERROR 的 ID 時，不能確定後面沒有攝影機，這次的清單不能拿來判斷消失
+        return self.done() and not any(n > self.max_hit for n in self.errors)
+
 class CameraDiscovery:
-    def __init__(self):
+    def __init__(self, cache_path=PROBE_CACHE_PATH, camera_ttl=CAMERA_TTL, missing_ttl=MISSING_TTL,
+                 miss_gap=MISS_GAP, workers=PROBE_WORKERS, rate=PROBE_RATE, url_cache_path=URL_CACHE_PATH):
         self.base_url = "https://www.1968services.tw/cam/"
-        self.session = requests.Session()
-        self.session.verify = False
+        self.session = new_session(pool_maxsize=workers)
         self.lock = threading.Lock()
         self.progress_count = 0
         
+        # 所有縣市同時探測，共用執行緒池與請求速率上限
+        self.miss_gap = miss_gap
+        self.workers = workers
+        self.limiter = RateLimiter(rate) if rate else None
+        self.city_probes = []
+        
+        # 頁面上就有影像網址時直接存進 capture 用的網址快取，擷取時不必再開 Selenium
+        self.url_cache = ImageUrlCache(url_cache_path) if url_cache_path else None
+        self.image_urls = 0
+        
+        # 探測結果快取：重跑時只探測沒做過或過期的 ID，中斷後可接續
+        self.cache = ProbeCache(cache_path, camera_ttl, missing_ttl) if cache_path else None
+        self.cache_hits = 0
+        self.not_modified = 0
+        self.fetched = 0
+        self.completed_cities = []
+        self.incomplete_cities = []
+        
         # 台灣縣市代碼對照表
-        self.city_codes = {
-            'tnn': '台南市',
-            'khh': '高雄市', 
-            'tpe': '台北市',
-            'nwt': '新北市',
-            'tao': '桃園市',
-            'tcg': '台中市',
-            'chw': '彰化縣',
-            'yll': '雲林縣',
-            'cyi': '嘉義市',
-            'cyq': '嘉義縣',
-            'ptf': '屏東縣',
-            'ttt': '台東縣',
-            'hua': '花蓮縣',
-            'ila': '宜蘭縣',
-            'hsz': '新竹市',
-            'hsc': '新竹縣',
-            'mlc': '苗栗縣',
-            'nan': '南投縣',
-            'pen': '澎湖縣',
-            'kmn': '金門縣',
-            'lnn': '連江縣'
-        }
+        self.city_codes = dict(CITY_CODES)
         
-        # 每個縣市的搜尋範圍（基於觀察到的模式）
-        self.search_ranges = {
-            'tnn': [(1, 200)],      # 台南市
-            'khh': [(1, 300)],      # 高雄市
-            'tpe': [(1, 500)],      # 台北市
-            'nwt': [(1, 400)],     # 新北市
-            'tao': [(1, 200)],      # 桃園市
-            'tcg': [(1, 300)],      # 台中市
-            'chw': [(1, 150)],      # 彰化縣
-            'yll': [(1, 100)],      # 雲林縣
-            'cyi': [(1, 80)],       # 嘉義市
-            'cyq': [(1, 120)],      # 嘉義縣
-            'ptf': [(1, 150)],      # 屏東縣
-            'ttt': [(1, 80)],       # 台東縣
-            'hua': [(1, 100)],      # 花蓮縣
-            'ila': [(1, 120)],      # 宜蘭縣
-            'hsz': [(1, 80)],       # 新竹市
-            'hsc': [(1, 100)],      # 新竹縣
-            'mlc': [(1, 100)],      # 苗栗縣
-            'nan': [(1, 100)],      # 南投縣
-            'pen': [(1, 50)],       # 澎湖縣
-            'kmn': [(1, 50)],       # 金門縣
-            'lnn': [(1, 30)]        # 連江縣
-        }
+        # 不再寫死每個縣市的搜尋範圍：從 1 往上探測，命中就往後延伸，
+        # 最後一台之後連續 miss_gap 個 ID 都沒有才停（見 CityProbe）
 
     def test_camera_url(self, cam_id, timeout=5):
         """測試單個攝影機URL是否有效"""
+        entry = self.probe_camera(cam_id, timeout)
+        if entry["status"] != CAMERA:
+            return None, None
+        return entry["url"], entry["title"]
+    
+    def probe_camera(self, cam_id, timeout=5):
+        """探測單個攝影機 ID 並寫入快取，回傳快取紀錄
+        
+        快取有 ETag / Last-Modified 時送條件式 GET，頁面沒變只會收到 304；
+        不再先送 HEAD，找不到的 ID 一樣一個請求就知道。
+        """
         test_url = f"{self.base_url}{cam_id}"
+        cached = self.cache.get(cam_id) if self.cache else None
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
         
+        now = time.time()
+        entry = {"cam_id": cam_id, "url": test_url, "status": MISSING, "http_status": None, "title": None,
+                 "etag": None, "last_modified": None, "checked_at": now,
+                 "last_seen": cached.get("last_seen") if cached else None}
         try:
-            # 先用HEAD請求檢查狀態
-            response = self.session.head(test_url, timeout=timeout)
-            if response.status_code != 200:
-                return None, None
-            
-            # 如果狀態正常，獲取頁面內容
-            page_response = self.session.get(test_url, timeout=timeout)
-            
-            # 檢查是否包含監視器元素
-            if 'video_obj' not in page_response.text:
-                return None, None
-            
-            # 提取標題
-            soup = BeautifulSoup(page_response.text, 'html.parser')
-            title_elem = soup.find('title')
-            
-            if title_elem:
-                cam_name = title_elem.text.strip()
-                return test_url, cam_name
-            else:
-                return test_url, f"攝影機_{cam_id}"
-                
-        except requests.RequestException:
-            return None, None
+            if self.limiter:
+                self.limiter.acquire()
+            # stream=True：找到需要的內容就關閉連線，不下載整個頁面
+            with self.session.get(test_url, headers=headers, timeout=timeout, stream=True) as response:
+                entry["http_status"] = response.status_code
+                if response.status_code == 304 and cached:
+                    # 頁面沒變，沿用上次的結果
+                    entry.update(status=cached["status"], title=cached["title"], image_url=cached.get("image_url"),
+                                 etag=cached.get("etag"), last_modified=cached.get("last_modified"))
+                    with self.lock:
+                        self.not_modified += 1
+                elif response.status_code == 200:
+                    with self.lock:
+                        self.fetched += 1
+                    entry["etag"] = response.headers.get("ETag")
+                    entry["last_modified"] = response.headers.get("Last-Modified")
+                    
+                    # 檢查是否包含監視器元素，同時取出標題與影像網址
+                    has_video, title, image_url = scan_camera_page(response)
+                    drain_small_remainder(response)
+                    if has_video:
+                        entry["status"] = CAMERA
+                        entry["title"] = title or f"攝影機_{cam_id}"
+                        entry["image_url"] = image_url
+                elif response.status_code == 429 or response.status_code >= 500:
+                    entry["status"] = ERROR
+        except requests.RequestException as e:
+            # 連線錯誤不當作沒有攝影機，下次重跑會再試
+            entry["status"] = ERROR
+            entry["error"] = str(e)
+            return self._record(entry)
+        
+        if entry["status"] == CAMERA:
+            entry["last_seen"] = now
+            if entry.get("image_url") and self.url_cache is not None:
+                # capture 的 camera_id 格式為 tnn_00001
+                self.url_cache.set(cam_id.replace("-", "_"), entry["image_url"], source="findCam")
+                with self.lock:
+                    self.image_urls += 1
+        return self._record(entry)
+    
+    def _record(self, entry):
+        if self.cache:
+            self.cache.record(entry)
+        return entry
 
     def discover_city_cameras(self, city_code, city_name):
         """發現單一縣市的所有監視器"""
-        print(f"\n🔍 搜尋 {city_name} 監視器...")
+        return self.discover_cities([city_code]).get(city_name, {})
+
+    def discover_cities(self, city_codes):
+        """同時探測多個縣市，回傳 {縣市: {名稱 (ID): 網址}}
         
-        cameras = {}
-        ranges = self.search_ranges.get(city_code, [(1, 100)])
+        各縣市輪流派工給同一個執行緒池，實際送出的請求受全域的 RateLimiter 限制；
+        每個縣市依 CityProbe 的規則延伸或停止。快取中未過期的 ID 不送請求。
+        """
+        probes = [CityProbe(code, self.city_codes[code], self.miss_gap, self._cached_max(code)) for code in city_codes]
+        for probe in probes:
+            print(f"🔍 搜尋 {probe.city_name} 監視器（已知最大編號 {probe.floor}，連續 {self.miss_gap} 個沒有就停）")
         
-        for start, end in ranges:
-            print(f"   📍 搜尋範圍 {city_code}-{start:05d} 到 {city_code}-{end:05d}")
-            range_count = 0
-            
-            # 使用線程池加速搜尋
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_id = {}
-                
-                for i in range(start, end + 1):
-                    cam_id = f"{city_code}-{i:05d}"
-                    future = executor.submit(self.test_camera_url, cam_id, 3)
-                    future_to_id[future] = cam_id
-                
-                for future in as_completed(future_to_id):
-                    cam_id = future_to_id[future]
-                    
-                    with self.lock:
-                        self.progress_count += 1
-                        if self.progress_count % 50 == 0:
-                            print(f"   ⏳ 已檢查 {self.progress_count} 個...")
-                    
+        max_pending = self.workers * 2
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {}
+        try:
+            while True:
+                # 各縣市輪流派工，直到進行中的探測數量達到上限或沒有縣市可以再往後探測
+                dispatched = True
+                while dispatched and len(pending) < max_pending:
+                    dispatched = False
+                    for probe in probes:
+                        if len(pending) >= max_pending or not probe.has_next():
+                            continue
+                        num, cam_id = probe.take()
+                        dispatched = True
+                        cached = self.cache.get(cam_id) if self.cache else None
+                        if self.cache and self.cache.is_fresh(cached):
+                            self.cache_hits += 1
+                            self._finish(probe, num, cached, requested=False)
+                        else:
+                            pending[executor.submit(self.probe_camera, cam_id, 3)] = (probe, num)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    probe, num = pending.pop(future)
                     try:
-                        url, name = future.result()
-                        if url and name:
-                            unique_key = f"{name} ({cam_id})"
-                            cameras[unique_key] = url
-                            range_count += 1
-                            print(f"   ✅ 發現: {name} ({cam_id})")
+                        entry = future.result()
                     except Exception as e:
-                        pass
-            
-            print(f"   📊 {city_name} 發現 {range_count} 個監視器")
+                        entry = {"status": ERROR, "error": str(e)}
+                    self._finish(probe, num, entry, requested=True)
+        except KeyboardInterrupt:
+            # 已完成的 ID 都寫進快取了，取消還沒開始的探測，下次重跑從這裡接續
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            self.city_probes.extend(probes)
         
-        return cameras
+        results = {}
+        for probe in probes:
+            if probe.complete():
+                self.completed_cities.append(probe.city_name)
+            else:
+                self.incomplete_cities.append(probe.city_name)
+            if probe.cameras:
+                results[probe.city_name] = probe.cameras
+        return results
+    
+    def _cached_max(self, city_code):
+        # 快取裡這個縣市最大的攝影機編號：至少探測到這裡，之前出現過的攝影機不會因為中間空號而漏掉
+        if not self.cache:
+            return 0
+        nums = [int(e["cam_id"].split("-")[1]) for e in self.cache.cameras(city_code)]
+        return max(nums, default=0)
+    
+    def _finish(self, probe, num, entry, requested):
+        probe.record(num, entry, requested)
+        with self.lock:
+            self.progress_count += 1
+            if self.progress_count % 50 == 0:
+                print(f"   ⏳ 已檢查 {self.progress_count} 個...")
+        if requested and entry["status"] == CAMERA:
+            print(f"   ✅ 發現: {entry['title']} ({entry['cam_id']})")
 
     def discover_all_cameras(self, selected_cities=None):
         """發現所有或指定縣市的監視器"""
         print("🎥 開始搜尋台灣監視器...")
         print("請耐心等待，這可能需要一些時間...")
         
-        all_cameras = {}
-        cities_to_search = selected_cities if selected_cities else self.city_codes.keys()
+        cities_to_search = list(selected_cities if selected_cities else self.city_codes.keys())
+        self.progress_count = 0
         
-        for city_code in cities_to_search:
-            city_name = self.city_codes[city_code]
-            self.progress_count = 0
-            
-            try:
-                cameras = self.discover_city_cameras(city_code, city_name)
-                if cameras:
-                    all_cameras[city_name] = cameras
-                    print(f"🎉 {city_name} 完成：共 {len(cameras)} 個監視器")
-                else:
-                    print(f"❌ {city_name} 沒有發現監視器")
-                
-                # 在縣市之間稍作停頓
-                time.sleep(1)
-                
-            except KeyboardInterrupt:
-                print(f"\n⚠️ 使用者中斷，已完成 {len(all_cameras)} 個縣市")
-                break
-            except Exception as e:
-                print(f"❌ {city_name} 搜尋時發生錯誤: {e}")
+        try:
+            all_cameras = self.discover_cities(cities_to_search)
+        except KeyboardInterrupt:
+            # 中斷時只保留已經確定探測完的縣市
+            all_cameras = {p.city_name: p.cameras for p in self.city_probes if p.complete() and p.cameras}
+            self.completed_cities = [p.city_name for p in self.city_probes if p.complete()]
+            print(f"\n⚠️ 使用者中斷，已完成 {len(self.completed_cities)} 個縣市")
+        
+        self.report_probe_cost()
+        if self.cache:
+            self.cache.compact()
+            print(f"💾 探測快取：命中 {self.cache_hits} 個，304 未變更 {self.not_modified} 個，重新下載 {self.fetched} 個")
+        if self.url_cache is not None:
+            self.url_cache.save()
+            print(f"🔗 頁面上直接取得影像網址 {self.image_urls} 個，已存到 {self.url_cache.path}")
         
         return all_cameras
+    
+    def report_probe_cost(self):
+        """各縣市探測到的最大編號、送出的請求數與每找到一台攝影機花費的請求數"""
+        print("\n📈 探測成本:")
+        total_requests = total_found = 0
+        for probe in self.city_probes:
+            found = len(probe.cameras)
+            total_requests += probe.requests
+            total_found += found
+            per_camera = f"{probe.requests / found:.2f}" if found else "-"
+            print(f"  {probe.city_name}: 探測到 {probe.next_id - 1} 號，最大命中 {probe.max_hit} 號，"
+                  f"請求 {probe.requests} 個，找到 {found} 個，每台 {per_camera} 個請求")
+        if total_found:
+            print(f"  合計: 請求 {total_requests} 個，找到 {total_found} 個，每台 {total_requests / total_found:.2f} 個請求")
+    
+    def keep_incomplete(self, all_cameras, existing_paths):
+        """沒有確定探測完的縣市沿用既有清單，只加入這次新找到的攝影機，不因為出錯的 ID 而少掉"""
+        if not self.incomplete_cities:
+            return all_cameras
+        old = load_registry(existing_paths, cache_dir=None).city_lists()
+        merged = dict(all_cameras)
+        for city_name in self.incomplete_cities:
+            found = all_cameras.get(city_name, {})
+            urls = set(found.values())
+            cameras = {name: url for name, url in old.get(city_name, {}).items() if url not in urls}
+            cameras.update(found)
+            if cameras:
+                merged[city_name] = cameras
+            print(f"⚠️ {city_name} 有探測失敗的 ID，沿用既有清單 {len(cameras) - len(found)} 個，新找到 {len(found)} 個")
+        return merged
+    
+    def save_diff(self, all_cameras, existing_paths, output_dir="cameras_by_city"):
+        """與既有的 *_cameras.json 比較，輸出新增 / 消失 / 改名的監視器到 cameras_diff.json"""
+        old = load_registry(existing_paths, cache_dir=None).city_lists()
+        diff = diff_camera_lists(old, all_cameras, set(self.completed_cities))
+        os.makedirs(output_dir, exist_ok=True)
+        diff_file = os.path.join(output_dir, "cameras_diff.json")
+        with open(diff_file, "w", encoding="utf-8") as f:
+            json.dump({"generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                       "compared_with": existing_paths, "cities": diff}, f, ensure_ascii=False, indent=2)
+        
+        print(f"\n🔄 與既有清單比較（{len(existing_paths)} 個檔案）:")
+        if not diff:
+            print("   沒有變動")
+        for city_name, changes in diff.items():
+            print(f"   {city_name}: 新增 {len(changes['added'])}，消失 {len(changes['removed'])}，改名 {len(changes['renamed'])}")
+        print(f"   詳細內容: {diff_file}")
+        return diff
 
     def save_cameras_by_city(self, all_cameras):
         """按縣市儲存監視器清單"""
@@ -260,10 +501,26 @@ class CameraDiscovery:
             print(f"  {i}. {city}: {count} 個")
 
 def main():
+    parser = argparse.ArgumentParser(description="搜尋台灣監視器")
+    parser.add_argument("--cache", default=PROBE_CACHE_PATH, help="探測結果快取檔（JSON lines）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用快取，全部重新探測")
+    parser.add_argument("--max-age", type=float, default=CAMERA_TTL / 3600,
+                        help="有攝影機的 ID 幾小時後重新確認（沒有攝影機的 ID 為 7 倍）")
+    parser.add_argument("--compare", nargs="*", help="要比較的既有清單（預設為目前目錄的 *_cameras.json）")
+    parser.add_argument("--miss-gap", type=int, default=MISS_GAP, help="最後一台之後連續幾個 ID 沒有攝影機就停止")
+    parser.add_argument("--workers", type=int, default=PROBE_WORKERS, help="探測執行緒數（所有縣市共用）")
+    parser.add_argument("--rate", type=float, default=PROBE_RATE, help="每秒最多送出幾個請求（所有縣市合計，0 為不限）")
+    parser.add_argument("--url-cache", default=URL_CACHE_PATH, help="頁面上取得的影像網址寫入 capture 用的網址快取")
+    parser.add_argument("--no-url-cache", action="store_true", help="不寫入影像網址快取")
+    args = parser.parse_args()
+    
     print("🎥 台灣監視器統計程式 - 增強版")
     print("=" * 50)
     
-    discovery = CameraDiscovery()
+    discovery = CameraDiscovery(None if args.no_cache else args.cache,
+                                camera_ttl=args.max_age * 3600, missing_ttl=args.max_age * 3600 * 7,
+                                miss_gap=args.miss_gap, workers=args.workers, rate=args.rate,
+                                url_cache_path=None if args.no_url_cache else args.url_cache)
     
     print("\n請選擇搜尋模式:")
     print("1. 搜尋所有縣市（完整搜尋）")
@@ -287,7 +544,7 @@ def main():
         print(f"✅ 將搜尋: {', '.join([discovery.city_codes[code] for code in selected_cities])}")
         
     elif choice == "3":
-        selected_cities = ['tpe', 'ntpc', 'tao', 'tcg', 'tnn', 'khh']
+        selected_cities = ['tpe', 'nwt', 'tao', 'tcg', 'tnn', 'khh']
         print("✅ 將搜尋主要都會區")
         
     else:
@@ -310,8 +567,11 @@ def main():
     print(f"總共發現 {len(all_cameras)} 個縣市的 {total_count} 個監視器")
     print(f"耗時: {elapsed_time:.1f} 秒")
     
-    # 儲存結果
+    # 儲存結果（沒有確定探測完的縣市沿用既有清單，也不列入比較）
+    existing_paths = args.compare if args.compare is not None else sorted(glob.glob("*_cameras.json"))
+    all_cameras = discovery.keep_incomplete(all_cameras, existing_paths)
     discovery.save_cameras_by_city(all_cameras)
+    discovery.save_diff(all_cameras, existing_paths)
     
     # 顯示分析
     discovery.analyze_all_cameras(all_cameras)
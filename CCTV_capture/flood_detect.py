@@ -0,0 +1,334 @@
+# 淹水偵測：擷取 worker 抓到影像後直接在記憶體中交給 FloodDetector，不經過硬碟
+#
+#     capture worker ──submit()──▶ 佇列 ──▶ 推論執行緒：解碼（縮小 2 倍）→ 切出 ROI → 低光增強（選用）→ 縮放 → 跨攝影機批次推論
+#                                                      └─▶ flood_scores.jsonl：每台攝影機的分數與抓圖到出分數的延遲
+#                                                      └─▶ 特徵庫（選用，feature_store.py）：依時間查詢歷史分數
+#
+# 模型：
+#     dummy        NumPy 寫的示範模型，不需要權重，測試整條管線用
+#     <路徑>.onnx  以 ONNX Runtime 在 CPU 上執行（需要另外安裝 onnxruntime），
+#                  輸入 NCHW float32 RGB（ImageNet 正規化），輸出 (N,) / (N,1) 的淹水機率或 (N,2) 的 softmax
+#
+# 用法：
+#     python run_all.py --flood-model dummy
+#     python run_all.py --flood-model flood.onnx --flood-enhance "../Low Light Enhancement/weight.dat"
+#     python flood_detect.py D:\Taiwan_CCTV\downloaded_images\某攝影機
+#
+import os, sys, glob, json, time, argparse, threading
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from roi import ROIS_PATH, load_rois
+
+FLOOD_SCORES_PATH = "flood_scores.jsonl"
+FLOOD_ALERT = 0.5           # 分數超過這個值在報告中列出
+BATCH_SIZE = 16
+MAX_WAIT = 0.2              # 湊不滿一批時最多等幾秒就先推論
+QUEUE_SIZE = 256            # 推論跟不上時只保留最新的這麼多張，較舊的丟棄
+LATENCY_WINDOW = 10000
+ENHANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Low Light Enhancement")
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], np.float32)
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class DummyFloodModel:
+    """不需要權重的示範模型：畫面下半部灰暗、低飽和、紋理少（大片積水）時分數高，只用來測試管線"""
+
+    input_size = 64
+    weights = np.array([-3.0, -4.0, -6.0], np.float32)     # 亮度、飽和度、梯度
+    bias = 3.0
+
+    def predict(self, batch):
+        """batch: (N, S, S, 3) uint8 BGR → (N,) float32 分數"""
+        lower = batch[:, batch.shape[1] // 2:].astype(np.float32) / 255.0
+        brightness = lower.mean(axis=(1, 2, 3))
+        saturation = (lower.max(axis=3) - lower.min(axis=3)).mean(axis=(1, 2))
+        gray = lower.mean(axis=3)
+        gradient = np.abs(np.diff(gray, axis=2)).mean(axis=(1, 2)) + np.abs(np.diff(gray, axis=1)).mean(axis=(1, 2))
+        features = np.stack([brightness, saturation, gradient * 10], axis=1)
+        return _sigmoid(features @ self.weights + self.bias).astype(np.float32)
+
+class OnnxFloodModel:
+    """ONNX Runtime CPU 推論；輸入尺寸取自模型（動態尺寸時用 input_size）"""
+
+    def __init__(self, path, input_size=224, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("使用 .onnx 模型需要安裝 onnxruntime：pip install onnxruntime") from None
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        size = model_input.shape[-1]
+        self.input_size = size if isinstance(size, int) else input_size
+
+    def predict(self, batch):
+        x = batch[..., ::-1].astype(np.float32) / 255.0     # BGR → RGB
+        x -= IMAGENET_MEAN
+        x /= IMAGENET_STD
+        out = self.session.run(None, {self.input_name: np.ascontiguousarray(x.transpose(0, 3, 1, 2))})[0]
+        out = np.asarray(out, np.float32)
+        if out.ndim == 2 and out.shape[1] == 2:
+            return out[:, 1]
+        return out.reshape(len(batch))
+
+def load_model(spec):
+    if spec == "dummy":
+        return DummyFloodModel()
+    if spec.endswith(".onnx"):
+        return OnnxFloodModel(spec)
+    raise ValueError(f"不支援的模型：{spec}（dummy 或 .onnx 檔）")
+
+def load_enhancer(lut_path):
+    """.dat → 固定 LUT 的 Enhancer；.npy（LUT family）→ 依每台攝影機亮度自動挑 t 的 AdaptiveEnhancer
+
+    回傳 enhance(frame, camera_id) 函式；低光增強程式在 ../Low Light Enhancement，兩邊共用同一份。
+    """
+    if ENHANCE_DIR not in sys.path:
+        sys.path.insert(0, ENHANCE_DIR)
+    if lut_path.endswith(".npy"):
+        from adaptive import AdaptiveEnhancer
+        enhancer = AdaptiveEnhancer(lut_path)
+        return enhancer.enhance
+    from enhancer import Enhancer
+    enhancer = Enhancer.from_file(lut_path)
+    return lambda frame, camera_id=None: enhancer.enhance(frame)
+
+class _Frame:
+    __slots__ = ("cam", "jpg_data", "fetched_at", "captured_at")
+
+    def __init__(self, cam, jpg_data, fetched_at, captured_at=None):
+        self.cam = cam
+        self.jpg_data = jpg_data
+        self.fetched_at = fetched_at
+        self.captured_at = captured_at      # time.time()；補算舊影像時為影像的時間，None 為推論當下
+
+class FloodDetector:
+    """接收擷取端送來的 JPEG，在背景執行緒跨攝影機湊批次推論，輸出每台的淹水分數
+
+    submit() 不阻塞擷取：佇列滿時丟掉最舊的一張（只在意最新畫面）。
+    延遲從 fetched_at（擷取開始的 time.monotonic()）算到分數寫出為止。
+    """
+
+    def __init__(self, model, batch_size=BATCH_SIZE, max_wait=MAX_WAIT, queue_size=QUEUE_SIZE, enhance=None,
+                 output=FLOOD_SCORES_PATH, alert=FLOOD_ALERT, features=None):
+        self.model = model
+        self.features = features    # FeatureStore：分數另外寫進特徵庫
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.enhance = enhance
+        self.alert = alert
+        self.cond = threading.Condition()
+        self.pending = deque(maxlen=queue_size)
+        self.stopped = False
+        self.thread = None
+        self.output = open(output, "a", encoding="utf-8") if output else None
+        size = model.input_size
+        self._batch = np.empty((batch_size, size, size, 3), np.uint8)     # 重複使用的批次緩衝
+        self.stats_lock = threading.Lock()
+        self.latest = {}        # camera_id → (分數, 名稱, 時間)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.frames = 0
+        self.batches = 0
+        self.dropped = 0
+        self.undecodable = 0
+        self.failed_batches = 0
+        self.failed_frames = 0
+        self.decode_seconds = 0.0
+        self.model_seconds = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="flood-detect", daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, cam, jpg_data, fetched_at=None, captured_at=None):
+        # captured_at 為擷取時間（time.time()，與封存檔同一個時間），分數依這個時間寫進特徵庫
+        fetched_at = time.monotonic() if fetched_at is None else fetched_at
+        with self.cond:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(_Frame(cam, jpg_data, fetched_at, captured_at))
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify()
+
+    def _take_batch(self):
+        # 湊滿一批，或最早的一張已經等了 max_wait 秒
+        with self.cond:
+            while not self.stopped:
+                if self.pending:
+                    wait = self.pending[0].fetched_at + self.max_wait - time.monotonic()
+                    if len(self.pending) >= self.batch_size or wait <= 0:
+                        break
+                else:
+                    wait = None
+                self.cond.wait(wait)
+            n = min(len(self.pending), self.batch_size)
+            return [self.pending.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            frames = self._take_batch()
+            if frames:
+                try:
+                    self.process(frames)
+                except Exception as e:
+                    # 一批出錯（模型或增強丟例外）只丟掉這一批；執行緒停掉的話之後送來的影像都不會再推論
+                    print(f"淹水偵測批次失敗（{len(frames)} 張）: {type(e).__name__}: {e}")
+                    with self.stats_lock:
+                        self.failed_batches += 1
+                        self.failed_frames += len(frames)
+            elif self.stopped:
+                return
+
+    def _prepare(self, frame, out):
+        # IMREAD_REDUCED_COLOR_2 在解碼時就縮小一半，後面的增強與縮放都少算 3/4 的像素
+        img = cv2.imdecode(np.frombuffer(frame.jpg_data, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+        if img is None:
+            return False
+        # 有 ROI 的攝影機只增強外接矩形（view，不複製），模型只看到 ROI 內的像素
+        roi = frame.cam.get('roi')
+        geo = roi.geometry(img.shape) if roi is not None else None
+        if geo is not None:
+            img = geo.crop(img)
+        if self.enhance is not None:
+            img = self.enhance(img, frame.cam['camera_id'])
+        if geo is not None:
+            img = geo.masked(img)
+        cv2.resize(img, out.shape[1::-1], dst=out, interpolation=cv2.INTER_AREA)
+        return True
+
+    def process(self, frames):
+        """推論一批並輸出分數，回傳 [(camera_id, 分數, 延遲秒數), ...]"""
+        start = time.perf_counter()
+        kept = []
+        for frame in frames:
+            if self._prepare(frame, self._batch[len(kept)]):
+                kept.append(frame)
+        decoded = time.perf_counter()
+        scores = self.model.predict(self._batch[:len(kept)]) if kept else []
+        done = time.perf_counter()
+        now = time.monotonic()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        results = []
+        lines = []
+        for frame, score in zip(kept, scores):
+            cam = frame.cam
+            latency = now - frame.fetched_at
+            results.append((cam['camera_id'], float(score), latency))
+            lines.append(json.dumps({"time": stamp, "camera_id": cam['camera_id'], "city": cam.get('city', ''),
+                                     "score": round(float(score), 4), "latency_ms": round(latency * 1000, 1)},
+                                    ensure_ascii=False))
+        if self.output is not None and lines:
+            self.output.write("\n".join(lines) + "\n")
+            self.output.flush()
+        if self.features is not None:
+            wall = time.time()
+            try:
+                for frame, (camera_id, score, _) in zip(kept, results):
+                    self.features.record_flood(camera_id, score, wall if frame.captured_at is None else frame.captured_at)
+            except OSError as e:
+                print(f"淹水分數寫入特徵庫失敗: {e}")
+        with self.stats_lock:
+            for frame, (camera_id, score, latency) in zip(kept, results):
+                self.latest[camera_id] = (score, frame.cam['name'], stamp)
+                self.latencies.append(latency)
+            self.frames += len(kept)
+            self.undecodable += len(frames) - len(kept)
+            self.batches += bool(kept)
+            self.decode_seconds += decoded - start
+            self.model_seconds += done - decoded
+        return results
+
+    def stop(self):
+        """處理完佇列中剩下的影像後停止"""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def summary(self, worst=5):
+        with self.stats_lock:
+            failed = f"，失敗 {self.failed_batches} 批（{self.failed_frames} 張）" if self.failed_batches else ""
+            if not self.frames:
+                undecodable = f"（無法解碼 {self.undecodable} 張）" if self.undecodable else ""
+                return f"淹水偵測：尚未推論{undecodable}{failed}"
+            lat = np.array(self.latencies) * 1000
+            lines = [f"淹水偵測：{self.frames} 張、{self.batches} 批（平均每批 {self.frames / self.batches:.1f} 張），"
+                     f"抓圖到分數延遲中位數 {np.median(lat):.0f} ms、p95 {np.percentile(lat, 95):.0f} ms，"
+                     f"每張解碼 {self.decode_seconds / self.frames * 1000:.1f} ms、模型 {self.model_seconds / self.frames * 1000:.1f} ms，"
+                     f"佇列丟棄 {self.dropped}，無法解碼 {self.undecodable}{failed}"]
+            flooded = sorted(((s, cid, name) for cid, (s, name, _) in self.latest.items() if s >= self.alert), reverse=True)
+        for score, camera_id, name in flooded[:worst]:
+            lines.append(f"  ⚠️ {camera_id} {name}: {score:.2f}")
+        return "\n".join(lines)
+
+def add_flood_args(parser):
+    parser.add_argument("--flood-model", help="擷取的同時做淹水偵測：dummy 或 .onnx 模型路徑")
+    parser.add_argument("--flood-enhance", help="推論前先做低光增強：LUT .dat 或 LUT family .npy（自動亮度）")
+    parser.add_argument("--flood-batch", type=int, default=BATCH_SIZE, help="跨攝影機批次推論的張數")
+    parser.add_argument("--flood-output", default=FLOOD_SCORES_PATH, help="淹水分數輸出（JSON lines）")
+
+def detector_from_args(args, features=None):
+    """依 add_flood_args() 的參數建立並啟動 FloodDetector，沒指定模型時回傳 None；有 features 時分數也寫進特徵庫"""
+    if not args.flood_model:
+        return None
+    enhance = load_enhancer(args.flood_enhance) if args.flood_enhance else None
+    return FloodDetector(load_model(args.flood_model), batch_size=args.flood_batch, enhance=enhance,
+                         output=args.flood_output, features=features).start()
+
+def _iter_sources(paths):
+    # 單張 JPEG、資料夾或封存檔（.jpgs）→ (camera_id, JPEG bytes)
+    from frame_archive import ARCHIVE_EXT, ArchiveReader
+    for path in paths:
+        if os.path.isdir(path):
+            yield from _iter_sources(sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, f"*{ARCHIVE_EXT}"))))
+        elif path.endswith(ARCHIVE_EXT):
+            camera_id = os.path.basename(path)[:-len(ARCHIVE_EXT)].rsplit("_", 1)[0]
+            with ArchiveReader(path) as reader:
+                for i in range(len(reader)):
+                    yield camera_id, bytes(reader.frame(i))
+        else:
+            with open(path, "rb") as f:
+                yield os.path.basename(path).rsplit("_", 2)[0], f.read()    # {camera_id}_{日期}_{時間}.jpg
+
+def main():
+    parser = argparse.ArgumentParser(description="對已存下的影像做淹水偵測（離線）")
+    parser.add_argument("paths", nargs="+", help="JPEG、資料夾或封存檔")
+    parser.add_argument("--rois", default=ROIS_PATH, help="攝影機 ROI 設定檔（有設定的攝影機只看 ROI 內）")
+    add_flood_args(parser)
+    parser.set_defaults(flood_model="dummy")
+    args = parser.parse_args()
+
+    # 離線時不丟棄影像：不啟動背景執行緒，直接一批一批推論
+    enhance = load_enhancer(args.flood_enhance) if args.flood_enhance else None
+    detector = FloodDetector(load_model(args.flood_model), batch_size=args.flood_batch, enhance=enhance,
+                             output=args.flood_output)
+    rois = load_rois(args.rois)
+    batch = []
+    for camera_id, jpg_data in _iter_sources(args.paths):
+        cam = {"camera_id": camera_id, "name": camera_id, "roi": rois.get(camera_id)}
+        batch.append(_Frame(cam, jpg_data, time.monotonic()))
+        if len(batch) == args.flood_batch:
+            detector.process(batch)
+            batch = []
+    if batch:
+        detector.process(batch)
+    detector.stop()
+    print(detector.summary())
+
+if __name__ == "__main__":
+    main()
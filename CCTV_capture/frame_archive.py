@@ -0,0 +1,318 @@
+# 每台攝影機每天一個 append-only 影像封存檔，取代一張 JPEG 一個檔案
+#
+#     <camera_id>_<YYYYMMDD>.jpgs   所有 JPEG 直接串接
+#     <camera_id>_<YYYYMMDD>.idx    16 bytes 檔頭 + 固定 20 bytes 的紀錄 (timestamp float64, offset uint64, length uint32)
+#
+# 寫入時先寫資料再寫索引，當機後重新開檔會截掉沒寫完的尾巴（索引不見時不動資料，改為拒絕寫入）；
+# 同時開著的封存檔最多 MAX_OPEN_WRITERS 個，最久沒寫的先關閉。讀取時索引以 np.memmap、資料以 mmap 開啟，
+# 依時間區間二分搜尋，不必把整個檔案讀進記憶體。
+#
+# 用法：
+#     python frame_archive.py list  D:\Taiwan_CCTV\downloaded_images
+#     python frame_archive.py export <封存檔.jpgs> <輸出資料夾> [--start 20250701_000000] [--end 20250701_060000]
+#     python frame_archive.py pack  D:\Taiwan_CCTV\downloaded_images [--remove]
+#
+import os, re, glob, mmap, time, hashlib, argparse, threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+import numpy as np
+
+ARCHIVE_EXT = ".jpgs"
+INDEX_EXT = ".idx"
+INDEX_MAGIC = b"CCTVIDX1"
+HEADER_SIZE = 16
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("offset", "<u8"), ("length", "<u4")])   # 20 bytes，不補齊
+TIME_FORMAT = "%Y%m%d_%H%M%S"     # 與單張檔名 {camera_id}_{timestamp}.jpg 相同
+MAX_OPEN_WRITERS = 64   # 每個 writer 開兩個檔案；上千台攝影機全開會超過檔案數上限（Linux 1024、Windows CRT 512）
+
+_LOOSE_RE = re.compile(r"^([a-z]{3}_\d+)_(\d{8}_\d{6})(?:_\d+)?\.jpg$")
+
+def index_path_for(data_path):
+    return data_path[:-len(ARCHIVE_EXT)] + INDEX_EXT
+
+def archive_path(cam_dir, camera_id, ts):
+    return os.path.join(cam_dir, f"{camera_id}_{time.strftime('%Y%m%d', time.localtime(ts))}{ARCHIVE_EXT}")
+
+def parse_time(text):
+    return datetime.strptime(text, TIME_FORMAT).timestamp()
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT)
+
+def _index_records(index_size):
+    return max(index_size - HEADER_SIZE, 0) // INDEX_DTYPE.itemsize
+
+class MissingIndexError(OSError):
+    """封存檔有資料但索引檔不見了；不截掉資料，需要人工處理（從備份找回 .idx，或把 .jpgs 移開）"""
+
+class ArchiveWriter:
+    """單一封存檔的追加寫入；同一個檔案同時只能有一個 writer"""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.index_path = index_path_for(data_path)
+        self.lock = threading.Lock()
+        self.count, self.size = self._recover()
+        self.data = open(data_path, "ab")
+        self.index = open(self.index_path, "ab")
+        if self.index.tell() == 0:
+            self.index.write(INDEX_MAGIC.ljust(HEADER_SIZE, b"\0"))
+            self.index.flush()
+
+    def _recover(self):
+        # 對齊資料與索引：截掉寫一半的索引紀錄、沒有資料的索引、沒有索引的資料
+        if not os.path.exists(self.index_path):
+            # 建立封存檔時先建資料檔再寫索引檔頭，只有空的資料檔是正常的
+            if os.path.exists(self.data_path) and os.path.getsize(self.data_path):
+                raise MissingIndexError(f"{self.data_path} 有資料但沒有索引檔 {self.index_path}，不寫入以免覆蓋")
+            return 0, 0
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        count = _index_records(os.path.getsize(self.index_path))
+        end = 0
+        if count:
+            index = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count, offset=HEADER_SIZE)
+            ends = index["offset"] + index["length"]
+            count = int(np.searchsorted(ends, data_size, side="right"))
+            end = int(ends[count - 1]) if count else 0
+        os.truncate(self.index_path, HEADER_SIZE + count * INDEX_DTYPE.itemsize if count else 0)
+        if data_size != end:
+            with open(self.data_path, "ab") as f:
+                f.truncate(end)
+        return count, end
+
+    def append(self, jpg_data, ts=None):
+        """寫入一張 JPEG，回傳它在封存檔中的序號"""
+        ts = time.time() if ts is None else ts
+        record = np.array([(ts, 0, len(jpg_data))], dtype=INDEX_DTYPE)
+        with self.lock:
+            record["offset"] = self.size
+            self.data.write(jpg_data)
+            self.data.flush()
+            self.index.write(record.tobytes())
+            self.index.flush()
+            self.size += len(jpg_data)
+            self.count += 1
+            return self.count - 1
+
+    def close(self):
+        with self.lock:
+            self.data.close()
+            self.index.close()
+
+class ArchiveReader:
+    """以 mmap 讀封存檔：索引是 structured array，frame(i) 回傳指向 mmap 的 memoryview（close 前有效）"""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        index_path = index_path_for(data_path)
+        data_size = os.path.getsize(data_path)
+        count = _index_records(os.path.getsize(index_path)) if os.path.exists(index_path) else 0
+        if count:
+            index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+            # 寫入中的封存檔：只看資料已經完整寫入的紀錄
+            count = int(np.searchsorted(index["offset"] + index["length"], data_size, side="right"))
+            self.index = index[:count]
+        else:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+        self._file = open(data_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+        ts = self.index["ts"]
+        self._sorted = bool(np.all(ts[1:] >= ts[:-1]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def timestamps(self):
+        return self.index["ts"]
+
+    def frame(self, i):
+        offset, length = int(self.index["offset"][i]), int(self.index["length"][i])
+        return self._view[offset:offset + length]
+
+    def select(self, start=None, end=None):
+        """時間落在 [start, end) 的紀錄序號"""
+        ts = self.index["ts"]
+        lo = -np.inf if start is None else start
+        hi = np.inf if end is None else end
+        if self._sorted:
+            return np.arange(np.searchsorted(ts, lo, side="left"), np.searchsorted(ts, hi, side="left"))
+        return np.flatnonzero((ts >= lo) & (ts < hi))
+
+    def iter_range(self, start=None, end=None):
+        for i in self.select(start, end):
+            yield float(self.index["ts"][i]), self.frame(i)
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass    # 外面還拿著 frame() 的 memoryview，等它們釋放後由 GC 關閉
+        self._file.close()
+        self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+class FrameArchive:
+    """擷取端使用：依 (攝影機, 日期) 開啟對應的 ArchiveWriter，可多執行緒共用
+
+    最多同時開著 max_open 個 writer（LRU），超過時關掉最久沒寫的，下次寫到它時再重新開檔；
+    換日後前一天的檔案不再被寫到，自然會被擠出去。寫入在鎖內進行，關檔不會與寫入交錯。
+    """
+
+    def __init__(self, max_open=MAX_OPEN_WRITERS):
+        self.lock = threading.Lock()
+        self.max_open = max_open
+        self.writers = OrderedDict()    # data_path → ArchiveWriter，最近寫入的在尾端
+        self.reopened = 0
+
+    def _writer(self, path):
+        writer = self.writers.get(path)
+        if writer is not None:
+            self.writers.move_to_end(path)
+            return writer
+        while len(self.writers) >= self.max_open:
+            self.writers.popitem(last=False)[1].close()
+            self.reopened += 1
+        writer = self.writers[path] = ArchiveWriter(path)
+        return writer
+
+    def append(self, cam_dir, camera_id, jpg_data, ts=None):
+        """寫入一張，回傳參照字串 <封存檔>#<序號>"""
+        ts = time.time() if ts is None else ts
+        path = archive_path(cam_dir, camera_id, ts)
+        with self.lock:
+            i = self._writer(path).append(jpg_data, ts)
+        return f"{path}#{i}"
+
+    def close(self):
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers.clear()
+
+def latest_frame(cam_dir, camera_id):
+    """最新封存檔的最後一張，回傳 (參照字串, bytes) 或 None"""
+    for path in sorted(glob.glob(os.path.join(cam_dir, f"{camera_id}_*{ARCHIVE_EXT}")), reverse=True):
+        with ArchiveReader(path) as reader:
+            if len(reader):
+                i = len(reader) - 1
+                return f"{path}#{i}", bytes(reader.frame(i))
+    return None
+
+def read_frame(ref):
+    """以參照字串 <封存檔>#<序號> 讀出一張 JPEG"""
+    path, _, i = ref.rpartition("#")
+    with ArchiveReader(path) as reader:
+        return bytes(reader.frame(int(i)))
+
+def iter_archives(root, camera_id=None):
+    pattern = f"{camera_id}_*{ARCHIVE_EXT}" if camera_id else f"*{ARCHIVE_EXT}"
+    return sorted(glob.glob(os.path.join(root, "**", pattern), recursive=True))
+
+def export_archive(data_path, out_dir, start=None, end=None):
+    """把封存檔轉回一張一個檔案（{camera_id}_{timestamp}.jpg），回傳寫出的張數"""
+    os.makedirs(out_dir, exist_ok=True)
+    camera_id = os.path.basename(data_path)[:-len(ARCHIVE_EXT)].rsplit("_", 1)[0]
+    count = 0
+    with ArchiveReader(data_path) as reader:
+        for ts, data in reader.iter_range(start, end):
+            base = os.path.join(out_dir, f"{camera_id}_{format_time(ts)}")
+            filename, n = f"{base}.jpg", 1
+            while os.path.exists(filename):     # 同一秒有多張
+                filename, n = f"{base}_{n}.jpg", n + 1
+            with open(filename, "wb") as f:
+                f.write(data)
+            count += 1
+    return count
+
+def _archived_digests(path, seconds):
+    """封存檔中落在 seconds 這幾秒（與單張檔名的精度相同）的影像：秒數 → 各張內容的 sha1"""
+    digests = defaultdict(set)
+    if not os.path.exists(path):
+        return digests
+    with ArchiveReader(path) as reader:
+        for i, second in enumerate(np.floor(reader.timestamps).tolist()):
+            if second in seconds:
+                digests[second].add(hashlib.sha1(reader.frame(i)).digest())
+    return digests
+
+def pack_loose_files(cam_dir, remove=False):
+    """把資料夾中既有的單張 JPEG 依檔名時間寫進封存檔（遷移舊資料），回傳寫入的張數
+
+    封存檔中同一秒已有內容相同的影像就略過，沒加 --remove 重跑也不會重複寫入；
+    同一秒的不同影像（檔名帶 _N）各自寫入。remove=True 時只刪除確定已在封存檔中的檔案。
+    """
+    by_archive = defaultdict(list)      # 封存檔路徑 → [(時間, camera_id, 單張檔案)]
+    for name in os.listdir(cam_dir):
+        m = _LOOSE_RE.match(name)
+        if m:
+            ts = parse_time(m.group(2))
+            by_archive[archive_path(cam_dir, m.group(1), ts)].append((ts, m.group(1), os.path.join(cam_dir, name)))
+    archive = FrameArchive()
+    archived = []       # 已寫入或確認與封存檔中內容相同的單張檔案
+    written = 0
+    try:
+        for data_path, files in by_archive.items():
+            files.sort()
+            existing = _archived_digests(data_path, {ts for ts, _, _ in files})
+            for ts, camera_id, path in files:
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).digest()
+                if digest not in existing[ts]:
+                    archive.append(cam_dir, camera_id, data, ts)
+                    existing[ts].add(digest)
+                    written += 1
+                archived.append(path)
+    finally:
+        archive.close()
+    if remove:
+        for path in archived:
+            os.remove(path)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="影像封存檔工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("list", help="列出資料夾下所有封存檔")
+    p.add_argument("root")
+    p = sub.add_parser("export", help="把封存檔匯出成單張 JPEG")
+    p.add_argument("archive")
+    p.add_argument("out_dir")
+    p.add_argument("--start", help="起始時間 YYYYMMDD_HHMMSS")
+    p.add_argument("--end", help="結束時間 YYYYMMDD_HHMMSS（不含）")
+    p = sub.add_parser("pack", help="把既有的單張 JPEG 寫進封存檔")
+    p.add_argument("root")
+    p.add_argument("--remove", action="store_true", help="寫入後刪除原本的單張檔案")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in iter_archives(args.root):
+            with ArchiveReader(path) as reader:
+                ts = reader.timestamps
+                span = f"{format_time(ts.min())} ~ {format_time(ts.max())}" if len(reader) else "-"
+                print(f"{path}: {len(reader)} 張，{os.path.getsize(path) / 1e6:.1f} MB，{span}")
+    elif args.command == "export":
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+        print(f"匯出 {export_archive(args.archive, args.out_dir, start, end)} 張")
+    elif args.command == "pack":
+        total = 0
+        for cam_dir in sorted({os.path.dirname(p) for p in glob.glob(os.path.join(args.root, "**", "*.jpg"), recursive=True)}):
+            n = pack_loose_files(cam_dir, args.remove)
+            total += n
+            if n:
+                print(f"{cam_dir}: {n} 張")
+        print(f"共寫入 {total} 張")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_CONNECTIONS = 16   # 保留幾個主機的連線池（影像主機只有少數幾台）
+POOL_MAXSIZE = 32       # 每個主機最多保留幾條 keep-alive 連線
+
+def default_retry():
+    # 連線失敗與 502/503/504 重試，間隔 0.5s、1s...（backoff）
+    return Retry(total=3, connect=2, read=1, status=2, backoff_factor=0.5,
+                 status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "HEAD"}),
+                 raise_on_status=False)
+
+class ConnectionStats:
+    """統計新建連線與重用次數、建立連線（TCP + TLS 握手）花的時間"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.opened = 0
+            self.handshake_seconds = 0.0
+            self.handshake_max = 0.0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def record_connect(self, seconds):
+        with self.lock:
+            self.opened += 1
+            self.handshake_seconds += seconds
+            self.handshake_max = max(self.handshake_max, seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "opened": self.opened,
+                "reused": max(self.requests - self.opened, 0),
+                "handshake_ms_avg": 1000 * self.handshake_seconds / self.opened if self.opened else 0.0,
+                "handshake_ms_max": 1000 * self.handshake_max,
+                "handshake_ms_total": 1000 * self.handshake_seconds,
+            }
+
+    def summary(self):
+        s = self.snapshot()
+        return (f"連線：請求 {s['requests']}，新建 {s['opened']}，重用 {s['reused']}，"
+                f"握手平均 {s['handshake_ms_avg']:.1f} ms（累計 {s['handshake_ms_total'] / 1000:.1f} 秒）")
+
+stats = ConnectionStats()
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        stats.record_connect(time.perf_counter() - start)
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        stats.record_connect(time.perf_counter() - start)
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    """連線池加上計時的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+    def send(self, request, *args, **kwargs):
+        stats.record_request()
+        return super().send(request, *args, **kwargs)
+
+def new_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, retries=None):
+    session = requests.Session()
+    session.verify = False
+    adapter = PooledAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                            max_retries=retries if retries is not None else default_retry())
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+class RateLimiter:
+    """token bucket：平均每秒 rate 個請求，最多累積 burst 個，多執行緒共用
+
+    token 不夠時先預約（token 變負數）再睡到輪到自己，同時等待的執行緒不會搶同一個 token。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+_local = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+def get_session():
+    """每條執行緒一個共用的 Session（requests.Session 不保證執行緒安全），同執行緒內所有攝影機共用連線"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = new_session()
+        with _sessions_lock:
+            _sessions.append(session)
+    return session
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions:
+            session.close()
+        _sessions.clear()
+    _local.__dict__.clear()
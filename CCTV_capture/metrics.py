@@ -0,0 +1,350 @@
+# 擷取的健康指標：各階段耗時的 histogram、每台攝影機的成功 / 失敗次數（含失敗原因）、事件紀錄
+#
+#     階段       page_load    driver.get() 載入攝影機頁面
+#                url_resolve  等 img.video_obj 出現並取得影像網址（WebDriverWait）
+#                download     HTTP 抓第一張 JPEG
+#                write        去重比對與寫檔 / 寫進封存檔
+#
+#     --metrics-port 9108   本機 HTTP：/metrics（Prometheus 文字格式）、/cameras（每台攝影機的狀態，JSON）
+#     --events events.jsonl 每次擷取一行 JSON：攝影機、成功與否、失敗原因、各階段秒數；快取的影像網址失效
+#                           記 url_invalidated，攝影機連續失敗 DEAD_AFTER 次記 camera_dead，之後成功記 camera_recovered
+#
+# 用法：
+#     python capture_service.py --metrics-port 9108 --events capture_events.jsonl
+#     curl http://127.0.0.1:9108/metrics
+#     curl http://127.0.0.1:9108/cameras
+#
+import json, time, threading, contextvars, http.server
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+from selenium.common.exceptions import WebDriverException, TimeoutException
+
+from http_pool import stats as http_stats
+
+STAGES = ("page_load", "url_resolve", "download", "write")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)     # 秒
+DEAD_AFTER = 5              # 連續失敗幾次算是失效的攝影機
+METRICS_HOST = "127.0.0.1"
+
+class Histogram:
+    """固定 bucket 的累積分布（與 Prometheus histogram 相同），另記最大值"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """q 分位數落在哪個 bucket 的上界（最後一格回傳最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+class CameraHealth:
+    __slots__ = ("success", "stored", "failures", "consecutive", "last_ok", "last_error", "last_reason")
+
+    def __init__(self):
+        self.success = 0
+        self.stored = 0
+        self.failures = Counter()
+        self.consecutive = 0
+        self.last_ok = None
+        self.last_error = None
+        self.last_reason = None
+
+    def as_dict(self):
+        return {"success": self.success, "stored": self.stored, "failures": dict(self.failures),
+                "consecutive_failures": self.consecutive, "last_ok": self.last_ok, "last_error": self.last_error,
+                "last_reason": self.last_reason}
+
+class EventLog:
+    """JSON lines，多執行緒共用；每行寫完就 flush，程式中斷也不會少掉最後幾筆"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, event, **fields):
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def failure_reason(exc):
+    """把例外轉成簡短的失敗原因（計數器的 reason 標籤）"""
+    reason = getattr(exc, "reason", None)
+    if isinstance(reason, str):         # capture.FetchError
+        return reason
+    if isinstance(exc, (requests.Timeout, TimeoutException, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, (requests.ConnectionError, ConnectionError)):
+        return "connection"
+    if isinstance(exc, requests.RequestException):
+        return "http_error"
+    if isinstance(exc, WebDriverException):
+        return "webdriver"
+    if isinstance(exc, OSError):
+        return "io_error"
+    return type(exc).__name__
+
+# 目前這次擷取的各階段秒數；執行緒與 asyncio task 各有自己的一份
+_current = contextvars.ContextVar("capture_attempt", default=None)
+
+class CaptureMetrics:
+    """擷取程式共用的一份指標（模組層級的 metrics），多執行緒與 asyncio 都可以直接呼叫
+
+    一次擷取：begin() → 各階段包在 timer() 裡 → success() 或 failure() 結束，
+    結束時把這次的各階段秒數寫進事件紀錄。
+    """
+
+    def __init__(self, dead_after=DEAD_AFTER):
+        self.dead_after = dead_after
+        self.lock = threading.Lock()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.cameras = {}
+        self.events = None
+        self.server = None
+        self.started = time.time()
+
+    # ---- 記錄 ----
+
+    def begin(self):
+        _current.set({"start": time.perf_counter(), "stages": {}})
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.stages[stage].observe(seconds)
+        attempt = _current.get()
+        if attempt is not None:
+            attempt["stages"][stage] = attempt["stages"].get(stage, 0.0) + seconds
+
+    def _finish(self):
+        attempt = _current.get()
+        _current.set(None)
+        if attempt is None:
+            return {}
+        return {"seconds": round(time.perf_counter() - attempt["start"], 4),
+                "stages": {k: round(v, 4) for k, v in attempt["stages"].items()}}
+
+    def _health(self, camera_id):
+        health = self.cameras.get(camera_id)
+        if health is None:
+            health = self.cameras[camera_id] = CameraHealth()
+        return health
+
+    def success(self, camera_id, stored=True):
+        fields = self._finish()
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            health = self._health(camera_id)
+            recovered = health.consecutive >= self.dead_after
+            health.success += 1
+            health.stored += bool(stored)
+            health.consecutive = 0
+            health.last_ok = now
+        if self.events is not None:
+            self.events.write("capture", camera_id=camera_id, ok=True, stored=bool(stored), **fields)
+            if recovered:
+                self.events.write("camera_recovered", camera_id=camera_id)
+
+    def failure(self, camera_id, reason, detail=None):
+        fields = self._finish()
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            health = self._health(camera_id)
+            health.failures[reason] += 1
+            health.consecutive += 1
+            health.last_error = now
+            health.last_reason = reason
+            dead = health.consecutive == self.dead_after
+        if self.events is not None:
+            if detail is not None:
+                fields["detail"] = str(detail).strip()[:200]
+            self.events.write("capture", camera_id=camera_id, ok=False, reason=reason, **fields)
+            if dead:
+                self.events.write("camera_dead", camera_id=camera_id, reason=reason)
+
+    def event(self, event, **fields):
+        """其他事件（例如快取的影像網址失效），只寫進事件紀錄"""
+        if self.events is not None:
+            self.events.write(event, **fields)
+
+    # ---- 查詢 ----
+
+    def dead_cameras(self):
+        """連續失敗 dead_after 次以上的攝影機，依連續失敗次數由多到少"""
+        with self.lock:
+            dead = [(cid, h.consecutive, h.last_reason) for cid, h in self.cameras.items()
+                    if h.consecutive >= self.dead_after]
+        return sorted(dead, key=lambda x: -x[1])
+
+    def snapshot(self):
+        with self.lock:
+            stages = {stage: {"count": h.count, "avg": h.sum / h.count if h.count else 0.0,
+                              "p50": h.quantile(0.5), "p90": h.quantile(0.9), "max": h.max}
+                      for stage, h in self.stages.items()}
+            cameras = {cid: h.as_dict() for cid, h in self.cameras.items()}
+        return {"uptime": time.time() - self.started, "stages": stages, "cameras": cameras,
+                "dead_after": self.dead_after}
+
+    def summary(self):
+        with self.lock:
+            parts = [f"{stage} 平均 {1000 * h.sum / h.count:.0f} ms、p90 ≤ {1000 * h.quantile(0.9):.0f} ms（{h.count} 次）"
+                     for stage, h in self.stages.items() if h.count]
+            reasons = Counter()
+            for h in self.cameras.values():
+                reasons.update(h.failures)
+        dead = self.dead_cameras()
+        text = "階段耗時：" + ("；".join(parts) if parts else "無")
+        if reasons:
+            text += "\n  失敗原因：" + "、".join(f"{r} {n}" for r, n in reasons.most_common())
+        if dead:
+            text += (f"\n  連續失敗 ≥ {self.dead_after} 次：{len(dead)} 台（"
+                     + "、".join(f"{cid} {n} 次" for cid, n, _ in dead[:10]) + ("…" if len(dead) > 10 else "") + "）")
+        return text
+
+    def render_prometheus(self):
+        lines = []
+        add = lines.append
+        with self.lock:
+            add("# HELP cctv_stage_seconds Time spent in each capture stage.")
+            add("# TYPE cctv_stage_seconds histogram")
+            for stage, h in self.stages.items():
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    add(f'cctv_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                add(f'cctv_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                add(f'cctv_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                add(f'cctv_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            cameras = sorted(self.cameras.items())
+            add("# HELP cctv_captures_total Successful captures per camera.")
+            add("# TYPE cctv_captures_total counter")
+            for cid, h in cameras:
+                add(f'cctv_captures_total{{camera="{_label(cid)}"}} {h.success}')
+            add("# HELP cctv_capture_failures_total Failed captures per camera and reason.")
+            add("# TYPE cctv_capture_failures_total counter")
+            for cid, h in cameras:
+                for reason, n in sorted(h.failures.items()):
+                    add(f'cctv_capture_failures_total{{camera="{_label(cid)}",reason="{_label(reason)}"}} {n}')
+            add("# HELP cctv_camera_consecutive_failures Failures since the last successful capture.")
+            add("# TYPE cctv_camera_consecutive_failures gauge")
+            for cid, h in cameras:
+                add(f'cctv_camera_consecutive_failures{{camera="{_label(cid)}"}} {h.consecutive}')
+            dead = sum(h.consecutive >= self.dead_after for _, h in cameras)
+        add("# HELP cctv_cameras_dead Cameras with at least dead_after consecutive failures.")
+        add("# TYPE cctv_cameras_dead gauge")
+        add(f"cctv_cameras_dead {dead}")
+        s = http_stats.snapshot()
+        add("# TYPE cctv_http_requests_total counter")
+        add(f"cctv_http_requests_total {s['requests']}")
+        add("# TYPE cctv_http_connections_opened_total counter")
+        add(f"cctv_http_connections_opened_total {s['opened']}")
+        add("# TYPE cctv_http_handshake_seconds_total counter")
+        add(f"cctv_http_handshake_seconds_total {s['handshake_ms_total'] / 1000:.6f}")
+        return "\n".join(lines) + "\n"
+
+    # ---- 輸出 ----
+
+    def open_event_log(self, path):
+        self.close_event_log()
+        self.events = EventLog(path)
+
+    def close_event_log(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+    def serve(self, port, host=METRICS_HOST):
+        """在背景執行緒開 /metrics 與 /cameras，port 為 0 時由系統選一個，回傳實際的 port"""
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body, content_type = site.render_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/cameras":
+                    data = site.snapshot()
+                    data["dead"] = [{"camera_id": cid, "consecutive_failures": n, "reason": r}
+                                    for cid, n, r in site.dead_cameras()]
+                    body, content_type = json.dumps(data, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.close_event_log()
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+metrics = CaptureMetrics()
+
+def add_metrics_args(parser):
+    parser.add_argument("--metrics-port", type=int, help="開本機 HTTP 指標端點（/metrics、/cameras）的 port")
+    parser.add_argument("--events", help="擷取事件紀錄（JSON lines）的路徑")
+    parser.add_argument("--dead-after", type=int, default=DEAD_AFTER, help="連續失敗幾次算是失效的攝影機")
+
+def metrics_from_args(args):
+    """依 add_metrics_args() 的參數設定共用的 metrics，並開啟事件紀錄與 HTTP 端點"""
+    metrics.dead_after = args.dead_after
+    if args.events:
+        metrics.open_event_log(args.events)
+    if args.metrics_port is not None:
+        port = metrics.serve(args.metrics_port)
+        print(f"指標端點：http://{METRICS_HOST}:{port}/metrics")
+    return metrics
@@ -0,0 +1,241 @@
+import re
+
+SOI, EOI = b'\xff\xd8', b'\xff\xd9'
+READ_SIZE = 64 * 1024
+INITIAL_BUFFER = 512 * 1024
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+_SEEK, _HEADERS, _BODY = range(3)
+_CONTENT_LENGTH_RE = re.compile(rb"content-length\s*:\s*(\d+)", re.IGNORECASE)
+
+def boundary_from_content_type(content_type):
+    m = re.search(r'boundary\s*=\s*"?([^";]+)"?', content_type or "", re.IGNORECASE)
+    return m.group(1).strip() if m else None
+
+def boundary_forms(boundary):
+    # RFC 2046 的分隔行是行首的 "--" + boundary。有些伺服器在 Content-Type 就把 "--" 寫進 boundary，
+    # 分隔行只有一組 "--"（或分隔行省略 "--"），分隔行就是 boundary 本身；兩種都試，第一個分隔行決定之後用哪一種
+    b = boundary.encode("latin-1")
+    return (b"--" + b, b)
+
+class MJPEGParser:
+    """增量式 MJPEG（multipart/x-mixed-replace）解析器
+
+    資料讀進預先配置的 bytearray，每次只從上次掃描到的位置往後找，不會重掃整個緩衝區。
+    有 boundary 時依 part 切分並優先使用 Content-Length；沒有 boundary 時退回找 SOI/EOI。
+    分隔行只認行首的 boundary，JPEG 內容中剛好出現 boundary 字串不會切斷；
+    沒有 Content-Length 的 part 結尾不是 EOI 時不是完整的 JPEG，直接丟棄（parts_rejected）。
+    緩衝區不夠時先把未處理的資料搬到開頭，仍不夠才加倍，單張超過 max_frame_bytes 就丟棄重新同步。
+    """
+
+    def __init__(self, boundary=None, initial_size=INITIAL_BUFFER, max_frame_bytes=MAX_FRAME_BYTES):
+        self.buf = bytearray(initial_size)
+        self.view = memoryview(self.buf)
+        self.max_frame_bytes = max_frame_bytes
+        self.forms = boundary_forms(boundary) if boundary else None
+        self.delim = None   # 第一個分隔行決定的分隔字串（forms 之一）
+        self.head = 0       # 尚未消化的資料起點
+        self.tail = 0       # 有效資料終點
+        self.scan = 0       # 下一次搜尋的起點
+        self.line_start = 0     # 前面沒有換行也算行首的位置：串流開頭、Content-Length 內容的結尾；-1 為沒有
+        self.state = _SEEK
+        self.part_start = -1    # multipart：目前 part 的 header / body 起點；raw：目前 JPEG 的 SOI
+        self.content_length = None
+        self.frames_parsed = 0
+        self.parts_rejected = 0
+        self.bytes_dropped = 0
+
+    @classmethod
+    def from_content_type(cls, content_type, **kwargs):
+        return cls(boundary_from_content_type(content_type), **kwargs)
+
+    def _shift(self, offset):
+        self.head -= offset
+        self.tail -= offset
+        self.scan -= offset
+        if self.part_start >= 0:
+            self.part_start -= offset
+        if self.line_start >= 0:
+            self.line_start -= offset
+
+    def writable(self, min_free=READ_SIZE):
+        """回傳可直接 readinto 的 memoryview（至少 min_free bytes），寫完後呼叫 commit(n)"""
+        if self.tail - self.head > self.max_frame_bytes:
+            # 單張太大（或根本不是 MJPEG），丟掉重新同步；先檢查再擴大，緩衝區不會長到 max_frame_bytes 的兩倍
+            self.bytes_dropped += self.tail - self.head
+            self.head = self.tail = self.scan = 0
+            self.state, self.part_start, self.line_start = _SEEK, -1, -1
+        if len(self.buf) - self.tail < min_free and self.head > 0:
+            pending = self.tail - self.head
+            self.buf[:pending] = bytes(self.view[self.head:self.tail])
+            self._shift(self.head)
+        if len(self.buf) - self.tail < min_free:
+            size = len(self.buf)
+            while size - self.tail < min_free:
+                size *= 2
+            buf = bytearray(size)
+            buf[:self.tail] = self.view[:self.tail]
+            self.buf, self.view = buf, memoryview(buf)
+        return self.view[self.tail:]
+
+    def commit(self, n):
+        self.tail += n
+
+    def feed(self, data):
+        n = len(data)
+        self.writable(n)[:n] = data
+        self.commit(n)
+
+    def read_from(self, stream, size=READ_SIZE):
+        """從檔案型串流讀一次，回傳讀到的 bytes 數（0 表示串流結束）"""
+        read1 = getattr(stream, "read1", None)
+        if read1 is not None:
+            # urllib3 / http.client：read1 有資料就回，不會等滿 size
+            data = read1(size)
+            self.feed(data)
+            return len(data)
+        n = stream.readinto(self.writable(size)[:size])
+        self.commit(n or 0)
+        return n or 0
+
+    def _emit(self, start, end, copy):
+        # 去掉 part 開頭可能的雜訊，從 SOI 開始
+        if self.buf[start:start + 2] != SOI:
+            start = self.buf.find(SOI, start, end)
+            if start == -1:
+                return None
+        self.frames_parsed += 1
+        return bytes(self.view[start:end]) if copy else self.view[start:end]
+
+    def frames(self, copy=True):
+        """yield 目前緩衝區中所有完整的 JPEG
+
+        copy=False 時回傳 memoryview，只在下一次 writable / feed / read_from 之前有效。
+        """
+        while True:
+            frame = self._next_multipart(copy) if self.forms else self._next_raw(copy)
+            if frame is False:
+                return
+            if frame is not None:
+                yield frame
+
+    def _next_raw(self, copy):
+        buf = self.buf
+        if self.part_start < 0:
+            i = buf.find(SOI, self.scan, self.tail)
+            if i == -1:
+                self.head = self.scan = max(self.tail - 1, self.head)
+                return False
+            self.part_start = self.head = i
+            self.scan = i + 2
+        j = buf.find(EOI, self.scan, self.tail)
+        if j == -1:
+            self.scan = max(self.tail - 1, self.scan)
+            return False
+        start, self.part_start = self.part_start, -1
+        self.head = self.scan = j + 2
+        return self._emit(start, j + 2, copy)
+
+    def _line_end(self, j):
+        # 分隔字串後面只能接 "--"（最後一個分隔行）或空白後換行
+        # 回傳換行（或 "--"）的位置；不是分隔行回傳 -1，資料還不夠判斷回傳 None
+        buf, tail = self.buf, self.tail
+        while j < tail and buf[j] in b" \t":
+            j += 1
+        if tail - j < 2:
+            return None if j == tail or buf[j] in b"\r-" else -1
+        return j if buf[j:j + 2] in (b"\r\n", b"--") else -1
+
+    def _find_delimiter(self, start):
+        """從 start 往後找行首的分隔行，回傳 (分隔行起點, 前一個 part 的結尾, 分隔行的換行位置)
+
+        還沒有完整的分隔行時回傳 None，self.scan 設在下次重找的位置（往前多留一個位元組判斷行首）。
+        """
+        buf = self.buf
+        forms = (self.delim,) if self.delim is not None else self.forms
+        pos = start
+        while True:
+            i, form = -1, None
+            for f in forms:
+                k = buf.find(f, pos, self.tail)
+                if k != -1 and (i == -1 or k < i):
+                    i, form = k, f
+            if i == -1:
+                self.scan = max(self.tail - max(map(len, forms)) - 1, start)
+                return None
+            if i != self.line_start and (i == 0 or buf[i - 1] != 0x0a):     # 不在行首，是內容的一部分
+                pos = i + 1
+                continue
+            line_end = self._line_end(i + len(form))
+            if line_end is None:
+                self.scan = i
+                return None
+            if line_end == -1:
+                pos = i + 1
+                continue
+            self.delim = form
+            end = i
+            if buf[end - 1:end] == b"\n":
+                end -= 1
+                if buf[end - 1:end] == b"\r":
+                    end -= 1
+            return i, max(end, start), line_end
+
+    def _next_multipart(self, copy):
+        buf = self.buf
+        if self.state == _SEEK:
+            found = self._find_delimiter(self.scan)
+            if found is None:
+                # 分隔行可能被切在兩次讀取之間，保留尾巴
+                self.head = max(self.scan - 1, self.head)
+                return False
+            i, _, line_end = found
+            self.head = i
+            # 從分隔行的換行開始找空行，沒有 part header 時也能對上
+            self.part_start = self.scan = line_end
+            self.state = _HEADERS
+        if self.state == _HEADERS:
+            e = buf.find(b"\r\n\r\n", self.scan, self.tail)
+            if e == -1:
+                self.scan = max(self.tail - 3, self.part_start)
+                return False
+            m = _CONTENT_LENGTH_RE.search(buf, self.part_start, e)
+            self.content_length = int(m.group(1)) if m else None
+            self.part_start = self.scan = e + 4
+            self.state = _BODY
+        start = self.part_start
+        if self.content_length is not None:
+            end = start + self.content_length
+            if self.tail < end:
+                return False
+            # 有些伺服器在內容後面直接接分隔行，沒有換行
+            self.head = self.scan = self.line_start = end
+        else:
+            found = self._find_delimiter(self.scan)
+            if found is None:
+                return False
+            _, end, _ = found
+            # 分隔行前的換行留給下一次 _SEEK 判斷行首
+            self.head = self.scan = end
+            while end > start and buf[end - 1] in b"\r\n \t":
+                end -= 1
+            if buf[end - 2:end] != EOI:
+                self.parts_rejected += 1
+                self.bytes_dropped += end - start
+                self.state, self.part_start = _SEEK, -1
+                return None
+        self.state, self.part_start = _SEEK, -1
+        return self._emit(start, end, copy)
+
+def iter_frames(stream, parser, max_frames=None, read_size=READ_SIZE):
+    """從同一條連線連續讀出最多 max_frames 張 JPEG（None 表示讀到串流結束）"""
+    count = 0
+    while max_frames is None or count < max_frames:
+        n = parser.read_from(stream, read_size)
+        for frame in parser.frames():
+            yield frame
+            count += 1
+            if max_frames is not None and count >= max_frames:
+                return
+        if n == 0:
+            return
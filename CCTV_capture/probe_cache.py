@@ -0,0 +1,88 @@
+import os, json, time, threading
+
+PROBE_CACHE_PATH = "probe_cache.jsonl"
+CAMERA_TTL = 24 * 3600          # 有攝影機的 ID 多久後要重新確認（用條件式請求，通常只回 304）
+MISSING_TTL = 7 * 24 * 3600     # 沒有攝影機的 ID 多久後才再試
+
+CAMERA, MISSING, ERROR = "camera", "missing", "error"
+
+class ProbeCache:
+    """findCam 的探測結果快取：JSON lines，每探測完一個 ID 就追加一行並 flush
+
+    同一個 ID 以最後一行為準，所以中斷後重跑只會重新探測還沒做過或已過期的 ID；
+    結束時 compact() 把檔案重寫成每個 ID 一行。
+    """
+
+    def __init__(self, path=PROBE_CACHE_PATH, camera_ttl=CAMERA_TTL, missing_ttl=MISSING_TTL):
+        self.path = path
+        self.camera_ttl = camera_ttl
+        self.missing_ttl = missing_ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue    # 中斷時寫了一半的最後一行
+                    self.entries[entry["cam_id"]] = entry
+        self.log = open(path, "a", encoding="utf-8")
+
+    def get(self, cam_id):
+        with self.lock:
+            return self.entries.get(cam_id)
+
+    def is_fresh(self, entry, now=None):
+        if entry is None or entry["status"] == ERROR:
+            return False
+        ttl = self.camera_ttl if entry["status"] == CAMERA else self.missing_ttl
+        return (now or time.time()) - entry["checked_at"] < ttl
+
+    def record(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            self.entries[entry["cam_id"]] = entry
+            self.log.write(line + "\n")
+            self.log.flush()
+
+    def cameras(self, city_code=None):
+        """快取中目前判定為攝影機的紀錄"""
+        with self.lock:
+            return [e for e in self.entries.values()
+                    if e["status"] == CAMERA and (city_code is None or e["cam_id"].startswith(f"{city_code}-"))]
+
+    def compact(self):
+        with self.lock:
+            self.log.close()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for cam_id in sorted(self.entries):
+                    f.write(json.dumps(self.entries[cam_id], ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self.log = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self.lock:
+            self.log.close()
+
+def diff_camera_lists(old, new, cities=None):
+    """比較 {縣市: {名稱: 網址}}，以網址為鍵，回傳 {縣市: {"added": [...], "removed": [...], "renamed": [...]}}
+
+    cities 指定時只比較這些縣市（沒有搜尋的縣市不算 removed）。
+    """
+    diff = {}
+    for city in sorted(set(old) | set(new)):
+        if cities is not None and city not in cities:
+            continue
+        old_by_url = {url: name for name, url in old.get(city, {}).items()}
+        new_by_url = {url: name for name, url in new.get(city, {}).items()}
+        entry = {
+            "added": [{"name": new_by_url[u], "url": u} for u in sorted(new_by_url.keys() - old_by_url.keys())],
+            "removed": [{"name": old_by_url[u], "url": u} for u in sorted(old_by_url.keys() - new_by_url.keys())],
+            "renamed": [{"url": u, "old": old_by_url[u], "new": new_by_url[u]}
+                        for u in sorted(old_by_url.keys() & new_by_url.keys()) if old_by_url[u] != new_by_url[u]],
+        }
+        if any(entry.values()):
+            diff[city] = entry
+    return diff
@@ -0,0 +1,181 @@
+# 每台攝影機的感興趣區域（ROI）：淹水只會出現在路面，天空、時間戳記、建築物不必增強，也不必送進模型
+#
+# camera_rois.json 與 camera_tags.json 一樣放在 *_cameras.json 旁邊，由 camera_registry 一起載入（cam.roi）：
+#
+#     {"tnn_00004": {"polygons": [[[0.0, 0.45], [1.0, 0.4], [1.0, 1.0], [0.0, 1.0]]],
+#                    "exclude":  [[[0.0, 0.92], [0.35, 0.92], [0.35, 1.0], [0.0, 1.0]]]},
+#      "khh_00012": [[[0.1, 0.5], [0.9, 0.5], [1.0, 1.0], [0.0, 1.0]]]}
+#
+# 座標為相對於畫面寬高的 0~1，同一份設定適用原圖、IMREAD_REDUCED 縮小解碼與任何解析度。
+# 只給多邊形清單時等同 {"polygons": [...]}；exclude 為外接矩形內要排除的區域（例如時間戳記）。
+#
+# 用法：
+#     python roi.py preview tnn_00004 D:\Taiwan_CCTV\downloaded_images\某攝影機\tnn_00004_20250701_031500.jpg roi.jpg
+#     python roi.py stats
+#
+import os, json, argparse
+
+import cv2
+import numpy as np
+
+ROIS_PATH = "camera_rois.json"
+
+def _polygon(points):
+    poly = np.clip(np.asarray(points, np.float32).reshape(-1, 2), 0.0, 1.0)
+    if len(poly) < 3:
+        raise ValueError(f"ROI 多邊形至少要 3 個點：{points}")
+    return poly
+
+class ROIGeometry:
+    """一個 ROI 在某個解析度下的外接矩形與遮罩（遮罩為 None 表示整個外接矩形都在 ROI 內）"""
+    __slots__ = ("shape", "y0", "y1", "x0", "x1", "mask", "where")
+
+    def __init__(self, shape, y0, y1, x0, x1, mask):
+        self.shape = shape
+        self.y0, self.y1, self.x0, self.x1 = y0, y1, x0, x1
+        self.mask = mask                                            # uint8，外接矩形大小
+        self.where = None if mask is None else (mask > 0)[..., None]   # 給 np.copyto 用
+
+    def crop(self, img):
+        """外接矩形的 view，不複製像素；寫入 view 會改到原圖"""
+        return img[self.y0:self.y1, self.x0:self.x1]
+
+    def masked(self, roi_img, fill=0):
+        """把 ROI 外（外接矩形內、多邊形外）的像素設為 fill，回傳新陣列；沒有遮罩時直接回傳 roi_img"""
+        if self.mask is None:
+            return roi_img
+        out = np.full_like(roi_img, fill)
+        np.copyto(out, roi_img, where=self.where if roi_img.ndim == 3 else self.where[..., 0])
+        return out
+
+    def paste(self, dst, roi_img):
+        """把處理過的外接矩形寫回 dst（只寫 ROI 內的像素）"""
+        view = self.crop(dst)
+        if self.mask is None:
+            np.copyto(view, roi_img)
+        else:
+            np.copyto(view, roi_img, where=self.where if roi_img.ndim == 3 else self.where[..., 0])
+        return dst
+
+    @property
+    def bbox_fraction(self):
+        H, W = self.shape
+        return (self.y1 - self.y0) * (self.x1 - self.x0) / (H * W)
+
+    @property
+    def mask_fraction(self):
+        H, W = self.shape
+        area = (self.y1 - self.y0) * (self.x1 - self.x0) if self.mask is None else cv2.countNonZero(self.mask)
+        return area / (H * W)
+
+class CameraROI:
+    """一台攝影機的 ROI：polygons 的聯集扣掉 exclude；每種解析度的幾何只算一次"""
+    __slots__ = ("polygons", "exclude", "_geometry")
+
+    def __init__(self, polygons, exclude=()):
+        if not polygons:
+            raise ValueError("ROI 至少要有一個多邊形")
+        self.polygons = [_polygon(p) for p in polygons]
+        self.exclude = [_polygon(p) for p in exclude]
+        self._geometry = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, dict):
+            return cls(data.get("polygons", ()), data.get("exclude", ()))
+        return cls(data)
+
+    def as_dict(self):
+        data = {"polygons": [p.tolist() for p in self.polygons]}
+        if self.exclude:
+            data["exclude"] = [p.tolist() for p in self.exclude]
+        return data
+
+    def geometry(self, shape):
+        H, W = shape[:2]
+        geo = self._geometry.get((H, W))
+        if geo is None:
+            scale = np.array([W - 1, H - 1], np.float32)
+            polys = [np.round(p * scale).astype(np.int32) for p in self.polygons]
+            points = np.concatenate(polys)
+            x0, y0 = points.min(axis=0)
+            x1, y1 = points.max(axis=0) + 1
+            offset = np.array([x0, y0], np.int32)
+            mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            cv2.fillPoly(mask, [p - offset for p in polys], 255)
+            if self.exclude:
+                cv2.fillPoly(mask, [np.round(p * scale).astype(np.int32) - offset for p in self.exclude], 0)
+            if cv2.countNonZero(mask) == mask.size:
+                mask = None     # 矩形 ROI：只要切外接矩形
+            geo = self._geometry[(H, W)] = ROIGeometry((H, W), int(y0), int(y1), int(x0), int(x1), mask)
+        return geo
+
+    def crop(self, img):
+        return self.geometry(img.shape).crop(img)
+
+    def apply(self, img, fill=0):
+        """切出外接矩形並把 ROI 外的像素設為 fill（矩形 ROI 時為不複製的 view）"""
+        geo = self.geometry(img.shape)
+        return geo.masked(geo.crop(img), fill)
+
+    def __repr__(self):
+        return f"CameraROI({len(self.polygons)} 個多邊形，排除 {len(self.exclude)} 個)"
+
+def load_rois(path=ROIS_PATH):
+    """{camera_id: CameraROI}；檔案不存在時回傳空 dict，格式錯誤的項目略過"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"讀取 {path} 失敗: {e}")
+        return {}
+    rois = {}
+    for camera_id, data in raw.items():
+        try:
+            rois[camera_id] = CameraROI.from_dict(data)
+        except (ValueError, TypeError) as e:
+            print(f"略過 {camera_id} 的 ROI：{e}")
+    return rois
+
+def draw_preview(img, roi):
+    """ROI 外的區域調暗，外接矩形畫框"""
+    geo = roi.geometry(img.shape)
+    out = (img * 0.35).astype(np.uint8)
+    geo.paste(out, geo.crop(img))
+    cv2.rectangle(out, (geo.x0, geo.y0), (geo.x1 - 1, geo.y1 - 1), (0, 255, 255), 2)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="攝影機 ROI 設定檢查")
+    parser.add_argument("--rois", default=ROIS_PATH, help="ROI 設定檔")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("preview", help="把 ROI 畫在一張影像上")
+    p.add_argument("camera_id")
+    p.add_argument("image")
+    p.add_argument("output")
+    p = sub.add_parser("stats", help="各攝影機 ROI 佔畫面的比例")
+    p.add_argument("--size", type=int, nargs=2, default=(1080, 1920), metavar=("H", "W"))
+    args = parser.parse_args()
+
+    rois = load_rois(args.rois)
+    if args.command == "preview":
+        roi = rois.get(args.camera_id)
+        if roi is None:
+            parser.error(f"{args.rois} 中沒有 {args.camera_id}")
+        img = cv2.imread(args.image, cv2.IMREAD_COLOR)
+        if img is None:
+            parser.error(f"無法讀取 {args.image}")
+        cv2.imwrite(args.output, draw_preview(img, roi))
+        geo = roi.geometry(img.shape)
+        print(f"{args.camera_id}：外接矩形 {geo.x1 - geo.x0}x{geo.y1 - geo.y0}（{geo.bbox_fraction:.0%}），"
+              f"ROI {geo.mask_fraction:.0%}，已寫到 {args.output}")
+        return
+    print(f"{len(rois)} 台攝影機有 ROI（以 {args.size[1]}x{args.size[0]} 計算）")
+    for camera_id, roi in sorted(rois.items()):
+        geo = roi.geometry(args.size)
+        print(f"  {camera_id}：外接矩形 {geo.bbox_fraction:.0%}，ROI {geo.mask_fraction:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,7 @@
-import subprocess
-import glob
-import time
-from multiprocessing import Process
-
-def run_capture(json_file):
-    try:
-        print(f"啟動子進程: {json_file}")
-        subprocess.run(["python", "capture.py", "--json", json_file])
-    except Exception as e:
-        print(f"執行 {json_file} 發生錯誤: {e}")
+# 所有縣市改由單一 capture service 擷取：共用佇列與 worker，
+# 不再每個 *_cameras.json 各開兩個 Python 程序和一個 Chrome
+# 用法：python run_all.py [--workers 8] [--json all.json] [--cities tnn khh] [--shard 0/2]
+from capture_service import main
 
 if __name__ == "__main__":
-    json_files = sorted(glob.glob("*_cameras.json"))
-    processes = []
-
-    for json_file in json_files:
-        p = Process(target=run_capture, args=(json_file,))
-        p.start()
-        processes.append(p)
-        time.sleep(1) # 避免過快啟動多個進程
-
-    try:
-        for p in processes:
-            p.join()
-    except KeyboardInterrupt:
-        print("\n收到中斷，正在終止所有子進程...")
-        for p in processes:
-            p.terminate()
-        print("已全部停止。")
+    main()
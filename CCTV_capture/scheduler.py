@@ -0,0 +1,193 @@
+import heapq, threading, time
+
+import numpy as np
+try:
+    import cv2
+except ImportError:     # 沒有 OpenCV 時只能判斷影像是否完全相同
+    cv2 = None
+
+THUMB_SIZE = 32
+CHANGE_HIGH = 0.08      # 與上一張的平均灰階差（0~1）超過這個值視為畫面劇烈變化（下雨、積水）
+CHANGE_STATIC = 0.01    # 低於這個值視為靜止畫面
+STATIC_STREAK = 3       # 連續幾張靜止才拉長間隔
+FAIL_BACKOFF = 2.0      # 抓圖失敗（離線）時間隔加倍（沒有斷路器時）
+REPORT_WORST = 5
+
+def frame_thumbnail(jpg_data, roi=None):
+    """把 JPEG 解成 32x32 灰階縮圖（float32，0~1），解不開時回傳 None
+
+    有 roi（CameraROI）時只看 ROI 內：時間戳記每張都不同、天空的雲與光線變化都不算畫面變化。
+    """
+    if cv2 is None or not jpg_data:
+        return None
+    # IMREAD_REDUCED_GRAYSCALE_8 在解碼時就縮小 8 倍，不用解出整張彩色影像
+    img = cv2.imdecode(np.frombuffer(jpg_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    if roi is not None:
+        img = roi.apply(img)
+    thumb = cv2.resize(img, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    return thumb.astype(np.float32) / 255.0
+
+def frame_change(prev, cur):
+    if prev is None or cur is None:
+        return None
+    return float(np.abs(cur - prev).mean())
+
+class CameraSchedule:
+    __slots__ = ("cam", "interval", "due", "thumb", "last_bytes", "failures", "static_streak",
+                 "change", "runs", "lag_total", "lag_max", "lag_last")
+
+    def __init__(self, cam, interval, due):
+        self.cam = cam
+        self.interval = interval
+        self.due = due
+        self.thumb = None
+        self.last_bytes = None
+        self.failures = 0
+        self.static_streak = 0
+        self.change = None
+        self.runs = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.lag_last = 0.0
+
+    @property
+    def lag_avg(self):
+        return self.lag_total / self.runs if self.runs else 0.0
+
+class DeadlineScheduler:
+    """以每台攝影機「下次應擷取時間」為鍵的 priority queue
+
+    每台各自有目標間隔：畫面與上一張差很多（可能下雨、淹水）就縮短，離線或畫面靜止就拉長，
+    其他情況慢慢回到 base_interval。下次時間從上次的期限往後推，不受擷取花多久影響，
+    取出時記錄實際開始時間與期限的差（lag）。可多執行緒共用：next_due() 取出，complete() 放回。
+    有 breakers（CircuitBreakers）時，開路中的攝影機排到下次探測的時間（含重新啟動前就開路的），
+    到期時經過 breakers.allow() 才放行（等待時間到了轉成 half-open 探測一次）；失敗的退避交給斷路器，不再另外加倍間隔。
+    """
+
+    def __init__(self, cameras, base_interval=300, min_interval=60, max_interval=1800,
+                 change_high=CHANGE_HIGH, change_static=CHANGE_STATIC, clock=time.monotonic, breakers=None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_high = change_high
+        self.change_static = change_static
+        self.clock = clock
+        self.breakers = breakers
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.entries = {}
+        self.heap = []
+        self._seq = 0
+        now = clock()
+        for cam in cameras:
+            delay = breakers.retry_after(cam['camera_id']) if breakers is not None else 0.0
+            entry = CameraSchedule(cam, base_interval, now + delay)
+            self.entries[cam['camera_id']] = entry
+            self._push(entry)
+
+    def _push(self, entry):
+        self._seq += 1
+        heapq.heappush(self.heap, (entry.due, self._seq, entry))
+
+    def next_due(self, timeout=None):
+        """等到最早到期的攝影機並取出；stop() 後或逾時回傳 None。取出的攝影機在 complete() 前不會再排入"""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.cond:
+            while not self.stopped:
+                now = self.clock()
+                wait = None if deadline is None else deadline - now
+                if self.heap:
+                    due, _, entry = self.heap[0]
+                    if due <= now:
+                        heapq.heappop(self.heap)
+                        if self.breakers is not None and not self.breakers.allow(entry.cam['camera_id']):
+                            # 斷路器還不放行：排到它的下次探測時間
+                            entry.due = now + (self.breakers.retry_after(entry.cam['camera_id']) or self.min_interval)
+                            self._push(entry)
+                            continue
+                        lag = now - due
+                        entry.runs += 1
+                        entry.lag_last = lag
+                        entry.lag_total += lag
+                        entry.lag_max = max(entry.lag_max, lag)
+                        return entry.cam
+                    wait = due - now if wait is None else min(wait, due - now)
+                if wait is not None and wait <= 0:
+                    return None
+                self.cond.wait(wait)
+            return None
+
+    def complete(self, cam, jpg_data=None):
+        """回報擷取結果（失敗傳 None），依畫面變化調整間隔後重新排入"""
+        entry = self.entries[cam['camera_id']]
+        thumb = frame_thumbnail(jpg_data, cam.get('roi')) if jpg_data else None
+        retry_after = 0.0
+        if self.breakers is not None:
+            self.breakers.record(cam['camera_id'], bool(jpg_data))
+            retry_after = self.breakers.retry_after(cam['camera_id'])
+        with self.cond:
+            self._adapt(entry, jpg_data, thumb)
+            # 從期限往後推；落後超過一個間隔就從現在重新起算，不補抓錯過的；開路中的排到下次探測時間
+            entry.due = max(entry.due + entry.interval, self.clock() + retry_after)
+            self._push(entry)
+            self.cond.notify_all()
+
+    def _adapt(self, entry, jpg_data, thumb):
+        if not jpg_data:
+            entry.failures += 1
+            entry.change = None
+            if self.breakers is None:
+                entry.interval = min(entry.interval * FAIL_BACKOFF, self.max_interval)
+            return
+        entry.failures = 0
+        if thumb is not None:
+            change = frame_change(entry.thumb, thumb)
+        else:
+            change = None if entry.last_bytes is None else float(jpg_data != entry.last_bytes)
+        entry.thumb = thumb
+        entry.last_bytes = jpg_data if thumb is None else None
+        entry.change = change
+        if change is None:
+            return
+        if change >= self.change_high:
+            entry.static_streak = 0
+            entry.interval = max(entry.interval / 2, self.min_interval)
+        elif change < self.change_static:
+            entry.static_streak += 1
+            if entry.static_streak >= STATIC_STREAK:
+                entry.interval = min(entry.interval * 1.5, self.max_interval)
+        else:
+            entry.static_streak = 0
+            entry.interval += (self.base_interval - entry.interval) / 2
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lag_summary(self):
+        with self.cond:
+            entries = [e for e in self.entries.values() if e.runs]
+            if not entries:
+                return "排程：尚未擷取"
+            lags = np.array([e.lag_last for e in entries])
+            short = sum(e.interval < self.base_interval for e in self.entries.values())
+            long = sum(e.interval > self.base_interval for e in self.entries.values())
+            return (f"排程：{len(entries)} 台，落後中位數 {np.median(lags):.1f} 秒、p95 {np.percentile(lags, 95):.1f} 秒、"
+                    f"最大 {lags.max():.1f} 秒；加密 {short} 台，放寬 {long} 台，排程中 {len(self.heap)} 台")
+
+    def lag_report(self, worst=REPORT_WORST):
+        """各攝影機相對期限的落後（秒），依最近一次落後排序，列出最嚴重的幾台"""
+        with self.cond:
+            entries = sorted((e for e in self.entries.values() if e.runs), key=lambda e: e.lag_last, reverse=True)
+            lines = [self.lag_summary()]
+        for e in entries[:worst]:
+            change = "-" if e.change is None else f"{e.change:.3f}"
+            lines.append(f"  {e.cam['camera_id']} {e.cam['name']}: 落後 {e.lag_last:.1f} 秒"
+                         f"（平均 {e.lag_avg:.1f}、最大 {e.lag_max:.1f}），間隔 {e.interval:.0f} 秒，變化 {change}，連續失敗 {e.failures}")
+        return "\n".join(lines)
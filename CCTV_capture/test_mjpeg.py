@@ -0,0 +1,223 @@
+"""MJPEGParser 與 iter_jpeg_frames：各種切法、有無 Content-Length、超大 part 重新同步"""
+import io
+import os
+import sys
+import random
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from fake_site import FakeSite, synthetic_jpegs
+from mjpeg import MJPEGParser, iter_frames
+from capture import iter_jpeg_frames
+
+JPEGS = synthetic_jpegs(6, shape=(60, 80))     # 每張約 2 KB，大於 MIN_JPEG_BYTES
+
+
+def multipart(jpegs, boundary="frame", content_length=True, preamble=b"", dashes=b"--", after=b"\r\n"):
+    """組出 multipart/x-mixed-replace 的內容，每個元素一個 part
+
+    dashes 為分隔行開頭的 "--"（模擬省略或重複的伺服器），after 為 part 內容之後、下一個分隔行之前的位元組。
+    """
+    line = dashes + boundary.encode()
+    out = [preamble]
+    for jpg in jpegs:
+        headers = b"Content-Type: image/jpeg\r\n"
+        if content_length:
+            headers += b"Content-Length: %d\r\n" % len(jpg)
+        out.append(line + b"\r\n" + headers + b"\r\n" + jpg + after)
+    out.append(line + b"--\r\n")
+    return b"".join(out)
+
+
+def split_random(data, rng, max_size=300):
+    i = 0
+    while i < len(data):
+        n = rng.randint(1, max_size)
+        yield data[i:i + n]
+        i += n
+
+
+def parse_chunks(chunks, boundary="frame", **kwargs):
+    parser = MJPEGParser(boundary, **kwargs)
+    frames = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        frames.extend(parser.frames())
+    return frames, parser
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+@pytest.mark.parametrize("chunking", ["whole", "1-byte", "random"])
+def test_parser_chunking(content_length, chunking):
+    body = multipart(JPEGS, content_length=content_length, preamble=b"junk before the first boundary\r\n")
+    if chunking == "whole":
+        chunks = [body]
+    elif chunking == "1-byte":
+        chunks = [body[i:i + 1] for i in range(len(body))]
+    else:
+        chunks = split_random(body, random.Random(len(body)))
+    frames, parser = parse_chunks(chunks, initial_size=4096)
+    assert frames == JPEGS
+    assert parser.frames_parsed == len(JPEGS)
+    assert parser.bytes_dropped == 0
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+@pytest.mark.parametrize("header, dashes", [
+    ("frame", b"--"),       # RFC 2046：分隔行 --frame
+    ("--frame", b"--"),     # Content-Type 已寫了 "--"，分隔行只有一組：--frame
+    ("--frame", b"----"),   # Content-Type 寫了 "--"，分隔行又照 RFC 再加一組：----frame
+    ("frame", b""),         # 分隔行省略 "--"：frame
+])
+def test_parser_boundary_variants(content_length, header, dashes):
+    body = multipart(JPEGS, content_length=content_length, dashes=dashes)
+    parser = MJPEGParser.from_content_type(f'multipart/x-mixed-replace; boundary="{header}"')
+    frames = []
+    for chunk in split_random(body, random.Random(1)):
+        parser.feed(chunk)
+        frames.extend(parser.frames())
+    assert frames == JPEGS
+
+
+def test_parser_boundary_text_inside_payload():
+    # boundary 字串出現在 JPEG 內容中（不在行首、或在行首但後面不是換行）不是分隔行
+    payloads = [b"\xff\xd8AAAA myboundary BBBB\xff\xd9",
+                b"\xff\xd8AAAA\r\n--myboundaryBBBB\xff\xd9",
+                b"\xff\xd8--myboundary\xff\xd9"]
+    body = multipart(payloads, boundary="myboundary", content_length=False)
+    for max_size in (1, 5, len(body)):
+        frames, parser = parse_chunks(split_random(body, random.Random(max_size), max_size), boundary="myboundary")
+        assert frames == payloads
+        assert parser.parts_rejected == 0
+
+
+def test_parser_rejects_part_without_eoi():
+    # 沒有 Content-Length 時，結尾不是 EOI 的 part（斷掉的 JPEG）整個丟掉，後面的照常解析
+    truncated = JPEGS[0][:len(JPEGS[0]) // 2]
+    body = multipart([JPEGS[0], truncated] + JPEGS[1:], content_length=False)
+    frames, parser = parse_chunks(split_random(body, random.Random(4)))
+    assert frames == JPEGS
+    assert parser.parts_rejected == 1
+    assert parser.bytes_dropped == len(truncated)
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_parser_part_separators(content_length):
+    # part 之間多一個空行、只有 LF；有 Content-Length 時內容後面直接接分隔行也要能對上
+    afters = [b"\r\n\r\n", b"\n"] + ([b""] if content_length else [])
+    for after in afters:
+        body = multipart(JPEGS, content_length=content_length, after=after)
+        frames, _ = parse_chunks(split_random(body, random.Random(5)))
+        assert frames == JPEGS, after
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_parser_resyncs_after_oversize_part(content_length):
+    oversize = b"\xff\xd8" + b"\x00" * 40000 + b"\xff\xd9"
+    body = multipart(JPEGS[:2] + [oversize] + JPEGS[2:], content_length=content_length)
+    frames, parser = parse_chunks(split_random(body, random.Random(2), 1000), initial_size=4096, max_frame_bytes=8192)
+    assert frames == JPEGS
+    assert parser.bytes_dropped > 0
+
+
+def test_parser_raw_jpeg_stream():
+    # 沒有 boundary 時退回找 SOI / EOI
+    parser = MJPEGParser(initial_size=4096)
+    frames = []
+    for chunk in split_random(b"noise" + b"".join(JPEGS), random.Random(3)):
+        parser.feed(chunk)
+        frames.extend(parser.frames())
+    assert frames == JPEGS
+
+
+def test_iter_frames_one_byte_reads():
+    body = multipart(JPEGS, content_length=False)
+    parser = MJPEGParser("frame", initial_size=4096)
+    assert list(iter_frames(io.BytesIO(body), parser, read_size=1)) == JPEGS
+    parser = MJPEGParser("frame", initial_size=4096)
+    assert list(iter_frames(io.BytesIO(body), parser, max_frames=2)) == JPEGS[:2]
+
+
+class _StreamServer:
+    """依路徑送出預先組好的 multipart 內容，每次寫入隨機長度後 flush，模擬網路上的任意切法"""
+
+    def __init__(self, streams):
+        self.streams = streams
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                content_type, body, max_chunk = streams[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.end_headers()
+                try:
+                    for chunk in split_random(body, random.Random(len(body)), max_chunk):
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # 用戶端讀到需要的張數就關閉連線
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope="module")
+def stream_server():
+    content_type = "multipart/x-mixed-replace; boundary=frame"
+    oversize = b"\xff\xd8" + b"\x00" * (9 * 1024 * 1024) + b"\xff\xd9"     # 超過 MAX_FRAME_BYTES
+    server = _StreamServer({
+        "/length": (content_type, multipart(JPEGS), 300),
+        "/no-length": (content_type, multipart(JPEGS, content_length=False), 300),
+        "/one-byte": (content_type, multipart(JPEGS[:2], content_length=False), 1),
+        "/oversize": (content_type, multipart(JPEGS[:1] + [oversize] + JPEGS[1:], content_length=False), 64 * 1024),
+        "/single": ("image/jpeg", JPEGS[0], 500),
+    })
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize("path", ["/length", "/no-length"])
+def test_iter_jpeg_frames_all(stream_server, path):
+    assert list(iter_jpeg_frames(stream_server.url(path), max_frames=100)) == JPEGS
+
+
+@pytest.mark.parametrize("n", [1, 3, len(JPEGS)])
+def test_iter_jpeg_frames_max_frames(stream_server, n):
+    assert list(iter_jpeg_frames(stream_server.url("/no-length"), max_frames=n)) == JPEGS[:n]
+
+
+def test_iter_jpeg_frames_one_byte_packets(stream_server):
+    assert list(iter_jpeg_frames(stream_server.url("/one-byte"), max_frames=10)) == JPEGS[:2]
+
+
+def test_iter_jpeg_frames_oversize_resync(stream_server):
+    assert list(iter_jpeg_frames(stream_server.url("/oversize"), max_frames=100)) == JPEGS
+
+
+def test_iter_jpeg_frames_single_jpeg(stream_server):
+    assert list(iter_jpeg_frames(stream_server.url("/single"), max_frames=3)) == JPEGS[:1]
+
+
+def test_iter_jpeg_frames_fake_site():
+    jpegs = synthetic_jpegs(3)
+    with FakeSite(jpegs=jpegs, mjpeg_frames=10) as site:
+        frames = list(iter_jpeg_frames(f"{site.base_url}/mjpeg/tnn-00001", max_frames=4))
+    assert frames == [jpegs[(1 + i) % 3] for i in range(4)]
@@ -0,0 +1,50 @@
+import os, json, time, threading, re
+
+URL_CACHE_PATH = "image_url_cache.json"
+
+# 影像串流網址通常帶 t=<時間戳> 防止快取，重用舊網址時換成現在時間
+def refresh_cache_buster(url):
+    return re.sub(r"([?&]t=)\d+", lambda m: f"{m.group(1)}{int(time.time() * 1000)}", url)
+
+class ImageUrlCache:
+    """camera_id → 影像串流網址（img.video_obj 的 src），存成 JSON 供下次啟動直接使用"""
+
+    def __init__(self, path=URL_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"讀取網址快取失敗，重新建立: {e}")
+
+    def get(self, camera_id):
+        with self.lock:
+            entry = self.entries.get(camera_id)
+        return refresh_cache_buster(entry["url"]) if entry else None
+
+    def set(self, camera_id, url, source="selenium"):
+        with self.lock:
+            self.entries[camera_id] = {"url": url, "source": source, "resolved_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+            self.dirty = True
+
+    def invalidate(self, camera_id):
+        with self.lock:
+            if self.entries.pop(camera_id, None) is not None:
+                self.dirty = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+            self.dirty = False
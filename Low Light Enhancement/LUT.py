@@ -1,28 +1,115 @@
-import cv2
 import numpy as np
 import os
-import glob
+import json
+import hashlib
+import argparse
+from functools import lru_cache
 
 # 產生 gain_map LUT（Q8.10，整數 + 小數）
-# t 最高到1(最亮) 最低到0
+# t 最高到1(最亮) 最低到0；t 可以是單一數值或一串數值（一次算出整個 LUT family）
 def generate_gain_LUT(m_min=1, m_max=2040, frac_bits=10,t = 1):
-    LUT = []
-    for m in range(m_min, m_max + 1):
-        raw = 4080.0 / m - 1.0
-        raw = max(0.0, raw)
-        gain = np.sqrt(raw)
-        gain = gain * t + (1-t)
-        fixed_point = int((gain * (1 << frac_bits)))  # Q8.10
-        LUT.append(fixed_point)
-    return np.array(LUT, dtype=np.uint16)
-
-# 輸出 LUT 為 .dat 檔（二進位，每行 16 位補齊）
+    m = np.arange(m_min, m_max + 1, dtype=np.float64)
+    raw = np.maximum(4080.0 / m - 1.0, 0.0)
+    gain = np.sqrt(raw)
+    t_arr = np.asarray(t, dtype=np.float64)[..., None]
+    gain = gain * t_arr + (1 - t_arr)
+    fixed_point = (gain * (1 << frac_bits)).astype(np.int64)  # Q8.10，與 int() 相同為無條件捨去
+    return fixed_point.astype(np.uint16)
+
+# 多個 t 的 LUT family：shape = (len(ts), m_max - m_min + 1)
+def generate_gain_LUT_family(ts, m_min=1, m_max=2040, frac_bits=10):
+    ts = np.atleast_1d(np.asarray(ts, dtype=np.float64))
+    return LUTFamily(ts, generate_gain_LUT(m_min, m_max, frac_bits, t=ts), frac_bits)
+
+class LUTFamily:
+    """一組不同亮度 t 的 gain LUT（t × index），可依 t 挑出單一 LUT"""
+
+    def __init__(self, ts, table, frac_bits=10):
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.table = table
+        self.frac_bits = frac_bits
+        if self.table.ndim != 2 or self.table.shape[0] != self.ts.size:
+            raise ValueError(f"LUT family 形狀 {self.table.shape} 與 t 數量 {self.ts.size} 不符")
+
+    def __len__(self):
+        return self.ts.size
+
+    def index_of(self, t):
+        """最接近 t 的 LUT 編號"""
+        return int(np.abs(self.ts - t).argmin())
+
+    def lut(self, t):
+        return self.table[self.index_of(t)]
+
+# 讀取 .dat 檔（每行 16 位二進位字串），同一個檔案沒改過就直接用快取
+def load_binary_lut(filepath):
+    st = os.stat(filepath)
+    return _load_binary_lut_cached(os.path.abspath(filepath), st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=32)
+def _load_binary_lut_cached(filepath, mtime_ns, size):
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+    lut = [int(line.strip(), 2) for line in lines if line.strip()]
+    lut = np.array(lut, dtype=np.uint16)  # Q8.10 格式，2040 個項
+    lut.setflags(write=False)   # 快取共用，不可被改寫
+    return lut
+
+# 輸出 LUT 為 .dat 檔（二進位，每行 16 位補齊），給 FPGA 流程用
 def save_LUT_to_dat_binary(lut_array, filename):
     with open(filename, "w") as f:
         for val in lut_array:
             bin_str = format(val, '016b')  # 轉成二進位並補足16位
             f.write(f"{bin_str}\n")
 
-# 建立 LUT 並儲存
-gain_LUT = generate_gain_LUT()
-save_LUT_to_dat_binary(gain_LUT, "weight_1.dat")
\ No newline at end of file
+def _meta_path(npy_path):
+    return os.path.splitext(npy_path)[0] + ".json"
+
+def _checksum(table):
+    return hashlib.sha256(np.ascontiguousarray(table).tobytes()).hexdigest()
+
+# LUT family 存成 .npy（可 memory-map）＋ 同名 .json（t 值、Q 格式、sha256）
+def save_LUT_family(family, npy_path):
+    table = np.ascontiguousarray(family.table, dtype=np.uint16)
+    np.save(npy_path, table)
+    meta = {
+        "t": family.ts.tolist(),
+        "frac_bits": family.frac_bits,
+        "shape": list(table.shape),
+        "sha256": _checksum(table),
+    }
+    with open(_meta_path(npy_path), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+def load_LUT_family(npy_path, mmap=True, verify=True):
+    st = os.stat(npy_path)
+    return _load_LUT_family_cached(os.path.abspath(npy_path), st.st_mtime_ns, st.st_size, mmap, verify)
+
+@lru_cache(maxsize=8)
+def _load_LUT_family_cached(npy_path, mtime_ns, size, mmap, verify):
+    with open(_meta_path(npy_path), encoding="utf-8") as f:
+        meta = json.load(f)
+    table = np.load(npy_path, mmap_mode="r" if mmap else None)
+    if list(table.shape) != meta["shape"] or table.dtype != np.uint16:
+        raise ValueError(f"{npy_path} 形狀 / 型別與 metadata 不符")
+    if verify and _checksum(table) != meta["sha256"]:
+        raise ValueError(f"{npy_path} checksum 不符，檔案可能損毀")
+    return LUTFamily(meta["t"], table, meta["frac_bits"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="產生 gain LUT（.dat 給 FPGA，.npy family 給 Enhancer）")
+    parser.add_argument("--t", type=float, nargs="+", default=[1.0], help="亮度 t，可給多個")
+    parser.add_argument("--out", default="weight_1.dat", help="單一 t 時輸出的 .dat 檔名")
+    parser.add_argument("--family", help="輸出 LUT family 的 .npy 路徑（同時寫同名 .json）")
+    args = parser.parse_args()
+
+    # 建立 LUT 並儲存
+    family = generate_gain_LUT_family(args.t)
+    if args.family:
+        save_LUT_family(family, args.family)
+        print(f"✅ 已輸出 {len(family)} 組 LUT 到 {args.family}")
+    elif len(family) == 1:
+        save_LUT_to_dat_binary(family.table[0], args.out)
+    else:
+        for t, gain_LUT in zip(family.ts, family.table):
+            save_LUT_to_dat_binary(gain_LUT, f"weight_t{t:.2f}.dat")
@@ -0,0 +1,135 @@
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from LUT import load_LUT_family
+from enhancer import Enhancer
+
+# 降採樣後 max-channel 影像的統計值
+FrameStats = namedtuple("FrameStats", ["mean", "p10", "p50", "p90"])
+
+# 抓圖檔名為 {camera_id}_{timestamp}.jpg，例如 tnn_00004_20250701_031500.jpg；
+# 封存檔中的影像為 {camera_id}_{date}.jpgs#序號，例如 tnn_00004_20250701.jpgs#12
+_CAMERA_ID_RE = re.compile(r"^([a-z]{3}_\d+)_\d{8}(?:_\d{6}|\.jpgs#)")
+
+
+def camera_id_from_path(path):
+    m = _CAMERA_ID_RE.match(os.path.basename(path))
+    return m.group(1) if m else None
+
+
+def frame_stats(frame, step=8):
+    """在每 step 個像素取一點的 max-channel 影像上算平均與百分位數（1080p 只看約 3 萬點）"""
+    small = frame[::step, ::step].max(axis=2)
+    hist = np.bincount(small.ravel(), minlength=256)
+    cdf = np.cumsum(hist)
+    total = cdf[-1]
+    p10, p50, p90 = (int(np.searchsorted(cdf, q * total)) for q in (0.1, 0.5, 0.9))
+    mean = float(np.dot(hist, np.arange(256)) / total)
+    return FrameStats(mean, p10, p50, p90)
+
+
+class _CameraState:
+    __slots__ = ("level", "index", "pending", "pending_count", "skipping")
+
+    def __init__(self):
+        self.level = None
+        self.index = None
+        self.pending = None
+        self.pending_count = 0
+        self.skipping = False
+
+
+class BrightnessSelector:
+    """依畫面亮度從 LUT family 挑 t，並對每支攝影機做時間上的平滑與遲滯
+
+    亮度 level 取降採樣 max-channel 的平均與中位數的平均，再以 EMA 平滑：
+    - level >= skip_on 進入略過模式（畫面夠亮，不做增強），level < skip_off 才離開
+    - 其餘依 level 在 [dark, bright] 間線性對應到 t（越暗 t 越大）
+    - 新的 t 要連續 hold 張都一樣才切換，避免來回跳動
+    """
+
+    def __init__(self, ts, dark=30.0, bright=120.0, skip_on=140.0, skip_off=125.0, alpha=0.3, hold=3, step=8):
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.dark = dark
+        self.bright = bright
+        self.skip_on = skip_on
+        self.skip_off = skip_off
+        self.alpha = alpha
+        self.hold = hold
+        self.step = step
+        self._states = {}
+
+    def state(self, camera_id=None):
+        st = self._states.get(camera_id)
+        if st is None:
+            st = self._states[camera_id] = _CameraState()
+        return st
+
+    def target_index(self, level):
+        # 越暗 → t 越大；t 最大值就是 family 裡最亮的那組
+        frac = np.clip((self.bright - level) / (self.bright - self.dark), 0.0, 1.0)
+        return int(np.abs(self.ts - frac * self.ts.max()).argmin())
+
+    def select(self, frame, camera_id=None):
+        """回傳要用的 LUT 編號，None 表示略過增強"""
+        stats = frame_stats(frame, self.step)
+        level = 0.5 * (stats.mean + stats.p50)
+        st = self.state(camera_id)
+        st.level = level if st.level is None else st.level + self.alpha * (level - st.level)
+
+        if st.skipping:
+            st.skipping = st.level >= self.skip_off
+        else:
+            st.skipping = st.level >= self.skip_on
+        if st.skipping:
+            # 離開略過模式時直接採用當下的目標 t
+            st.index, st.pending, st.pending_count = None, None, 0
+            return None
+
+        target = self.target_index(st.level)
+        if st.index is None:
+            st.index = target
+        elif target != st.index:
+            if target == st.pending:
+                st.pending_count += 1
+            else:
+                st.pending, st.pending_count = target, 1
+            if st.pending_count >= self.hold:
+                st.index, st.pending, st.pending_count = target, None, 0
+        else:
+            st.pending, st.pending_count = None, 0
+        return st.index
+
+
+class AdaptiveEnhancer:
+    """依每張畫面（或每支攝影機）的亮度自動從 LUT family 挑 t 的 Enhancer
+
+    太亮的畫面直接回傳原圖，不做任何計算；last_t 記錄最後一次用的 t（略過為 None）。
+    """
+
+    def __init__(self, family, selector=None, **enhancer_kwargs):
+        if isinstance(family, str):
+            family = load_LUT_family(family)
+        self.family = family
+        self.selector = selector or BrightnessSelector(family.ts)
+        self.enhancer = Enhancer(family.table[0], **enhancer_kwargs)
+        self._lut_index = 0
+        self.last_t = None
+        self.skipped = 0
+        self.enhanced = 0
+
+    def enhance(self, frame: np.ndarray, camera_id=None) -> np.ndarray:
+        index = self.selector.select(frame, camera_id)
+        if index is None:
+            self.last_t = None
+            self.skipped += 1
+            return frame
+        if index != self._lut_index:
+            self.enhancer.set_lut(self.family.table[index])
+            self._lut_index = index
+        self.last_t = float(self.family.ts[index])
+        self.enhanced += 1
+        return self.enhancer.enhance(frame)
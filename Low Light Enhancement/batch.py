@@ -0,0 +1,264 @@
+import os
+import sys
+import glob
+import time
+import zlib
+import queue
+import threading
+import multiprocessing as mp
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from LUT import LUTFamily
+from enhancer import Enhancer, FIXED_KERNEL_1D, TH_X, TH_Y
+from adaptive import AdaptiveEnhancer, camera_id_from_path
+
+# 擷取端的影像封存檔格式（CCTV_capture/frame_archive.py），兩邊共用同一份程式
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CCTV_capture"))
+from frame_archive import ARCHIVE_EXT, ArchiveReader, ArchiveWriter, index_path_for
+
+# 一張圖的處理結果（依完成順序回傳）
+BatchResult = namedtuple("BatchResult", ["src", "dst", "ok", "error", "seconds", "worker"])
+
+_WORKER_DONE = "__done__"
+
+# 輸出到封存檔時重新編碼 JPEG 的品質
+ARCHIVE_JPEG_QUALITY = 95
+
+
+def iter_dataset_jobs(datasets):
+    """展開 datasets 的 (input 資料夾, output 資料夾, 副檔名) → (輸入檔, 輸出檔)"""
+    for input_folder, output_folder, pattern in datasets:
+        os.makedirs(output_folder, exist_ok=True)
+        for filepath in sorted(glob.glob(os.path.join(input_folder, pattern))):
+            yield filepath, os.path.join(output_folder, os.path.basename(filepath))
+
+
+def worker_for(path, workers):
+    """同一台攝影機的輸入固定交給同一個 worker（camera_id 的 crc32）；認不出 camera_id 時依檔名分配"""
+    key = camera_id_from_path(path) or os.path.basename(path)
+    return zlib.crc32(key.encode("utf-8")) % workers
+
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_EXT)
+
+
+def iter_images(src):
+    """讀入一個輸入檔，yield (名稱, 時間戳, 影像)
+
+    一般圖檔只有一張（時間戳為 None）；封存檔依寫入順序 yield 每一張，名稱為 <封存檔>#<序號>。
+    讀不到的影像為 None。
+    """
+    if not is_archive(src):
+        yield src, None, cv2.imread(src, cv2.IMREAD_COLOR)
+        return
+    with ArchiveReader(src) as reader:
+        for i in range(len(reader)):
+            img = cv2.imdecode(np.frombuffer(reader.frame(i), np.uint8), cv2.IMREAD_COLOR)
+            yield f"{src}#{i}", float(reader.timestamps[i]), img
+
+
+def enhance_image(enhancer, img, name, rois=None, roi_output="full"):
+    """增強一張影像；rois（{camera_id: CameraROI}）有這台攝影機時只增強 ROI 的外接矩形
+
+    roi_output="full" 輸出原尺寸，ROI 外保留原圖（直接寫回 img）；"crop" 只輸出外接矩形，ROI 外為黑色。
+    回傳值可能是 img 本身、img 的 view 或 enhancer 的內部緩衝區。
+    """
+    camera_id = camera_id_from_path(name)
+    roi = rois.get(camera_id) if rois else None
+    geo = roi.geometry(img.shape) if roi is not None else None
+    src = geo.crop(img) if geo is not None else img
+    if isinstance(enhancer, AdaptiveEnhancer):
+        out = enhancer.enhance(src, camera_id)
+    else:
+        out = enhancer.enhance(src)
+    if geo is None:
+        return out
+    if roi_output == "crop":
+        return geo.masked(out)
+    return img if out is src else geo.paste(img, out)
+
+
+class ImageWriter:
+    """寫出增強結果：一般路徑用 imwrite；輸出路徑是封存檔時編碼成 JPEG 追加到該封存檔
+
+    同一個輸出封存檔只會由同一個 ImageWriter 寫（輸入封存檔整個交給同一個 worker），
+    第一次寫入時清掉舊的內容，重跑時與覆寫圖檔的行為一致。
+    同一時間只開著一個輸出封存檔：換到下一個封存檔時關掉前一個，處理上千個封存檔也不會開太多檔案。
+    """
+
+    def __init__(self, quality=ARCHIVE_JPEG_QUALITY):
+        self.quality = quality
+        self.started = set()    # 已經清掉舊內容的輸出封存檔
+        self.path = None
+        self.archive = None
+
+    def write(self, dst, ts, img):
+        if not is_archive(dst):
+            return cv2.imwrite(dst, img)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        if dst != self.path:
+            self.close()
+            if dst not in self.started:
+                for path in (dst, index_path_for(dst)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.started.add(dst)
+            self.archive = ArchiveWriter(dst)
+            self.path = dst
+        self.archive.append(buf.tobytes(), ts)
+        return True
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+        self.path = self.archive = None
+
+
+def _reader(task_q, read_q, result_q, worker_id):
+    # 讀圖執行緒：imread / imdecode 會釋放 GIL，可與主執行緒的增強重疊
+    # 封存檔整個由這個 worker 依序讀完，同一台攝影機的畫面會照時間順序進入增強
+    # 一個壞掉的輸入（讀不到、封存檔損毀）只回報這個輸入失敗；結束時一定送出 None，增強迴圈才不會卡住
+    try:
+        while True:
+            job = task_q.get()
+            if job is None:
+                return
+            src, dst = job
+            t0 = time.perf_counter()
+            try:
+                for name, ts, img in iter_images(src):
+                    read_q.put((name, dst, ts, t0, img))
+                    t0 = time.perf_counter()
+            except (OSError, ValueError) as e:
+                result_q.put(BatchResult(src, dst, False, f"讀取失敗：{e}", time.perf_counter() - t0, worker_id))
+    finally:
+        read_q.put(None)
+
+
+def _writer(write_q, result_q, worker_id):
+    # 寫圖執行緒：寫入完成才回報結果
+    out = ImageWriter()
+    try:
+        while True:
+            item = write_q.get()
+            if item is None:
+                return
+            src, dst, ts, t0, img = item
+            try:
+                ok = out.write(dst, ts, img)
+                error = None if ok else "寫入失敗"
+            except (cv2.error, OSError) as e:
+                ok, error = False, str(e)
+            result_q.put(BatchResult(src, dst, ok, error, time.perf_counter() - t0, worker_id))
+    finally:
+        out.close()
+
+
+def _worker_main(worker_id, lut, th_y, th_x, kernel, scale, rois, roi_output, task_q, result_q, prefetch):
+    if isinstance(lut, LUTFamily):
+        enhancer = AdaptiveEnhancer(lut, th_y=th_y, th_x=th_x, kernel=kernel, scale=scale)
+    else:
+        enhancer = Enhancer(lut, th_y=th_y, th_x=th_x, kernel=kernel, scale=scale)
+    read_q = queue.Queue(maxsize=prefetch)
+    write_q = queue.Queue(maxsize=prefetch)
+    reader = threading.Thread(target=_reader, args=(task_q, read_q, result_q, worker_id), daemon=True)
+    writer = threading.Thread(target=_writer, args=(write_q, result_q, worker_id), daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            item = read_q.get()
+            if item is None:
+                break
+            src, dst, ts, t0, img = item
+            if img is None:
+                result_q.put(BatchResult(src, dst, False, "無法讀取", time.perf_counter() - t0, worker_id))
+                continue
+            try:
+                out = enhance_image(enhancer, img, src, rois, roi_output)
+                # enhance 回傳內部緩衝區，交給寫圖執行緒前要先複製（略過增強時就是原圖，不必複製）
+                write_q.put((src, dst, ts, t0, out if out is img else out.copy()))
+            except ValueError as e:
+                result_q.put(BatchResult(src, dst, False, str(e), time.perf_counter() - t0, worker_id))
+    finally:
+        write_q.put(None)
+        writer.join()
+        result_q.put(_WORKER_DONE)
+
+
+def run_batch(datasets, lut, workers=None, prefetch=4, th_y=TH_Y, th_x=TH_X, kernel=FIXED_KERNEL_1D, scale=1.0,
+              rois=None, roi_output="full"):
+    """把 datasets 的圖分散給多個 process 增強，依完成順序 yield BatchResult
+
+    lut 為單一 LUT；給 LUTFamily 時每個 worker 改用 AdaptiveEnhancer 依亮度自動挑 t。
+    rois 為 {camera_id: CameraROI}，有 ROI 的攝影機只增強 ROI（見 enhance_image）。
+    副檔名為 .jpgs 的輸入是擷取端的封存檔，整個封存檔交給同一個 worker，輸出也寫成封存檔。
+
+    單一 LUT 時所有 worker 共用一個大小為 workers * prefetch 的佇列，誰有空誰接下一個檔案。
+    給 LUTFamily 時同一台攝影機的輸入一律交給同一個 worker（見 worker_for），依檔名順序進入增強：
+    AdaptiveEnhancer 每台攝影機的亮度狀態只存在一個 process 裡，畫面不會被拆到不同 worker 而打亂順序；
+    此時主程序給每個 worker 一個大小為 prefetch 的佇列。
+    每個 worker 內有讀圖 / 增強 / 寫圖三段，以大小為 prefetch 的佇列串接，不會一次把整個資料夾塞進記憶體。
+    """
+    workers = workers or os.cpu_count() or 1
+    ctx = mp.get_context()
+    pinned = isinstance(lut, LUTFamily)
+    if pinned:
+        task_qs = [ctx.Queue(maxsize=prefetch) for _ in range(workers)]
+    else:
+        task_qs = [ctx.Queue(maxsize=workers * prefetch)] * workers
+    result_q = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker_main, args=(i, lut, th_y, th_x, kernel, scale, rois, roi_output, task_q, result_q, prefetch), daemon=True)
+        for i, task_q in enumerate(task_qs)
+    ]
+    for p in procs:
+        p.start()
+
+    def _feed():
+        for job in iter_dataset_jobs(datasets):
+            task_qs[worker_for(job[0], workers) if pinned else 0].put(job)
+        for task_q in task_qs:
+            task_q.put(None)
+
+    feeder = threading.Thread(target=_feed, daemon=True)
+    feeder.start()
+    try:
+        running = len(procs)
+        while running:
+            result = result_q.get()
+            if result == _WORKER_DONE:
+                running -= 1
+                continue
+            yield result
+    finally:
+        for p in procs:
+            if p.is_alive() and running:
+                p.terminate()
+            p.join()
+
+
+def report_batch(results, report_every=50):
+    """消化 run_batch 的結果並列印進度與 images/sec，回傳 (成功數, 失敗數, 秒數)"""
+    start = time.perf_counter()
+    done = failed = 0
+    for r in results:
+        if r.ok:
+            done += 1
+        else:
+            failed += 1
+            print(f"❌ {r.src}: {r.error}")
+        total = done + failed
+        if total % report_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"   ⏳ 已處理 {total} 張，{total / elapsed:.2f} images/sec")
+    elapsed = time.perf_counter() - start
+    rate = (done + failed) / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 完成 {done} 張，失敗 {failed} 張，耗時 {elapsed:.1f} 秒（{rate:.2f} images/sec）")
+    return done, failed, elapsed
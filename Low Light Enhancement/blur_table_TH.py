@@ -1,22 +1,25 @@
-import cv2
 import numpy as np
 import os
+import sys
 import glob
 import shutil
+import argparse
 
-def load_binary_lut(filepath):
-    with open(filepath, 'r') as f:
-        lines = f.readlines()
-    lut = [int(line.strip(), 2) for line in lines if line.strip()]
-    return np.array(lut, dtype=np.uint16)  # Q8.10 格式，2040 個項
+from LUT import load_binary_lut, load_LUT_family, save_LUT_to_dat_binary
+from enhancer import Enhancer
+from batch import run_batch, report_batch, iter_images, enhance_image, ImageWriter
+from adaptive import AdaptiveEnhancer
+
+# 攝影機 ROI 設定與擷取端共用（CCTV_capture/roi.py）；自己加路徑，不依賴 batch 匯入時的副作用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CCTV_capture"))
+from roi import ROIS_PATH, load_rois
 
 #----- 如果要換更亮或更暗，用LUT.py生其他的 weight.dat -----#
-# 載入單一 gain LUT
-gain_LUT = load_binary_lut("weight.dat")
+# 單一 gain LUT
+LUT_PATH = "weight.dat"
 
 # 固定 1D kernel（大小 = 7）
 fixed_kernel_1d = np.array([1, 3, 7, 10, 7, 3, 1], dtype=np.float32)
-pad = fixed_kernel_1d.size // 2
 
 # 閾值
 TH_Y = 32     # 垂直方向 threshold
@@ -30,6 +33,7 @@ datasets = [
     # ("DICM",              "my_alg_img/DICM", "*.JPG"),
     # ("LIME",              "my_alg_img/LIME", "*.bmp"),
     # ("flood",              "my_alg_img/flood", "*.JPG"),
+    # ("D:/Taiwan_CCTV/downloaded_images", "my_alg_img/cctv", "*/*.jpgs"),   # 擷取端的封存檔
     ("normal",              "my_alg_img/normal_high", "*.JPG"),
 ]
 #---------------- 改這裡就好 ------------------#
@@ -38,70 +42,79 @@ datasets = [
 #     ("DEMO_IMG/123", "my_alg_img", "*.jpg")
 # ]
 
-for input_folder, output_folder, pattern in datasets:
-    os.makedirs(output_folder, exist_ok=True)
-    for filepath in glob.glob(os.path.join(input_folder, pattern)):
-        # 讀圖
-        img = cv2.imread(filepath, cv2.IMREAD_COLOR).astype(np.float32)
-        if img is None:
-            print("無法讀取:", filepath)
-            continue
-
-        H, W, _ = img.shape
-        # Step 1: 轉到Y Channel
-        # weights = np.array([306, 601, 117], dtype=np.float32)
-        # Gi = np.tensordot(img, weights, axes=([2], [0])) / 1024  # shape: (H, W)
-        # Step 1: 計算 RGB 的最大值 → Gi 單通道
-        Gi = np.max(img, axis=2).astype(np.float32)
-        # Step 2: 垂直方向 7×1 卷積前，對 window 中差異過大的像素先替換
-        Gi_pad = cv2.copyMakeBorder(Gi, pad, pad, 0, 0, borderType=cv2.BORDER_REFLECT_101)
-        blur_y = np.zeros_like(Gi)
-        for x in range(H):
-            window = Gi_pad[x:x+2*pad+1, :]     # (7, W)
-            center = Gi[x, :][None, :]          # (1, W)
-            center_mat = np.tile(center, (7, 1))# (7, W)
-            w = window.copy()
-            diff = np.abs(w - center_mat)
-            # 替換超過 TH_Y 的值
-            w[diff >= TH_Y] = center_mat[diff >= TH_Y]
-            # 加權求和
-            blur_y[x, :] = (w * fixed_kernel_1d[:, None]).sum(axis=0)
-
-        # Step 3: 水平方向 1×7 卷積前，對 window 中差異過大的像素先替換
-        blur_pad = cv2.copyMakeBorder(blur_y, 0, 0, pad, pad, borderType=cv2.BORDER_REFLECT_101)
-        blur_final = np.zeros_like(blur_y)
-        for y in range(W):
-            window = blur_pad[:, y:y+2*pad+1]   # (H, 7)
-            center = blur_y[:, y][:, None]      # (H, 1)
-            center_mat = np.tile(center, (1, 7))# (H, 7)
-            w = window.copy()
-            diff = np.abs(w - center_mat)
-            # 替換超過 TH_X 的值
-            w[diff >= TH_X] = center_mat[diff >= TH_X]
-            # 加權求和
-            blur_final[:, y] = (w * fixed_kernel_1d[None, :]).sum(axis=1)
+def enhance_datasets(enhancer, datasets, rois=None, roi_output="full"):
+    writer = ImageWriter()
+    try:
+        for input_folder, output_folder, pattern in datasets:
+            os.makedirs(output_folder, exist_ok=True)
+            for filepath in sorted(glob.glob(os.path.join(input_folder, pattern))):
+                # 封存檔（.jpgs）輸出也是封存檔，一般圖檔輸出同名圖檔
+                out_path = os.path.join(output_folder, os.path.basename(filepath))
+                # 讀圖
+                for name, ts, img in iter_images(filepath):
+                    if img is None:
+                        print("無法讀取:", name)
+                        continue
 
-        # Step 4: Normalization & 防除以零
-        blur_norm = blur_final / 128.0
-        safe_blur = np.maximum(blur_norm, 1.0)
+                    # 有 ROI 的攝影機（依檔名的 camera_id）只增強 ROI
+                    img_enhance = enhance_image(enhancer, img, name, rois, roi_output)
 
-        # Step 5: 四捨五入取整、Clip 到 [1,2040] → LUT index
-        safe_int = np.floor(safe_blur).astype(np.int32)
-        safe_int = np.clip(safe_int, 1, 2040)
+                    # 儲存
+                    writer.write(out_path, ts, img_enhance)
+                    # print(f"✅ 處理完成: {name} → {out_path}")
+    finally:
+        writer.close()
 
-        # Step 6: 查表 (Q8.10 → float)
-        gain_map = gain_LUT[safe_int - 1].astype(np.float32) / (1 << 10)
+def main():
+    parser = argparse.ArgumentParser(description="低光增強（批次處理資料夾）")
+    parser.add_argument("--lut", default=LUT_PATH, help="gain LUT 路徑（.dat，或 LUT.py --family 產生的 .npy）")
+    parser.add_argument("--t", type=float, default=1.0, help="--lut 為 .npy LUT family 時使用的亮度 t")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="依每張畫面亮度自動挑 t（--lut 需為 .npy LUT family），太亮的畫面不增強")
+    parser.add_argument("--dataset", nargs=3, action="append", metavar=("INPUT", "OUTPUT", "PATTERN"),
+                        help="覆寫 datasets，可重複指定")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="模糊與 gain map 的工作解析度比例（例如 0.5），輸出仍為原尺寸；用 scale_report.py 挑選")
+    parser.add_argument("--roi", nargs="?", const=os.path.join("..", "CCTV_capture", ROIS_PATH),
+                        help="只增強各攝影機的 ROI（CCTV_capture/camera_rois.json，依檔名的 camera_id 對應）")
+    parser.add_argument("--roi-output", choices=["full", "crop"], default="full",
+                        help="full: 原尺寸、ROI 外保留原圖；crop: 只輸出 ROI 的外接矩形")
+    parser.add_argument("--workers", type=int, default=0, help="平行處理的 process 數，0 為單一 process 依序處理")
+    parser.add_argument("--prefetch", type=int, default=4, help="每個 worker 讀圖 / 寫圖佇列的長度")
+    args = parser.parse_args()
 
-        # Step 7: 套用增益
-        gain_map_3c = np.repeat(gain_map[:, :, None], 3, axis=2)
-        img_enhance = np.clip(img * gain_map_3c, 0, 255).astype(np.uint8)
+    if args.adaptive and not args.lut.endswith(".npy"):
+        parser.error("--adaptive 需要 .npy LUT family（用 LUT.py --family 產生）")
+    if args.lut.endswith(".npy"):
+        family = load_LUT_family(args.lut)
+        gain_LUT = np.array(family.lut(args.t))
+    else:
+        gain_LUT = load_binary_lut(args.lut)
+    rois = load_rois(args.roi) if args.roi else None
+    if args.roi:
+        print(f"   ROI：{len(rois)} 台攝影機（{args.roi}）")
+    if args.workers > 0:
+        results = run_batch(args.dataset or datasets, family if args.adaptive else gain_LUT,
+                            workers=args.workers, prefetch=args.prefetch,
+                            th_y=TH_Y, th_x=TH_X, kernel=fixed_kernel_1d, scale=args.scale,
+                            rois=rois, roi_output=args.roi_output)
+        report_batch(results)
+    else:
+        if args.adaptive:
+            enhancer = AdaptiveEnhancer(family, th_y=TH_Y, th_x=TH_X, kernel=fixed_kernel_1d, scale=args.scale)
+        else:
+            enhancer = Enhancer(gain_LUT, th_y=TH_Y, th_x=TH_X, kernel=fixed_kernel_1d, scale=args.scale)
+        enhance_datasets(enhancer, args.dataset or datasets, rois, args.roi_output)
+        if args.adaptive:
+            print(f"   亮度自適應：增強 {enhancer.enhanced} 張，略過 {enhancer.skipped} 張")
 
-        # Step 8: 儲存
-        out_path = os.path.join(output_folder, os.path.basename(filepath))
-        cv2.imwrite(out_path, img_enhance)
-        # print(f"✅ 處理完成: {filepath} → {out_path}")
+    # 複製 LUT 檔案到 my_alg_img（LUT family 則輸出 --t 對應的那一組）
+    os.makedirs("my_alg_img", exist_ok=True)
+    if args.lut.endswith(".npy"):
+        save_LUT_to_dat_binary(gain_LUT, "my_alg_img/weight.dat")
+    else:
+        shutil.copy(args.lut, "my_alg_img/weight.dat")
+    print(f"✅ 已將 {args.lut} 的 LUT 存到 my_alg_img/weight.dat")
 
-# 複製 LUT 檔案到 my_alg_img
-os.makedirs("my_alg_img", exist_ok=True)
-shutil.copy("weight.dat", "my_alg_img/weight.dat")
-print("✅ 已將 weight.dat 複製到 my_alg_img/")
+if __name__ == "__main__":
+    main()
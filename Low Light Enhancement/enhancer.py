@@ -0,0 +1,306 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from LUT import load_binary_lut, load_LUT_family
+
+# 固定 1D kernel（大小 = 7）
+FIXED_KERNEL_1D = np.array([1, 3, 7, 10, 7, 3, 1], dtype=np.float32)
+
+# 閾值
+TH_Y = 32     # 垂直方向 threshold
+TH_X = 1024   # 水平方向 threshold
+
+LUT_SIZE = 2040     # LUT index 範圍 [1, 2040]
+FRAC_BITS = 10      # Q8.10
+BLUR_SHIFT = 7      # blur / 128 → LUT index
+
+# 逐條處理的列數：暫存區只需 STRIP_ROWS × W，留在 cache 內
+STRIP_ROWS = 64
+
+# 暫存區依影像尺寸保留，最多保留幾種尺寸（各攝影機 ROI 的外接矩形大小都不同）
+MAX_BUFFER_SHAPES = 8
+
+# 記憶體目標：enhance 的峰值配置量（含暫存區、不含輸入影像）每像素不超過 20 bytes。
+# 實測 1080p 約 30 MB（每像素 15 bytes）；舊版 float32 流程約 143 MB（每像素 72 bytes）
+PEAK_BYTES_PER_PIXEL = 20
+
+
+def _clamped_taps(src_pad, center, kernel, th, axis, out, diff, mask, tap):
+    # 對一條（或整張）影像做 clamped 加權和：
+    # 第 k 個 tap 是 src_pad 的位移 view，與中心差異 >= th 的像素以中心值取代
+    h, w = center.shape
+    for k in range(kernel.size):
+        shifted = src_pad[k:k+h, :] if axis == 0 else src_pad[:, k:k+w]
+        np.subtract(shifted, center, out=diff)
+        np.abs(diff, out=diff)
+        np.greater_equal(diff, th, out=mask)
+        np.copyto(tap, shifted)
+        np.copyto(tap, center, where=mask)
+        # 依 tap 順序累加，與原本 sum 的累加順序一致
+        if k == 0:
+            np.multiply(tap, kernel[k], out=out)
+        else:
+            np.multiply(tap, kernel[k], out=tap)
+            np.add(out, tap, out=out)
+    return out
+
+
+# 一維 clamped 卷積（整張圖一次處理，不再逐行 / 逐列跑 Python 迴圈）
+# axis=0 為垂直 7×1、axis=1 為水平 1×7；window 中與中心差異 >= th 的像素以中心值取代後再加權求和
+def clamped_blur_1d(src, kernel, th, axis, out=None):
+    pad = kernel.size // 2
+    H, W = src.shape
+    if axis == 0:
+        src_pad = cv2.copyMakeBorder(src, pad, pad, 0, 0, borderType=cv2.BORDER_REFLECT_101)
+    else:
+        src_pad = cv2.copyMakeBorder(src, 0, 0, pad, pad, borderType=cv2.BORDER_REFLECT_101)
+    if out is None:
+        out = np.empty((H, W), np.float32)
+    diff, tap = np.empty((2, H, W), np.float32)
+    mask = np.empty((H, W), np.bool_)
+    return _clamped_taps(src_pad, src, kernel, th, axis, out, diff, mask, tap)
+
+
+def _reflect_101(buf, pad, axis):
+    # buf 中央已填好原圖，就地補上 BORDER_REFLECT_101 邊界（與 cv2.copyMakeBorder 相同）
+    n = buf.shape[axis] - 2 * pad
+    if n > pad:
+        for i in range(1, pad + 1):
+            if axis == 0:
+                buf[pad - i] = buf[pad + i]
+                buf[pad + n - 1 + i] = buf[pad + n - 1 - i]
+            else:
+                buf[:, pad - i] = buf[:, pad + i]
+                buf[:, pad + n - 1 + i] = buf[:, pad + n - 1 - i]
+    else:
+        # 影像比 kernel 還小，需要多次反射，交給 OpenCV
+        if axis == 0:
+            src = buf[pad:pad + n].copy()
+            cv2.copyMakeBorder(src, pad, pad, 0, 0, borderType=cv2.BORDER_REFLECT_101, dst=buf)
+        else:
+            src = buf[:, pad:pad + n].copy()
+            cv2.copyMakeBorder(src, 0, 0, pad, pad, borderType=cv2.BORDER_REFLECT_101, dst=buf)
+
+
+class _FrameBuffers:
+    """單一解析度用到的所有暫存區，配置一次後重複使用"""
+
+    def __init__(self, H, W, pad, strip=STRIP_ROWS):
+        self.shape = (H, W)
+        s = min(strip, H)
+        self.strip = s
+        # 整張的緩衝：垂直 / 水平 padding（中央即 Gi / blur_y）、gain map、輸出
+        self.pad_y = np.empty((H + 2 * pad, W), np.float32)
+        self.pad_x = np.empty((H, W + 2 * pad), np.float32)
+        self.gain = np.empty((H, W), np.uint16)
+        self.out = np.empty((H, W, 3), np.uint8)
+        # 逐條處理用的小暫存
+        self.blur = np.empty((s, W), np.float32)
+        self.diff = np.empty((s, W), np.float32)
+        self.mask = np.empty((s, W), np.bool_)
+        self.tap = np.empty((s, W), np.float32)
+        self.idx = np.empty((s, W), np.intp)
+        self.prod = np.empty((s, W, 3), np.uint32)
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+
+class _ScaledBuffers:
+    """縮小工作解析度時全解析度端的暫存區：RGB 最大值、縮小後的 Gi、放大回來的 gain map、輸出
+
+    模糊與查表用的暫存區是縮小尺寸的 _FrameBuffers。
+    """
+
+    def __init__(self, H, W, h, w, strip=STRIP_ROWS):
+        self.shape = (H, W)
+        self.small_shape = (h, w)
+        self.strip = min(strip, H)
+        self.gi = np.empty((H, W), np.uint8)
+        self.gi_small = np.empty((h, w), np.uint8)
+        self.gain = np.empty((H, W), np.uint16)
+        self.out = np.empty((H, W, 3), np.uint8)
+        self.prod = np.empty((self.strip, W, 3), np.uint32)
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+
+class Enhancer:
+    """低光增強：RGB 最大值 → clamped 7-tap 模糊 → 查 gain LUT → 套用增益
+
+    lut 為 Q8.10 的 uint16 LUT（2040 項，見 LUT.py）。每種解析度的暫存區只配置一次，
+    同尺寸的連續影格不會再配置記憶體。
+
+    scale < 1 時模糊與查表在縮小的 Gi 上做（gain map 只是低頻的亮度估計），
+    gain map 以雙線性放大回原尺寸後套用到全解析度影像；畫質與速度的取捨用 scale_report.py 量測。
+    """
+
+    def __init__(self, lut, th_y=TH_Y, th_x=TH_X, kernel=FIXED_KERNEL_1D, scale=1.0):
+        if not 0 < scale <= 1:
+            raise ValueError(f"scale 需在 (0, 1] 之間，收到 {scale}")
+        self.th_y = th_y
+        self.th_x = th_x
+        self.scale = scale
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.pad = self.kernel.size // 2
+        self._gain_by_index = np.empty(LUT_SIZE + 1, np.uint16)
+        self.set_lut(lut)
+        self._buffers = {}
+        self._scaled = {}
+
+    @classmethod
+    def from_file(cls, lut_path, **kwargs):
+        return cls(load_binary_lut(lut_path), **kwargs)
+
+    @classmethod
+    def from_family(cls, family, t=1.0, **kwargs):
+        """由 LUTFamily（或 .npy 路徑）建立，初始亮度為最接近 t 的 LUT"""
+        if isinstance(family, str):
+            family = load_LUT_family(family)
+        return cls(family.lut(t), **kwargs)
+
+    def set_lut(self, lut):
+        """換一組 gain LUT（例如同一個 LUTFamily 的另一個 t），不需重新配置暫存區"""
+        lut = np.asarray(lut, dtype=np.uint16)
+        if lut.shape != (LUT_SIZE,):
+            raise ValueError(f"LUT 應為 {LUT_SIZE} 項，收到 {lut.shape}")
+        self.lut = lut
+        # blur >> 7 直接當 index：0 與 1 都對應 LUT 第 1 項（原本的 max(blur/128, 1)），
+        # 超過 2040 由 np.take(mode="clip") 夾到最後一項
+        self._gain_by_index[0] = lut[0]
+        self._gain_by_index[1:] = lut
+
+    @staticmethod
+    def _cached(cache, key, create):
+        # 最近用過的尺寸移到最後，超過 MAX_BUFFER_SHAPES 種時丟掉最久沒用的
+        bufs = cache.pop(key, None)
+        if bufs is None:
+            bufs = create()
+            while len(cache) >= MAX_BUFFER_SHAPES:
+                cache.pop(next(iter(cache)))
+        cache[key] = bufs
+        return bufs
+
+    def _get_buffers(self, H, W):
+        return self._cached(self._buffers, (H, W), lambda: _FrameBuffers(H, W, self.pad))
+
+    def _get_scaled_buffers(self, H, W):
+        h, w = max(1, round(H * self.scale)), max(1, round(W * self.scale))
+        return self._cached(self._scaled, (H, W), lambda: _ScaledBuffers(H, W, h, w))
+
+    def _gain_map(self, frame, b):
+        # Step 1–6：算出 Q8.10 gain map 寫進 b.gain
+        H = b.shape[0]
+        p = self.pad
+
+        # Step 1: 計算 RGB 的最大值 → Gi，直接寫進垂直 padding 的中央
+        np.max(frame, axis=2, out=b.pad_y[p:p + H])
+        return self._blur_gain(b)
+
+    def _scaled_gain_map(self, frame, sb):
+        # Step 1 在全解析度算 Gi 後以面積平均縮小，Step 2–6 在縮小尺寸做，gain map 再放大回原尺寸
+        H, W = sb.shape
+        h, w = sb.small_shape
+        p = self.pad
+        b = self._get_buffers(h, w)
+        # 逐通道 np.maximum 比 np.max(axis=2) 快一個數量級，全解析度這一步才不會蓋過縮小省下的時間
+        np.maximum(frame[..., 0], frame[..., 1], out=sb.gi)
+        np.maximum(sb.gi, frame[..., 2], out=sb.gi)
+        cv2.resize(sb.gi, (w, h), dst=sb.gi_small, interpolation=cv2.INTER_AREA)
+        np.copyto(b.pad_y[p:p + h], sb.gi_small)
+        gain = self._blur_gain(b)
+        cv2.resize(gain, (W, H), dst=sb.gain, interpolation=cv2.INTER_LINEAR)
+        return sb.gain
+
+    def _blur_gain(self, b):
+        # Step 2–6：b.pad_y 中央已是 Gi
+        H, W = b.shape
+        p, s = self.pad, b.strip
+        _reflect_101(b.pad_y, p, 0)
+
+        # Step 2: 垂直方向 7×1 clamped 卷積，結果寫進水平 padding 的中央
+        for r0 in range(0, H, s):
+            r1 = min(r0 + s, H)
+            n = r1 - r0
+            _clamped_taps(b.pad_y[r0:r1 + 2 * p], b.pad_y[p + r0:p + r1], self.kernel, self.th_y, 0,
+                          b.pad_x[r0:r1, p:p + W], b.diff[:n], b.mask[:n], b.tap[:n])
+        _reflect_101(b.pad_x, p, 1)
+
+        # Step 3–6: 水平方向 1×7 clamped 卷積 → blur >> 7 → 查表，一條一條做
+        for r0 in range(0, H, s):
+            r1 = min(r0 + s, H)
+            n = r1 - r0
+            blur = _clamped_taps(b.pad_x[r0:r1], b.pad_x[r0:r1, p:p + W], self.kernel, self.th_x, 1,
+                                 b.blur[:n], b.diff[:n], b.mask[:n], b.tap[:n])
+            # blur 為非負整數值，截斷後右移 7 位即 floor(blur / 128)
+            idx = b.idx[:n]
+            np.copyto(idx, blur, casting="unsafe")
+            np.right_shift(idx, BLUR_SHIFT, out=idx)
+            np.take(self._gain_by_index, idx, out=b.gain[r0:r1], mode="clip")
+        return b.gain
+
+    def _apply_gain(self, frame, gain, b):
+        # Step 7: out = min((pixel * gain) >> 10, 255)，gain 以 broadcast 套到三個通道；
+        # pixel * gain < 2^24，結果與 float32 乘法後截斷完全相同
+        H = b.shape[0]
+        s = b.strip
+        for r0 in range(0, H, s):
+            r1 = min(r0 + s, H)
+            prod = b.prod[:r1 - r0]
+            np.multiply(frame[r0:r1], gain[r0:r1, :, None], out=prod, dtype=np.uint32)
+            np.right_shift(prod, FRAC_BITS, out=prod)
+            np.minimum(prod, 255, out=prod)
+            np.copyto(b.out[r0:r1], prod, casting="unsafe")
+        return b.out
+
+    def enhance(self, frame: np.ndarray) -> np.ndarray:
+        """增強一張 BGR uint8 影像 (H, W, 3)
+
+        回傳的是內部輸出緩衝區，下一次同尺寸的 enhance 會覆寫；要保留結果請自行 copy()。
+        """
+        if frame.ndim != 3 or frame.shape[2] != 3 or frame.dtype != np.uint8:
+            raise ValueError(f"需要 (H, W, 3) uint8 影像，收到 {frame.shape} {frame.dtype}")
+        H, W, _ = frame.shape
+        if self.scale < 1:
+            sb = self._get_scaled_buffers(H, W)
+            return self._apply_gain(frame, self._scaled_gain_map(frame, sb), sb)
+        b = self._get_buffers(H, W)
+        return self._apply_gain(frame, self._gain_map(frame, b), b)
+
+
+def measure_peak_memory(enhancer, shape, frames=3):
+    """以 tracemalloc 量測 enhance 的記憶體用量
+
+    回傳 (第一張的峰值 bytes（含配置暫存區）, 每像素 bytes, 之後每張的暫時配置峰值 bytes)。
+    """
+    H, W = shape[:2]
+    frame = np.random.default_rng(0).integers(0, 256, (H, W, 3), dtype=np.uint8)
+    enhancer._buffers.clear()
+    enhancer._scaled.clear()
+    tracemalloc.start()
+    try:
+        enhancer.enhance(frame)
+        peak = tracemalloc.get_traced_memory()[1]
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(frames - 1):
+            enhancer.enhance(frame)
+        steady = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return peak, peak / (H * W), steady
+
+
+if __name__ == "__main__":
+    # 量測各解析度的記憶體用量是否符合 PEAK_BYTES_PER_PIXEL
+    enhancer = Enhancer.from_file("weight.dat")
+    for shape in [(480, 640), (720, 1280), (1080, 1920), (2160, 3840)]:
+        peak, per_pixel, steady = measure_peak_memory(enhancer, shape)
+        status = "✅" if per_pixel <= PEAK_BYTES_PER_PIXEL else "❌"
+        print(f"{status} {shape[1]}x{shape[0]}: 峰值 {peak / 2**20:.1f} MB（每像素 {per_pixel:.1f} bytes），"
+              f"之後每張暫時配置 {steady / 1024:.0f} KB")
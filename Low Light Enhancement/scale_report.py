@@ -0,0 +1,143 @@
+import os
+import glob
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from LUT import load_binary_lut, load_LUT_family
+from enhancer import Enhancer, FIXED_KERNEL_1D, TH_X, TH_Y
+from batch import iter_images
+
+# 比較不同工作解析度（Enhancer 的 scale）的畫質與速度：以 scale=1 的輸出為基準算 PSNR / SSIM
+#   python scale_report.py "flood/*.JPG" --scales 1 0.75 0.5 0.25
+#   python scale_report.py "D:/Taiwan_CCTV/downloaded_images/*/*.jpgs" --lut weight.dat --json scale_report.json
+
+SCALES = [1.0, 0.75, 0.5, 0.33, 0.25]
+MIN_SSIM = 0.98     # 建議 scale：SSIM 最低值不低於這個值的最小 scale
+
+# SSIM 的常數（Wang et al. 2004，8-bit 影像）
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def psnr(ref, img):
+    mse = np.mean((ref.astype(np.float32) - img.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def ssim(ref, img):
+    """各通道以 11×11、sigma 1.5 的高斯視窗計算 SSIM 後取平均"""
+    a = ref.astype(np.float32)
+    b = img.astype(np.float32)
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    s = ((2 * mu_a * mu_b + _C1) * (2 * cov + _C2)) / ((mu_a * mu_a + mu_b * mu_b + _C1) * (var_a + var_b + _C2))
+    return float(s.mean())
+
+
+def _timed(enhancer, img, repeat):
+    # 第一次配置暫存區，不列入計時；取 repeat 次中最快的一次
+    out = enhancer.enhance(img).copy()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        enhancer.enhance(img)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def compare_scales(images, lut, scales=SCALES, repeat=3, th_y=TH_Y, th_x=TH_X, kernel=FIXED_KERNEL_1D):
+    """images 為 (名稱, 影像) 序列；回傳每個 scale 的 {scale, psnr, psnr_min, ssim, ssim_min, ms, speedup}"""
+    enhancers = {s: Enhancer(lut, th_y=th_y, th_x=th_x, kernel=kernel, scale=s) for s in scales}
+    reference = enhancers.get(1.0) or Enhancer(lut, th_y=th_y, th_x=th_x, kernel=kernel)
+    stats = {s: {"psnr": [], "ssim": [], "seconds": []} for s in scales}
+    ref_seconds = []
+    for name, img in images:
+        ref, ref_t = _timed(reference, img, repeat)
+        ref_seconds.append(ref_t)
+        for s in scales:
+            if s == 1.0:
+                out, t = ref, ref_t
+            else:
+                out, t = _timed(enhancers[s], img, repeat)
+            stats[s]["psnr"].append(psnr(ref, out))
+            stats[s]["ssim"].append(ssim(ref, out))
+            stats[s]["seconds"].append(t)
+    rows = []
+    for s in scales:
+        st = stats[s]
+        if not st["seconds"]:
+            continue
+        finite = [p for p in st["psnr"] if np.isfinite(p)]
+        rows.append({
+            "scale": s,
+            "images": len(st["seconds"]),
+            "psnr": float(np.mean(finite)) if finite else float("inf"),
+            "psnr_min": float(min(st["psnr"])),
+            "ssim": float(np.mean(st["ssim"])),
+            "ssim_min": float(min(st["ssim"])),
+            "ms": float(np.mean(st["seconds"]) * 1000),
+            "speedup": float(sum(ref_seconds) / sum(st["seconds"])),
+        })
+    return rows
+
+
+def recommend_scale(rows, min_ssim=MIN_SSIM):
+    ok = [r["scale"] for r in rows if r["ssim_min"] >= min_ssim]
+    return min(ok) if ok else 1.0
+
+
+def _iter_inputs(patterns, limit):
+    count = 0
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            for name, _, img in iter_images(path):
+                if img is None:
+                    print("無法讀取:", name)
+                    continue
+                yield os.path.basename(name), img
+                count += 1
+                if limit and count >= limit:
+                    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較不同工作解析度的畫質（PSNR / SSIM）與速度")
+    parser.add_argument("patterns", nargs="+", help="圖檔或封存檔（.jpgs）的 glob")
+    parser.add_argument("--lut", default="weight.dat", help="gain LUT（.dat，或 .npy LUT family 搭配 --t）")
+    parser.add_argument("--t", type=float, default=1.0, help="--lut 為 .npy 時使用的亮度 t")
+    parser.add_argument("--scales", type=float, nargs="+", default=SCALES)
+    parser.add_argument("--repeat", type=int, default=3, help="每張重複計時幾次（取最快）")
+    parser.add_argument("--limit", type=int, default=50, help="最多取幾張圖，0 為不限")
+    parser.add_argument("--min-ssim", type=float, default=MIN_SSIM, help="建議 scale 時 SSIM 最低值的門檻")
+    parser.add_argument("--json", help="把結果寫成 JSON")
+    args = parser.parse_args()
+
+    lut = np.array(load_LUT_family(args.lut).lut(args.t)) if args.lut.endswith(".npy") else load_binary_lut(args.lut)
+    scales = sorted(set(args.scales) | {1.0}, reverse=True)
+    rows = compare_scales(_iter_inputs(args.patterns, args.limit), lut, scales, repeat=args.repeat)
+    if not rows:
+        print("沒有可用的影像")
+        return
+
+    print(f"以 scale=1 的輸出為基準，{rows[0]['images']} 張：")
+    print(f"{'scale':>6} {'PSNR':>8} {'最低':>8} {'SSIM':>8} {'最低':>8} {'每張 ms':>9} {'加速':>6}")
+    for r in rows:
+        print(f"{r['scale']:>6.2f} {r['psnr']:>8.2f} {r['psnr_min']:>8.2f} {r['ssim']:>8.4f} {r['ssim_min']:>8.4f} "
+              f"{r['ms']:>9.1f} {r['speedup']:>5.2f}x")
+    best = recommend_scale(rows, args.min_ssim)
+    print(f"✅ SSIM 最低值 ≥ {args.min_ssim} 的最小 scale：{best}（blur_table_TH.py --scale {best}）")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"lut": args.lut, "min_ssim": args.min_ssim, "recommended": best, "scales": rows}, f,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""clamped 7-tap 模糊與 Enhancer 對照原本逐行 / 逐列迴圈的結果，必須逐位元相同"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from LUT import load_binary_lut
+from enhancer import Enhancer, FIXED_KERNEL_1D, STRIP_ROWS, TH_X, TH_Y, clamped_blur_1d
+
+WEIGHT_DAT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight.dat")
+
+# 含比 kernel（7）還小的高 / 寬、單一像素，以及跨過 STRIP_ROWS 的高度
+SIZES = [(1, 1), (3, 5), (6, 40), (40, 6), (7, 7), (13, 29), (STRIP_ROWS + 5, 33), (2 * STRIP_ROWS + 1, 11)]
+THRESHOLDS = [(TH_Y, TH_X), (0, 0), (1, 1), (16, 256), (255, 4096)]
+
+
+def reference_blur(Gi, th_y, th_x, kernel=FIXED_KERNEL_1D):
+    # 原本 blur_table_TH.py 的 Step 2、3：逐行 / 逐列的 Python 迴圈
+    pad = kernel.size // 2
+    H, W = Gi.shape
+    Gi_pad = cv2.copyMakeBorder(Gi, pad, pad, 0, 0, borderType=cv2.BORDER_REFLECT_101)
+    blur_y = np.zeros_like(Gi)
+    for x in range(H):
+        window = Gi_pad[x:x+2*pad+1, :]
+        center_mat = np.tile(Gi[x, :][None, :], (7, 1))
+        w = window.copy()
+        diff = np.abs(w - center_mat)
+        w[diff >= th_y] = center_mat[diff >= th_y]
+        blur_y[x, :] = (w * kernel[:, None]).sum(axis=0)
+
+    blur_pad = cv2.copyMakeBorder(blur_y, 0, 0, pad, pad, borderType=cv2.BORDER_REFLECT_101)
+    blur_final = np.zeros_like(blur_y)
+    for y in range(W):
+        window = blur_pad[:, y:y+2*pad+1]
+        center_mat = np.tile(blur_y[:, y][:, None], (1, 7))
+        w = window.copy()
+        diff = np.abs(w - center_mat)
+        w[diff >= th_x] = center_mat[diff >= th_x]
+        blur_final[:, y] = (w * kernel[None, :]).sum(axis=1)
+    return blur_y, blur_final
+
+
+def reference_enhance(img, gain_LUT, th_y, th_x):
+    # 原本 blur_table_TH.py 的 Step 1–7（float32 流程）
+    img = img.astype(np.float32)
+    Gi = np.max(img, axis=2).astype(np.float32)
+    _, blur_final = reference_blur(Gi, th_y, th_x)
+    safe_blur = np.maximum(blur_final / 128.0, 1.0)
+    safe_int = np.clip(np.floor(safe_blur).astype(np.int32), 1, 2040)
+    gain_map = gain_LUT[safe_int - 1].astype(np.float32) / (1 << 10)
+    gain_map_3c = np.repeat(gain_map[:, :, None], 3, axis=2)
+    return np.clip(img * gain_map_3c, 0, 255).astype(np.uint8)
+
+
+def random_image(shape, seed):
+    # 暗部為主、夾雜亮點，兩個方向的閾值都會有取代與不取代的像素
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 64, (*shape, 3), dtype=np.uint8)
+    bright = rng.random(shape) < 0.1
+    img[bright] = rng.integers(128, 256, (int(bright.sum()), 3), dtype=np.uint8)
+    return img
+
+
+@pytest.mark.parametrize("th_y, th_x", THRESHOLDS)
+@pytest.mark.parametrize("shape", SIZES)
+def test_clamped_blur_matches_loops(shape, th_y, th_x):
+    Gi = random_image(shape, seed=sum(shape)).max(axis=2).astype(np.float32)
+    ref_y, ref_final = reference_blur(Gi, th_y, th_x)
+    blur_y = clamped_blur_1d(Gi, FIXED_KERNEL_1D, th_y, axis=0)
+    blur_final = clamped_blur_1d(blur_y, FIXED_KERNEL_1D, th_x, axis=1)
+    np.testing.assert_array_equal(blur_y, ref_y)
+    np.testing.assert_array_equal(blur_final, ref_final)
+
+
+@pytest.mark.parametrize("th_y, th_x", THRESHOLDS)
+@pytest.mark.parametrize("shape", SIZES)
+def test_enhancer_matches_reference(shape, th_y, th_x):
+    lut = load_binary_lut(WEIGHT_DAT)
+    enhancer = Enhancer(lut, th_y=th_y, th_x=th_x)
+    for seed in range(3):
+        img = random_image(shape, seed)
+        np.testing.assert_array_equal(enhancer.enhance(img), reference_enhance(img, lut, th_y, th_x))
+
+
+def test_enhancer_reuses_buffers_across_sizes():
+    # 不同尺寸交替處理，暫存區快取不能讓結果互相影響
+    lut = load_binary_lut(WEIGHT_DAT)
+    enhancer = Enhancer(lut)
+    for i, shape in enumerate(SIZES * 2):
+        img = random_image(shape, seed=100 + i)
+        np.testing.assert_array_equal(enhancer.enhance(img), reference_enhance(img, lut, TH_Y, TH_X))
@@ -0,0 +1,187 @@
+# 離線效能測試用的本機假網站，模擬 1968services.tw：
+#
+#     /cam/<縣市代碼>-<編號>   攝影機頁面（<title> + img.video_obj），沒有這台時回 404（findCam 探測用）
+#     /jpeg/<id>              單張 JPEG
+#     /mjpeg/<id>             multipart/x-mixed-replace 串流，送完 MJPEG_FRAMES 張後關閉
+#
+# 影像預設以 OpenCV 合成；--recordings 指定資料夾時改送錄下來的回應：*.jpg 為單張 JPEG，
+# *.mjpg 為原始的 multipart 內容（第一行 --<boundary>）。
+#
+# 用法：python fake_site.py [--port 8000] [--recordings 資料夾]
+#
+import os, re, sys, glob, time, argparse, threading, http.server
+
+import cv2
+import numpy as np
+
+MJPEG_FRAMES = 30
+MJPEG_FRAME_DELAY = 0.0     # 串流每張之間的間隔（秒）
+PAGE_PADDING = 30000        # 真實頁面約 30 KB，video_obj 出現在中段
+FRAME_SIZE = (480, 640)
+
+_ID_RE = re.compile(r"/([a-z]{3})-(\d+)")
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 用戶端讀到需要的部分就關閉連線（findCam 串流讀頁面、MJPEG 只取第一張），不算錯誤
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+def synthetic_frame(seed, shape=FRAME_SIZE, dark=False):
+    """合成一張有漸層、色塊與雜訊的畫面（BGR uint8），同一個 seed 結果相同"""
+    rng = np.random.default_rng(seed)
+    H, W = shape
+    y, x = np.mgrid[0:H, 0:W].astype(np.float32)
+    top = 60 if dark else 200
+    img = np.stack([x / W * top * 0.6 + 10, y / H * top * 0.8 + 5, (x + y) / (H + W) * top * 0.5 + 8], axis=2)
+    for _ in range(30):
+        x0, y0 = int(rng.integers(0, W - W // 10)), int(rng.integers(0, H - H // 10))
+        w, h = int(rng.integers(W // 50, W // 6)), int(rng.integers(H // 50, H // 4))
+        cv2.rectangle(img, (x0, y0), (x0 + w, y0 + h), rng.integers(0, top + 30, 3).tolist(), -1)
+    img += rng.normal(0, 3, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def synthetic_jpegs(count=5, shape=FRAME_SIZE, quality=80):
+    return [cv2.imencode(".jpg", synthetic_frame(i, shape), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+            for i in range(count)]
+
+def load_recordings(folder):
+    """回傳 (JPEG 清單, [(boundary, 原始 multipart 內容), ...])"""
+    jpegs = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.jpg"))):
+        with open(path, "rb") as f:
+            jpegs.append(f.read())
+    streams = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.mjpg"))):
+        with open(path, "rb") as f:
+            body = f.read()
+        first = body.split(b"\r\n", 1)[0]
+        if first.startswith(b"--"):
+            streams.append((first[2:].decode(), body))
+    return jpegs, streams
+
+class FakeSite:
+    """在背景執行緒跑的假網站；cameras 為 {縣市代碼: 編號集合}"""
+
+    def __init__(self, cameras=None, jpegs=None, streams=None, mjpeg_frames=MJPEG_FRAMES,
+                 frame_delay=MJPEG_FRAME_DELAY, port=0):
+        self.cameras = {code: set(ids) for code, ids in (cameras or {}).items()}
+        self.jpegs = jpegs or synthetic_jpegs()
+        self.streams = streams or []
+        self.mjpeg_frames = mjpeg_frames
+        self.frame_delay = frame_delay
+        self.requests = 0
+        self.lock = threading.Lock()
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # 標頭與內容分開寫時，Nagle + delayed ACK 會讓每個請求多等 40 ms
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                path = self.path.split("?", 1)[0]
+                if path.startswith("/cam/"):
+                    site._page(self, path)
+                elif path.startswith("/jpeg/"):
+                    site._jpeg(self, path)
+                elif path.startswith("/mjpeg/"):
+                    site._mjpeg(self, path)
+                else:
+                    site._send(self, 404, b"")
+
+        self.server = _QuietServer(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-site", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _camera_number(self, path):
+        m = _ID_RE.search(path)
+        return int(m.group(2)) if m else 0
+
+    def _send(self, handler, status, body, content_type="text/html; charset=utf-8"):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _page(self, handler, path):
+        m = _ID_RE.search(path)
+        if not m or int(m.group(2)) not in self.cameras.get(m.group(1), ()):
+            self._send(handler, 404, b"")
+            return
+        cam_id = f"{m.group(1)}-{m.group(2)}"
+        filler = "<p>" + "x" * (PAGE_PADDING // 2) + "</p>"
+        body = (f"<html><head><title>測試攝影機 {cam_id}</title></head><body>{filler}"
+                f'<img class="video_obj" src="/mjpeg/{cam_id}?t=0">{filler}</body></html>').encode()
+        self._send(handler, 200, body)
+
+    def _jpeg(self, handler, path):
+        self._send(handler, 200, self.jpegs[self._camera_number(path) % len(self.jpegs)], "image/jpeg")
+
+    def _mjpeg(self, handler, path):
+        n = self._camera_number(path)
+        handler.close_connection = True
+        try:
+            if self.streams:
+                boundary, body = self.streams[n % len(self.streams)]
+                handler.send_response(200)
+                handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={boundary}")
+                handler.end_headers()
+                handler.wfile.write(body)
+                return
+            handler.send_response(200)
+            handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            handler.end_headers()
+            for i in range(self.mjpeg_frames):
+                jpg = self.jpegs[(n + i) % len(self.jpegs)]
+                handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpg)
+                                    + jpg + b"\r\n")
+                handler.wfile.flush()
+                if self.frame_delay:
+                    time.sleep(self.frame_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # 用戶端讀到第一張就關閉連線
+
+def main():
+    parser = argparse.ArgumentParser(description="離線效能測試用的假網站")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--recordings", help="錄下來的 *.jpg / *.mjpg 回應")
+    parser.add_argument("--cameras", type=int, default=100, help="每個縣市有幾台攝影機（tnn、khh）")
+    args = parser.parse_args()
+
+    jpegs, streams = load_recordings(args.recordings) if args.recordings else (None, None)
+    cameras = {code: range(1, args.cameras + 1) for code in ("tnn", "khh")}
+    site = FakeSite(cameras, jpegs, streams, port=args.port).start()
+    print(f"假網站：{site.base_url}/cam/tnn-00001、{site.base_url}/mjpeg/tnn-00001，Ctrl+C 結束")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        site.stop()
+
+if __name__ == "__main__":
+    main()
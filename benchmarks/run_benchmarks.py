@@ -0,0 +1,463 @@
+# 離線效能測試：MJPEG 解析、擷取一輪、低光增強、findCam 探測、ROI 裁切、特徵庫查詢這幾條熱點路徑
+#
+# 網路請求都打本機的假網站（fake_site.py），不需要連到 1968services.tw。每個 suite 在獨立的子程序執行，
+# 峰值 RSS 才不會互相影響；結果（時間、吞吐量、峰值 RSS）寫成 benchmarks/results/<時間>_<commit>.json，
+# 用 compare 比較兩個版本。
+#
+# 用法：
+#     python benchmarks/run_benchmarks.py
+#     python benchmarks/run_benchmarks.py --suites enhance mjpeg --quick
+#     python benchmarks/run_benchmarks.py --images "D:/Taiwan_CCTV/downloaded_images/*/*.jpg" --recordings recorded/
+#     python benchmarks/run_benchmarks.py --suites roi --rois CCTV_capture/camera_rois.json
+#     python benchmarks/run_benchmarks.py --profile
+#     python benchmarks/run_benchmarks.py compare benchmarks/results/舊.json benchmarks/results/新.json
+#
+import os, sys, glob, json, time, shutil, platform, argparse, tempfile, subprocess, contextlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+CAPTURE_DIR = os.path.join(ROOT, "CCTV_capture")
+ENHANCE_DIR = os.path.join(ROOT, "Low Light Enhancement")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+LUT_PATH = os.path.join(ENHANCE_DIR, "weight.dat")
+for _path in (BENCH_DIR, CAPTURE_DIR, ENHANCE_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import numpy as np
+
+from fake_site import FakeSite, synthetic_frame, synthetic_jpegs, load_recordings
+
+SUITES = ["mjpeg", "capture", "enhance", "findcam", "roi", "features"]
+RESOLUTIONS = [(480, 640), (720, 1280), (1080, 1920), (2160, 3840)]
+ENHANCE_SCALES = [1.0, 0.5]
+CAPTURE_WORKERS = 8
+# findCam 假網站上的攝影機：編號中間有空號，最後一台之後要探測 miss_gap 個空號才停
+FINDCAM_CAMERAS = {
+    "tnn": set(range(1, 150)) - set(range(40, 60)),
+    "khh": set(range(1, 300, 2)),
+    "ttt": set(range(1, 30)),
+}
+# 沒有 --rois 時各縣市用的典型 ROI：高架道路（路面梯形、扣掉左下時間戳記）、路口（下方 2/3）、只拍路面的矩形
+BENCH_ROIS = {
+    "tnn": {"polygons": [[[0.3, 0.35], [0.7, 0.35], [1.0, 1.0], [0.0, 1.0]]],
+            "exclude": [[[0.0, 0.92], [0.35, 0.92], [0.35, 1.0], [0.0, 1.0]]]},
+    "khh": {"polygons": [[[0.0, 0.4], [1.0, 0.3], [1.0, 1.0], [0.0, 1.0]]]},
+    "ttt": {"polygons": [[[0.1, 0.55], [0.9, 0.55], [0.9, 1.0], [0.1, 1.0]]]},
+}
+ROI_CAMERAS_PER_CITY = 5
+FEATURE_INTERVAL = 300      # 特徵庫測試：每台每 5 分鐘一張
+
+def peak_rss_mb():
+    """目前程序的峰值 RSS（MB），無法取得時回傳 None"""
+    try:
+        import resource
+    except ImportError:     # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2**20
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024     # macOS 為 bytes、Linux 為 KB
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def case(name, seconds, iterations, unit, **extra):
+    """一項測試結果：throughput 為每秒處理幾個 unit"""
+    return {"name": name, "seconds": round(seconds, 6), "iterations": iterations, "unit": unit,
+            "per_iteration_ms": round(seconds / iterations * 1000, 3) if iterations else None,
+            "throughput": round(iterations / seconds, 3) if seconds > 0 else None, **extra}
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+@contextlib.contextmanager
+def quiet():
+    # 被測的程式會印很多進度訊息，測試時丟掉
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+# ---------------- suites：每個回傳 case() 清單 ----------------
+
+def bench_mjpeg(ctx):
+    import capture
+    from mjpeg import MJPEGParser
+    n = 20 if ctx.quick else 200
+    results = []
+    for kind in ("mjpeg", "jpeg"):
+        url = f"{ctx.base_url}/{kind}/tnn-00001?t=0"
+        out = os.path.join(ctx.tmp, f"first_{kind}.jpg")
+        ok = capture.download_first_jpeg_from_mjpeg(url, out)
+        seconds = timed(lambda: capture.download_first_jpeg_from_mjpeg(url, out), n)
+        results.append(case(f"download_first_jpeg_{kind}", seconds, n, "requests", ok=ok))
+
+    # 不經過網路，只量 parser：multipart 內容切成 4 KB 餵進去
+    jpegs = ctx.jpegs
+    body = b"".join(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(j) + j + b"\r\n"
+                    for j in jpegs * (20 if ctx.quick else 100))
+    chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)]
+
+    def parse():
+        parser = MJPEGParser("frame")
+        count = 0
+        for chunk in chunks:
+            parser.feed(chunk)
+            for _ in parser.frames(copy=False):
+                count += 1
+        return count
+
+    frames = parse()
+    seconds = timed(parse, 3)
+    results.append(case("mjpeg_parser", seconds, frames * 3, "frames", mb_per_second=round(len(body) * 3 / seconds / 1e6, 1)))
+    return results
+
+def _capture_cameras(ctx, count, kind):
+    from url_cache import ImageUrlCache
+    cams = [{"camera_id": f"tnn_{i:05d}", "name": f"bench_{i:05d}", "url": f"{ctx.base_url}/cam/tnn-{i:05d}",
+             "city": "台南市"} for i in range(1, count + 1)]
+    url_cache = ImageUrlCache(None)
+    for cam in cams:
+        url_cache.set(cam["camera_id"], f"{ctx.base_url}/{kind}/{cam['camera_id'].replace('_', '-')}?t=0")
+    return cams, url_cache
+
+def bench_capture(ctx):
+    import capture
+    from dedup import FrameDeduplicator
+    from frame_archive import FrameArchive
+    from http_pool import close_sessions
+    count = 100 if ctx.quick else 500
+    results = []
+
+    def no_driver(cam_url):
+        raise RuntimeError("benchmark 不開 Chrome")
+
+    # 與 capture_service 相同的路徑：有快取網址 → HTTP 抓圖 → 去重 → 寫檔 / 封存檔
+    for kind, storage, use_dedup in (("jpeg", "files", False), ("mjpeg", "files", False), ("jpeg", "archive", True)):
+        capture.IMAGE_DIR = os.path.join(ctx.tmp, f"capture_{kind}_{storage}")
+        cams, url_cache = _capture_cameras(ctx, count, kind)
+        dedup = FrameDeduplicator("ref", placeholder_dir=None) if use_dedup else None
+        archive = FrameArchive() if storage == "archive" else None
+        with ThreadPoolExecutor(CAPTURE_WORKERS) as pool:
+            start = time.perf_counter()
+            frames = list(pool.map(lambda cam: capture.capture_with_cache(cam, url_cache, no_driver, dedup, archive), cams))
+            seconds = time.perf_counter() - start
+        if archive is not None:
+            archive.close()
+        name = f"capture_round_{kind}_{storage}" + ("_dedup" if use_dedup else "")
+        results.append(case(name, seconds, count, "cameras", workers=CAPTURE_WORKERS,
+                            success=sum(f is not None for f in frames)))
+    close_sessions()
+
+    try:
+        import asyncio
+        from async_capture import AsyncCaptureEngine
+    except ImportError:
+        return results      # 沒有 aiohttp
+    capture.IMAGE_DIR = os.path.join(ctx.tmp, "capture_async")
+    cams, url_cache = _capture_cameras(ctx, count, "jpeg")
+
+    async def round_trip():
+        async with AsyncCaptureEngine(cams, url_cache=url_cache, concurrency=200, per_host=8) as engine:
+            await engine.run_round()    # 第一輪建立連線
+            start = time.perf_counter()
+            success = await engine.run_round()
+            return time.perf_counter() - start, success
+
+    with quiet():
+        seconds, success = asyncio.run(round_trip())
+    results.append(case("capture_round_async_jpeg", seconds, count, "cameras", success=success))
+    return results
+
+def bench_enhance(ctx):
+    import cv2
+    from enhancer import Enhancer
+    from blur_table_TH import enhance_datasets
+    repeat = 2 if ctx.quick else 5
+    resolutions = RESOLUTIONS[:3] if ctx.quick else RESOLUTIONS
+    results = []
+    for H, W in resolutions:
+        frame = synthetic_frame(0, (H, W), dark=True)
+        for scale in ENHANCE_SCALES:
+            enhancer = Enhancer.from_file(LUT_PATH, scale=scale)
+            enhancer.enhance(frame)     # 第一張配置暫存區
+            seconds = timed(lambda: enhancer.enhance(frame), repeat)
+            results.append(case(f"enhance_{W}x{H}_scale{scale:g}", seconds, repeat, "frames",
+                                megapixels_per_second=round(H * W * repeat / seconds / 1e6, 2)))
+
+    if ctx.images:
+        images = [img for img in (cv2.imread(p) for p in sorted(glob.glob(ctx.images))[:50]) if img is not None]
+        if images:
+            enhancer = Enhancer.from_file(LUT_PATH)
+            seconds = timed(lambda: [enhancer.enhance(img) for img in images], repeat)
+            results.append(case("enhance_sample_images", seconds, len(images) * repeat, "frames"))
+
+    # blur_table_TH.py 的整個流程（讀圖 → 增強 → 寫圖），合成 1080p JPEG
+    src = os.path.join(ctx.tmp, "dataset_in")
+    os.makedirs(src, exist_ok=True)
+    count = 5 if ctx.quick else 20
+    for i in range(count):
+        cv2.imwrite(os.path.join(src, f"frame_{i:03d}.jpg"), synthetic_frame(i, (1080, 1920), dark=True))
+    enhancer = Enhancer.from_file(LUT_PATH)
+    start = time.perf_counter()
+    enhance_datasets(enhancer, [(src, os.path.join(ctx.tmp, "dataset_out"), "*.jpg")])
+    results.append(case("blur_table_TH_dataset_1080p", time.perf_counter() - start, count, "frames"))
+    return results
+
+def bench_findcam(ctx):
+    import findCam
+    expected = sum(len(ids) for ids in FINDCAM_CAMERAS.values())
+    results = []
+    cache_path = os.path.join(ctx.tmp, "probe_cache.jsonl")
+    for name in ("findcam_cold", "findcam_cached"):
+        with quiet():
+            discovery = findCam.CameraDiscovery(cache_path, rate=0, url_cache_path=os.path.join(ctx.tmp, "urls.json"))
+            discovery.base_url = f"{ctx.base_url}/cam/"
+            start = time.perf_counter()
+            found = discovery.discover_all_cameras(list(FINDCAM_CAMERAS))
+            seconds = time.perf_counter() - start
+            discovery.cache.close()
+        # 以確認過的 ID 數計算吞吐量（有快取時大部分 ID 不必送請求）
+        ids = sum(p.next_id - 1 for p in discovery.city_probes)
+        requests = sum(p.requests for p in discovery.city_probes)
+        results.append(case(name, seconds, ids, "ids", requests=requests, cameras_found=sum(len(v) for v in found.values()),
+                            cameras_expected=expected, workers=discovery.workers))
+    return results
+
+def _rois_by_city(path):
+    from roi import CameraROI, load_rois
+    if path:
+        rois = load_rois(path)
+    else:
+        rois = {f"{code}_{i:05d}": CameraROI.from_dict(data) for code, data in BENCH_ROIS.items()
+                for i in range(1, ROI_CAMERAS_PER_CITY + 1)}
+    cities = {}
+    for camera_id, roi in sorted(rois.items()):
+        cities.setdefault(camera_id.split("_")[0], []).append((camera_id, roi))
+    return {code: cams[:ROI_CAMERAS_PER_CITY] for code, cams in cities.items()}
+
+def bench_roi(ctx):
+    import cv2
+    from enhancer import Enhancer
+    from batch import enhance_image
+    from flood_detect import FloodDetector, DummyFloodModel, load_enhancer, _Frame
+    repeat = 2 if ctx.quick else 5
+    H, W = (720, 1280) if ctx.quick else (1080, 1920)
+    frame = synthetic_frame(0, (H, W), dark=True)
+    jpg = cv2.imencode(".jpg", frame)[1].tobytes()
+    enhancer = Enhancer.from_file(LUT_PATH)
+    detector = FloodDetector(DummyFloodModel(), batch_size=1, enhance=load_enhancer(LUT_PATH), output=None)
+    out = detector._batch[0]
+    full_enhance = timed(lambda: enhancer.enhance(frame), repeat) / repeat
+    full_prepare = timed(lambda: detector._prepare(_Frame({"camera_id": "full"}, jpg, 0), out), repeat) / repeat
+    results = [case(f"roi_enhance_full_{W}x{H}", full_enhance * repeat, repeat, "frames"),
+               case("roi_flood_prepare_full", full_prepare * repeat, repeat, "frames")]
+
+    # 每個縣市取幾台有 ROI 的攝影機，量增強（blur_table_TH 的路徑）與淹水偵測前處理各省多少
+    for code, cams in _rois_by_city(ctx.rois).items():
+        work = frame.copy()
+        enhance_seconds = prepare_seconds = 0.0
+        for camera_id, roi in cams:
+            name = f"{camera_id}_20250701_031500.jpg"
+            rois = {camera_id: roi}
+            enhance_image(enhancer, work, name, rois)     # 第一張配置這個大小的暫存區
+            enhance_seconds += timed(lambda: enhance_image(enhancer, work, name, rois), repeat)
+            cam = {"camera_id": camera_id, "roi": roi}
+            prepare_seconds += timed(lambda: detector._prepare(_Frame(cam, jpg, 0), out), repeat)
+        geos = [roi.geometry((H, W)) for _, roi in cams]
+        pixels = sum(g.mask_fraction for g in geos) / len(geos)
+        bbox = sum(g.bbox_fraction for g in geos) / len(geos)
+        n = len(cams) * repeat
+        results.append(case(f"roi_enhance_{code}", enhance_seconds, n, "frames", cameras=len(cams),
+                            roi_pixels=round(pixels, 3), bbox_pixels=round(bbox, 3),
+                            speedup=round(full_enhance * n / enhance_seconds, 2)))
+        results.append(case(f"roi_flood_prepare_{code}", prepare_seconds, n, "frames", cameras=len(cams),
+                            speedup=round(full_prepare * n / prepare_seconds, 2)))
+    return results
+
+def bench_features(ctx):
+    import cv2
+    from feature_store import FeatureStore, frame_features
+    from frame_archive import parse_time
+    cameras, days = (50, 3) if ctx.quick else (200, 7)
+    store = FeatureStore(os.path.join(ctx.tmp, "features"))
+    results = []
+
+    # 擷取端每張多花的時間：縮小解碼 + 縮圖 + 追加寫入
+    jpg = cv2.imencode(".jpg", synthetic_frame(0, (1080, 1920)))[1].tobytes()
+    n = 20 if ctx.quick else 100
+    seconds = timed(lambda: store.record("bench_00000", jpg), n)
+    results.append(case("features_record_1080p", seconds, n, "frames"))
+
+    # cameras 台 × days 天的歷史資料，查最後一天（颱風期間）所有攝影機的亮度、變化與淹水分數
+    start = parse_time("20250701_000000")
+    ts = start + np.arange(days * 86400 // FEATURE_INTERVAL) * float(FEATURE_INTERVAL)
+    rng = np.random.default_rng(0)
+    thumbs = rng.integers(0, 255, (len(ts), 32, 32), dtype=np.uint8)
+    for i in range(cameras):
+        store.append_frames(f"tnn_{i + 1:05d}", ts, rng.random(len(ts)), rng.random(len(ts)), thumbs)
+    last_day = start + (days - 1) * 86400
+    for name, columns in (("features_query_day", ("ts", "brightness", "change", "flood")),
+                          ("features_query_day_thumbs", ("ts", "thumb"))):
+        begin = time.perf_counter()
+        found = store.query_many(None, last_day, last_day + 86400, columns)
+        seconds = time.perf_counter() - begin
+        results.append(case(name, seconds, sum(len(d["ts"]) for d in found.values()), "frames", cameras=len(found)))
+
+    # 對照：沒有特徵庫時，一台攝影機一天要 glob 所有 JPEG 再逐張解碼
+    cam_dir = os.path.join(ctx.tmp, "jpegs")
+    os.makedirs(cam_dir, exist_ok=True)
+    per_day = 86400 // FEATURE_INTERVAL
+    for k in range(per_day):
+        with open(os.path.join(cam_dir, f"tnn_00001_20250701_{k * FEATURE_INTERVAL // 3600:02d}{k * FEATURE_INTERVAL // 60 % 60:02d}00.jpg"), "wb") as f:
+            f.write(jpg)
+    begin = time.perf_counter()
+    for path in sorted(glob.glob(os.path.join(cam_dir, "tnn_00001_20250701_*.jpg"))):
+        with open(path, "rb") as f:
+            frame_features(f.read())
+    results.append(case("glob_decode_day_1camera", time.perf_counter() - begin, per_day, "frames"))
+    return results
+
+BENCHMARKS = {"mjpeg": bench_mjpeg, "capture": bench_capture, "enhance": bench_enhance, "findcam": bench_findcam,
+              "roi": bench_roi, "features": bench_features}
+
+# ---------------- 子程序：執行單一 suite ----------------
+
+def run_child(args):
+    ctx = argparse.Namespace(base_url=args.base_url, quick=args.quick, images=args.images, rois=args.rois,
+                             tmp=tempfile.mkdtemp(prefix=f"bench_{args.child}_"))
+    ctx.jpegs = load_recordings(args.recordings)[0] if args.recordings else []
+    ctx.jpegs = ctx.jpegs or synthetic_jpegs()
+    profiler = None
+    if args.profile_dir:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        cases = BENCHMARKS[args.child](ctx)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        shutil.rmtree(ctx.tmp, ignore_errors=True)
+    result = {"suite": args.child, "seconds": round(time.perf_counter() - start, 3),
+              "peak_rss_mb": peak_rss_mb(), "cases": cases}
+    if profiler is not None:
+        import pstats
+        prof_path = os.path.join(args.profile_dir, f"{args.child}.prof")
+        profiler.dump_stats(prof_path)
+        result["profile"] = prof_path
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+def run_suites(args):
+    jpegs, streams = load_recordings(args.recordings) if args.recordings else (None, None)
+    os.makedirs(args.out, exist_ok=True)
+    revision = git_revision()
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    profile_dir = None
+    if args.profile:
+        profile_dir = os.path.join(args.out, f"{stamp}_profile")
+        os.makedirs(profile_dir, exist_ok=True)
+    report = {"created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "revision": revision,
+              "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+              "numpy": np.__version__, "quick": args.quick, "suites": {}}
+    with FakeSite(FINDCAM_CAMERAS, jpegs, streams) as site, tempfile.TemporaryDirectory() as tmp:
+        for suite in args.suites:
+            result_path = os.path.join(tmp, f"{suite}.json")
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", suite, "--base-url", site.base_url,
+                   "--result", result_path]
+            if args.quick:
+                cmd.append("--quick")
+            if args.images:
+                cmd += ["--images", args.images]
+            if args.recordings:
+                cmd += ["--recordings", args.recordings]
+            if args.rois:
+                cmd += ["--rois", os.path.abspath(args.rois)]
+            if profile_dir:
+                cmd += ["--profile-dir", profile_dir]
+            print(f"▶ {suite}")
+            proc = subprocess.run(cmd)
+            if proc.returncode != 0 or not os.path.exists(result_path):
+                print(f"❌ {suite} 執行失敗（exit {proc.returncode}）")
+                report["suites"][suite] = {"suite": suite, "error": proc.returncode}
+                continue
+            with open(result_path, encoding="utf-8") as f:
+                result = json.load(f)
+            report["suites"][suite] = result
+            print_suite(result)
+    out_path = os.path.join(args.out, f"{stamp}_{revision or 'norev'}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果已寫到 {out_path}")
+
+def print_suite(result):
+    rss = result.get("peak_rss_mb")
+    print(f"  {result['suite']}：{result['seconds']:.1f} 秒，峰值 RSS {rss:.0f} MB" if rss is not None
+          else f"  {result['suite']}：{result['seconds']:.1f} 秒")
+    for c in result["cases"]:
+        print(f"    {c['name']:<36} {c['per_iteration_ms']:>10.2f} ms/{c['unit']:<8} {c['throughput']:>10.1f} {c['unit']}/s")
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old.get('revision')} → {new.get('revision')}（吞吐量比值 > 1 表示變快）")
+    for suite, new_result in new["suites"].items():
+        old_result = old["suites"].get(suite)
+        if not old_result or "cases" not in old_result or "cases" not in new_result:
+            continue
+        old_rss, new_rss = old_result.get("peak_rss_mb"), new_result.get("peak_rss_mb")
+        rss = f"，峰值 RSS {old_rss:.0f} → {new_rss:.0f} MB" if old_rss and new_rss else ""
+        print(f"  {suite}{rss}")
+        old_cases = {c["name"]: c for c in old_result["cases"]}
+        for c in new_result["cases"]:
+            o = old_cases.get(c["name"])
+            if o and o.get("throughput") and c.get("throughput"):
+                ratio = c["throughput"] / o["throughput"]
+                mark = "🟢" if ratio >= 1.05 else "🔴" if ratio <= 0.95 else "  "
+                print(f"  {mark} {c['name']:<36} {o['throughput']:>10.1f} → {c['throughput']:>10.1f} {c['unit']}/s  {ratio:.2f}x")
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(description="比較兩次效能測試結果")
+        parser.add_argument("command")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        args = parser.parse_args()
+        compare(args.old, args.new)
+        return
+
+    parser = argparse.ArgumentParser(description="擷取與低光增強的離線效能測試")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--quick", action="store_true", help="減少次數與解析度，快速確認")
+    parser.add_argument("--images", help="另外量測的範例影像 glob（低光增強）")
+    parser.add_argument("--recordings", help="假網站改送錄下來的 *.jpg / *.mjpg 回應")
+    parser.add_argument("--rois", help="roi suite 改用這個 camera_rois.json（預設為各縣市的典型 ROI）")
+    parser.add_argument("--profile", action="store_true", help="以 cProfile 執行，.prof 存在結果資料夾")
+    parser.add_argument("--out", default=RESULTS_DIR, help="結果 JSON 的資料夾")
+    parser.add_argument("--child", choices=SUITES, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--profile-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+    else:
+        run_suites(args)
+
+if __name__ == "__main__":
+    main()